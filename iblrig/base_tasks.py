@@ -24,12 +24,15 @@ import iblrig
 import iblrig.alyx
 import iblrig.graphic as graph
 import iblrig.path_helper
+import iblrig.raw_data_loaders
+import iblrig.sound
 import pybpodapi
 from iblrig import frame2TTL
 from iblrig.hardware import (
     SOFTCODE,
     Bpod,
     MyRotaryEncoder,
+    sound_device_factory,
 )
 from iblrig.transfer_experiments import BehaviorCopier
 from iblutil.spacer import Spacer
@@ -515,6 +518,9 @@ class BaseSession(ABC):
                 askint=True,
             )
         self.save_task_parameters_to_json_file()
+        if self.paths.DATA_FILE_PATH.exists():
+            # aggregates used to set up the next session, without loading the whole task data
+            iblrig.raw_data_loaders.save_task_summary(self.paths.DATA_FILE_PATH)
         self.register_to_alyx()
         self._execute_mixins_shared_function("stop_mixin")
 
@@ -574,7 +580,14 @@ class BpodMixin:
             Soft codes should work with resasonable latency considering our limiting
             factor is the refresh rate of the screen which should be 16.667ms @ a framerate of 60Hz
             """
-            if code == SOFTCODE.STOP_SOUND:
+            engine = getattr(self, "sound", {}).get("engine")
+            if code in (SOFTCODE.STOP_SOUND, SOFTCODE.PLAY_TONE, SOFTCODE.PLAY_NOISE) and engine is not None:
+                # the persistent output stream only needs a command posted
+                if code == SOFTCODE.STOP_SOUND:
+                    engine.stop()
+                else:
+                    engine.play("GO_TONE" if code == SOFTCODE.PLAY_TONE else "WHITE_NOISE")
+            elif code == SOFTCODE.STOP_SOUND:
                 self.sound["sd"].stop()
             elif code == SOFTCODE.PLAY_TONE:
                 self.sound["sd"].play(self.sound["GO_TONE"], self.sound["samplerate"])
@@ -585,13 +598,15 @@ class BpodMixin:
             elif code == SOFTCODE.TRIGGER_CAMERA:
                 self.trigger_bonsai_cameras()
             elif code == SOFTCODE.TRIGGER_PANDA:
-                position = self.device_rotary_encoder.rotary_encoder.current_position()
+                position = self.device_rotary_encoder.get_angle()
                 self.rotary_encoder_position.append(position)
-                self.corridor.set_camera_position(position)
-                self.corridor.step()
+                # a free running corridor follows the encoder on its own
+                if not self.corridor.free_running:
+                    self.corridor.set_camera_position(position)
+                    self.corridor.step()
             elif code == SOFTCODE.STORE_ENCODER_POSITION:
                 # It would be better to do this with an output stream
-                position = self.device_rotary_encoder.rotary_encoder.current_position()
+                position = self.device_rotary_encoder.get_angle()
                 self.rotary_encoder_position.append(position)
             elif code == SOFTCODE.ITI:
                 self.corridor.ITI()
@@ -611,6 +626,69 @@ class BpodMixin:
         # return self.bpod.session.current_trial.export()
 
 
+class SoundMixin:
+    """
+    Sound interface for state machine: the go tone and white noise are uploaded to the Harp sound card,
+    or played by a persistent output stream of the computer sound card on Bpod soft codes
+    """
+
+    def init_mixin_sound(self, *args, **kwargs):
+        self.sound = Bunch({"GO_TONE": None, "WHITE_NOISE": None, "engine": None})
+        # device_sound:OUTPUT is 'harp', 'xonar' or 'sysdefault', the rigs without sound leave it null
+        self.sound["output"] = (self.hardware_settings.get("device_sound") or {}).get("OUTPUT")
+        if self.sound["output"] is None:
+            return
+        self.sound["sd"], self.sound["samplerate"], self.sound["channels"] = sound_device_factory(
+            output=self.sound["output"]
+        )
+        self.sound["cache"] = iblrig.sound.SoundCache()
+        self.sound["GO_TONE"] = self.sound["cache"].get(
+            rate=self.sound["samplerate"],
+            frequency=self.task_params.get("GO_TONE_FREQUENCY", 5000),
+            duration=self.task_params.get("GO_TONE_DURATION", 0.1),
+            amplitude=self.task_params.get("GO_TONE_AMPLITUDE", 0.0272),
+            fade=0.01,
+            chans=self.sound["channels"],
+        )
+        self.sound["WHITE_NOISE"] = self.sound["cache"].get(
+            rate=self.sound["samplerate"],
+            frequency=-1,
+            duration=self.task_params.get("WHITE_NOISE_DURATION", 0.5),
+            amplitude=self.task_params.get("WHITE_NOISE_AMPLITUDE", 0.05),
+            fade=0.01,
+            chans=self.sound["channels"],
+        )
+
+    def start_mixin_sound(self):
+        """Needs the Bpod to be started, see `BpodMixin.start_mixin_bpod`, to define the sound actions"""
+        if self.sound["output"] is None:
+            return
+        if self.sound["output"] == "harp":
+            iblrig.sound.configure_sound_card(
+                sounds=[self.sound["GO_TONE"], self.sound["WHITE_NOISE"]],
+                indexes=[2, 3],
+                sample_rate=self.sound["samplerate"],
+                cache=self.sound["cache"],
+                # the uploads are only skipped for a card identified in the hardware settings
+                card_id=self.hardware_settings["device_sound"].get("CARD_ID"),
+            )
+            self.bpod.define_harp_sounds_actions(go_tone_index=2, noise_index=3)
+        else:
+            ttl_channel = {"L+TTL": 1, "TTL+R": 0}.get(self.sound["channels"])
+            engine = iblrig.sound.SoundEngine(self.sound["sd"], samplerate=self.sound["samplerate"], channels=2)
+            engine.preload("GO_TONE", self.sound["GO_TONE"], ttl_channel=ttl_channel)
+            engine.preload("WHITE_NOISE", self.sound["WHITE_NOISE"], ttl_channel=ttl_channel)
+            engine.start()
+            self.sound["engine"] = engine
+            self.bpod.define_xonar_sounds_actions()
+        self.logger.info(f"Sound module loaded: OK, output {self.sound['output']}")
+
+    def stop_mixin_sound(self):
+        if self.sound.get("engine") is not None:
+            self.sound["engine"].close()
+            self.sound["engine"] = None
+
+
 class Frame2TTLMixin:
     """
     Frame 2 TTL interface for state machine
@@ -655,6 +733,9 @@ class RotaryEncoderMixin:
             gain=1,
             com=self.hardware_settings.device_rotary_encoder["COM_ROTARY_ENCODER"],
             connect=False,
+            # the corridor render thread reads the position from the stream on every frame
+            stream=self.hardware_settings.device_rotary_encoder.get("STREAM", False)
+            or self.hardware_settings.get("corridor", {}).get("RENDER_THREAD", False),
         )
 
     def start_mixin_rotary_encoder(self):
@@ -670,6 +751,9 @@ class RotaryEncoderMixin:
         self.device_rotary_encoder.connect()
         self.logger.info("Rotary encoder module loaded: OK")
 
+    def stop_mixin_rotary_encoder(self):
+        self.device_rotary_encoder.stop_stream()
+
 
 class ValveMixin:
     def init_mixin_valve(self: object):
@@ -6,6 +6,7 @@ Appendix 2 of the paper into code.
 import numpy as np
 
 import iblrig.raw_data_loaders
+from iblrig.misc import ContrastSampler
 from iblrig.path_helper import iterate_previous_sessions
 from iblutil.util import setup_logger
 
@@ -83,9 +84,8 @@ def get_subject_training_info(
             )
     else:
         session_info = session_info[0]
-    trials_data, _ = iblrig.raw_data_loaders.load_task_jsonable(
-        session_info.file_task_data
-    )
+    # the aggregates of the previous session are read from the summary written with it, its task data is not loaded in full
+    summary = iblrig.raw_data_loaders.load_task_summary(session_info.file_task_data)
     # gets the reward volume from the previous session
     previous_reward_volume = session_info.task_settings.get(
         "ADAPTIVE_REWARD_AMOUNT_UL"
@@ -93,20 +93,21 @@ def get_subject_training_info(
     adaptive_reward = compute_adaptive_reward_volume(
         subject_weight_g=session_info.task_settings["SUBJECT_WEIGHT"],
         reward_volume_ul=previous_reward_volume,
-        delivered_volume_ul=trials_data["reward_amount"].sum(),
-        ntrials=trials_data.shape[0],
+        delivered_volume_ul=summary["reward_amount"],
+        ntrials=summary["ntrials"],
     )
-    # gets the trainng_phase by looking at the trials table
+    # gets the training phase of the last trial that recorded one, rather than of the last row of the trials table,
+    # which is NaN when the last trial doesn't have the key
     training_phase = (
-        trials_data["training_phase"].values[-1]
-        if "training_phase" in trials_data
+        summary["training_phase"]
+        if summary["training_phase"] is not None
         else DEFAULT_TRAINING_PHASE
     )
     # gets the adaptive gain
     adaptive_gain = session_info.task_settings.get(
         "ADAPTIVE_GAIN_VALUE", session_info.task_settings.get("AG_INIT_VALUE")
     )
-    if np.sum(trials_data["response_side"] != 0) > 200:
+    if summary["n_responses"] > 200:
         adaptive_gain = session_info.task_settings.get("STIM_GAIN")
     return (
         dict(
@@ -135,24 +136,36 @@ def training_contrasts_probabilities(phase=1):
     return frequencies / np.sum(frequencies)
 
 
-def draw_training_contrast(phase: int) -> float:
-    probabilities = training_contrasts_probabilities(phase)
-    return np.random.choice(CONTRASTS, p=probabilities)
+# the samplers of the training phases, and the phases indexed by their set of positive contrasts
+TRAINING_CONTRAST_SAMPLERS = {
+    phase: ContrastSampler(CONTRASTS, training_contrasts_probabilities(phase)) for phase in range(6)
+}
+_TRAINING_PHASES_BY_CONTRAST_SET = {
+    tuple(CONTRASTS[np.logical_and(sampler.probabilities > 0, CONTRASTS >= 0)]): phase
+    for phase, sampler in TRAINING_CONTRAST_SAMPLERS.items()
+}
+
+
+def draw_training_contrast(phase: int, size: int | None = None, rng: np.random.Generator | None = None) -> float | np.ndarray:
+    """
+    Draws signed contrasts according to the training phase
+    :param phase: training phase, from 0 to 5
+    :param size: number of contrasts to draw, defaults to a single value
+    :param rng: numpy random Generator, defaults to the global numpy random state
+    :return: contrast or array of contrasts
+    """
+    return TRAINING_CONTRAST_SAMPLERS[phase].draw(size, rng=rng)
 
 
 def contrasts_set(phase: int) -> np.array:
-    probabilities = training_contrasts_probabilities(phase)
-    return CONTRASTS[probabilities > 0]
+    sampler = TRAINING_CONTRAST_SAMPLERS[phase]
+    return sampler.contrasts[sampler.probabilities > 0]
 
 
 def training_phase_from_contrast_set(contrast_set: list[float]) -> int | None:
-    contrast_set = sorted(contrast_set)
-    for phase in range(6):
-        expected_set = CONTRASTS[
-            np.logical_and(training_contrasts_probabilities(phase) > 0, CONTRASTS >= 0)
-        ]
-        if np.array_equal(contrast_set, expected_set):
-            return phase
+    contrast_set = tuple(sorted(contrast_set))
+    if contrast_set in _TRAINING_PHASES_BY_CONTRAST_SET:
+        return _TRAINING_PHASES_BY_CONTRAST_SET[contrast_set]
     raise Exception(
         f"Could not determine training phase from contrast set {contrast_set}"
     )
@@ -1,6 +1,7 @@
 import argparse
 import datetime
 import json
+import math
 import shutil
 from collections.abc import Iterable
 from pathlib import Path
@@ -10,15 +11,18 @@ import yaml
 import iblrig
 from ibllib.io import raw_data_loaders
 from iblrig.hardware import Bpod
+from iblrig.local_cleanup import plan_local_cleanup
 from iblrig.online_plots import OnlinePlots
 from iblrig.path_helper import get_local_and_remote_paths, load_settings_yaml
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.raw_data_loaders import JsonableReader
 from iblrig.transfer_experiments import (
     BehaviorCopier,
     EphysCopier,
     SessionCopier,
     VideoCopier,
+    probe_states,
 )
+from iblrig.transfer_scheduler import TransferJob, TransferScheduler
 from iblutil.util import setup_logger
 
 logger = setup_logger("iblrig", level="INFO")
@@ -70,6 +74,30 @@ def _transfer_parser(description: str) -> argparse.ArgumentParser:
         dest="dry",
         help="do not remove local data after copying",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        dest="max_sessions",
+        default=4,
+        help="number of sessions copied in parallel (default: 4)",
+    )
+    parser.add_argument(
+        "--jobs-per-server",
+        action="store",
+        type=int,
+        dest="max_per_destination",
+        help="number of sessions copied in parallel to the same server share (default: same as --jobs)",
+    )
+    parser.add_argument(
+        "-b",
+        "--bandwidth",
+        action="store",
+        type=float,
+        dest="bandwidth",
+        help="maximum aggregate bandwidth in MB/s (default: no limit)",
+    )
     return parser
 
 
@@ -176,6 +204,8 @@ def _get_copiers(
         copier(f.parent, remote_subjects_folder)
         for f in local_subjects_folder.rglob(glob_pattern)
     ]
+    # resolves the copy states from a single listing of each remote folder
+    probe_states(copiers)
     if len(copiers) == 0:
         print("Could not find any sessions to copy to the local server.")
     elif interactive:
@@ -202,11 +232,45 @@ def _print_status(copiers: Iterable[SessionCopier], heading: str = "") -> None:
         print(f" * {copier.session_path}: {state}")
 
 
+def _run_copiers(
+    copiers: Iterable[SessionCopier],
+    max_sessions: int = 4,
+    bandwidth: float | None = None,
+    dry: bool = False,
+    max_per_destination: int | None = None,
+    **run_kwargs,
+) -> list[TransferJob]:
+    """
+    Transfers the sessions concurrently, see `iblrig.transfer_scheduler.TransferScheduler`
+    :param copiers: session copiers to run
+    :param max_sessions: maximum number of sessions copied in parallel
+    :param bandwidth: maximum aggregate bandwidth in MB/s, None for no limit
+    :param dry: if True, only logs the state of the sessions
+    :param max_per_destination: maximum number of sessions copied in parallel to the same server share,
+     None for no limit other than max_sessions
+    :param run_kwargs: keyword arguments passed to `SessionCopier.run`
+    :return: the list of transfer jobs
+    """
+    scheduler = TransferScheduler(
+        max_sessions=max_sessions,
+        max_per_destination=max_per_destination,
+        bandwidth=bandwidth * 1024**2 if bandwidth else None,
+    )
+    for copier in copiers:
+        logger.critical(f"{copier.state}, {copier.session_path}")
+        if not dry:
+            scheduler.add(copier, **run_kwargs)
+    return scheduler.run()
+
+
 def transfer_ephys_data(
     local_path: Path = None,
     remote_path: Path = None,
     dry: bool = False,
     interactive: bool = False,
+    max_sessions: int = 4,
+    bandwidth: float | None = None,
+    max_per_destination: int | None = None,
 ):
     local_subject_folder, remote_subject_folder = _get_subjects_folders(
         local_path, remote_path, interactive
@@ -215,10 +279,9 @@ def transfer_ephys_data(
         EphysCopier, local_path, remote_path, interactive=interactive
     )
 
-    for copier in copiers:
-        logger.critical(f"{copier.state}, {copier.session_path}")
-        if not dry:
-            copier.run()
+    _run_copiers(
+        copiers, max_sessions=max_sessions, bandwidth=bandwidth, dry=dry, max_per_destination=max_per_destination
+    )
 
     if interactive:
         _print_status(copiers, "States after transfer operation:")
@@ -238,6 +301,9 @@ def transfer_video_data(
     remote_path: Path = None,
     dry: bool = False,
     interactive: bool = False,
+    max_sessions: int = 4,
+    bandwidth: float | None = None,
+    max_per_destination: int | None = None,
 ):
     local_subject_folder, remote_subject_folder = _get_subjects_folders(
         local_path, remote_path, interactive
@@ -246,10 +312,9 @@ def transfer_video_data(
         VideoCopier, local_path, remote_path, interactive=interactive
     )
 
-    for copier in copiers:
-        logger.critical(f"{copier.state}, {copier.session_path}")
-        if not dry:
-            copier.run()
+    _run_copiers(
+        copiers, max_sessions=max_sessions, bandwidth=bandwidth, dry=dry, max_per_destination=max_per_destination
+    )
 
     if interactive:
         _print_status(copiers, "Session states after transfer operation:")
@@ -269,6 +334,9 @@ def transfer_data(
     remote_path: Path = None,
     dry: bool = False,
     interactive: bool = False,
+    max_sessions: int = 4,
+    bandwidth: float | None = None,
+    max_per_destination: int | None = None,
 ) -> None:
     """
     Copies the behavior data from the rig to the local server if the session has more than 42 trials
@@ -287,6 +355,12 @@ def transfer_data(
         in the settings/iblrig_settings.yaml file
     dry : bool
         Do not remove local data after copying if `dry` is True
+    max_sessions : int
+        Number of sessions copied in parallel
+    bandwidth : float
+        Maximum aggregate bandwidth in MB/s, None for no limit
+    max_per_destination : int
+        Number of sessions copied in parallel to the same server share, None for no limit other than max_sessions
 
     Returns
     -------
@@ -302,6 +376,7 @@ def transfer_data(
         BehaviorCopier, local_path, remote_path, interactive=interactive
     )
 
+    copiers_to_run = []
     for copier in copiers:
         session_path = copier.session_path
         task_settings = raw_data_loaders.load_settings(
@@ -320,8 +395,16 @@ def transfer_data(
                 if copier.remote_session_path.exists():
                     shutil.rmtree(copier.remote_session_path)
                 continue
-            trials, bpod_data = load_task_jsonable(jsonable)
-            ntrials = trials.shape[0]
+            # stream the trials rather than loading the full session with the bpod data
+            reader = JsonableReader(jsonable)
+            ntrials, ntrials_correct, water_delivered = 0, 0, 0
+            for trial in reader:
+                ntrials += 1
+                ntrials_correct += bool(trial["trial_correct"])
+                # the missing rewards are skipped like in a pandas sum
+                reward_amount = trial.get("reward_amount")
+                if reward_amount is not None and not math.isnan(reward_amount):
+                    water_delivered += reward_amount
             # we have the case where the session hard crashed. Patch the settings file to wrap the session
             # and continue the copying
             logger.warning(f"recovering crashed session {session_path}")
@@ -331,13 +414,15 @@ def transfer_data(
             with open(settings_file) as fid:
                 raw_settings = json.load(fid)
             raw_settings["NTRIALS"] = int(ntrials)
-            raw_settings["NTRIALS_CORRECT"] = int(trials["trial_correct"].sum())
-            raw_settings["TOTAL_WATER_DELIVERED"] = int(trials["reward_amount"].sum())
+            raw_settings["NTRIALS_CORRECT"] = int(ntrials_correct)
+            raw_settings["TOTAL_WATER_DELIVERED"] = int(water_delivered)
             # cast the timestamp in a datetime object and add the session length to it
             end_time = datetime.datetime.strptime(
                 raw_settings["SESSION_START_TIME"], "%Y-%m-%dT%H:%M:%S.%f"
             )
-            end_time += datetime.timedelta(seconds=bpod_data[-1]["Trial end timestamp"])
+            end_time += datetime.timedelta(
+                seconds=reader[-1]["behavior_data"]["Trial end timestamp"]
+            )
             raw_settings["SESSION_END_TIME"] = end_time.strftime("%Y-%m-%dT%H:%M:%S.%f")
             with open(settings_file, "w") as fid:
                 json.dump(raw_settings, fid)
@@ -350,8 +435,14 @@ def transfer_data(
             if copier.remote_session_path.exists():
                 shutil.rmtree(copier.remote_session_path)
             continue
-        logger.critical(f"{copier.state}, {copier.session_path}")
-        copier.run(number_of_expected_devices=number_of_expected_devices)
+        copiers_to_run.append(copier)
+    _run_copiers(
+        copiers_to_run,
+        max_sessions=max_sessions,
+        bandwidth=bandwidth,
+        max_per_destination=max_per_destination,
+        number_of_expected_devices=number_of_expected_devices,
+    )
 
     if interactive:
         _print_status(copiers, "States after transfer operation:")
@@ -369,42 +460,28 @@ def remove_local_sessions(
     weeks=2, local_path=None, remote_path=None, dry=False, tag="behavior"
 ):
     """
-    Remove local sessions older than 2 weeks
+    Remove local sessions older than 2 weeks, whose copy is finalized on the server
     :param weeks:
-    :param dry:
+    :param dry: if True, only logs the sessions that would be removed
+    :param tag: 'behavior', 'video' or 'ephys'
     :return:
     """
     local_subject_folder, remote_subject_folder = _get_subjects_folders(
         local_path, remote_path
     )
-    size = 0
     match tag:
         case "behavior":
             Copier = BehaviorCopier
         case "video":
             Copier = VideoCopier
-    for flag in sorted(
-        list(local_subject_folder.rglob(f"_ibl_experiment.description_{tag}.yaml")),
-        reverse=True,
-    ):
-        session_path = flag.parent
-        days_elapsed = (
-            datetime.datetime.now()
-            - datetime.datetime.strptime(session_path.parts[-2], "%Y-%m-%d")
-        ).days
-        if days_elapsed < (weeks * 7):
-            continue
-        sc = Copier(session_path, remote_subjects_folder=remote_subject_folder)
-        if sc.state == 3:
-            session_size = (
-                sum(f.stat().st_size for f in session_path.rglob("*") if f.is_file())
-                / 1024**3
-            )
-            logger.info(f"{sc.session_path}, {session_size:0.02f} Go")
-            size += session_size
-            if not dry:
-                shutil.rmtree(session_path)
-    logger.info(f"Cleanup size {size:0.02f} Go")
+        case "ephys":
+            Copier = EphysCopier
+    plan = plan_local_cleanup(
+        local_subject_folder, remote_subject_folder, copier=Copier, weeks=weeks
+    )
+    logger.info(plan)
+    if not dry:
+        plan.execute()
 
 
 def viewsession():
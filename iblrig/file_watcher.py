@@ -0,0 +1,136 @@
+"""
+Watchers signalling that a file has been written to.
+
+On Linux the `InotifyWatcher` is woken up by the kernel as soon as the file is modified. Elsewhere, or
+if inotify is not available, the `PollingWatcher` checks the size and modification time of the file.
+
+>>> watcher = file_watcher_factory(task_file)
+>>> while True:
+>>>     if watcher.wait(timeout=0.05):
+>>>         ...  # the file changed
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from iblutil.util import setup_logger
+
+log = setup_logger("iblrig")
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """
+    Detects changes of a file by polling its size and modification time
+    :param file: path of the watched file, it doesn't need to exist yet
+    :param interval: polling interval in seconds
+    """
+
+    def __init__(self, file: str | Path, interval: float = 0.1):
+        self.file = Path(file)
+        self.interval = interval
+        self._stat = self._get_stat()
+
+    def _get_stat(self):
+        try:
+            st = self.file.stat()
+            return st.st_size, st.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the file changes or the timeout expires
+        :param timeout: in seconds, None waits forever
+        :return: True if the file changed
+        """
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stat = self._get_stat()
+            if stat != self._stat:
+                self._stat = stat
+                return True
+            if t_end is not None and time.monotonic() >= t_end:
+                return False
+            sleep = self.interval if t_end is None else min(self.interval, max(t_end - time.monotonic(), 0))
+            time.sleep(sleep)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detects changes of a file with Linux inotify. The parent folder is watched so that the file can be
+    created, or replaced, after the watcher.
+    :param file: path of the watched file, its parent folder must exist
+    """
+
+    def __init__(self, file: str | Path):
+        self.file = Path(file)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(self.file.parent), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed on {self.file.parent}")
+
+    def _read_events(self) -> bool:
+        name = os.fsencode(self.file.name)
+        changed = False
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                changed |= buffer[offset : offset + length].rstrip(b"\0") == name
+                offset += length
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until the file changes or the timeout expires
+        :param timeout: in seconds, None waits forever
+        :return: True if the file changed
+        """
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if t_end is None else max(t_end - time.monotonic(), 0)
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return False
+            # events on other files of the folder are discarded
+            if self._read_events():
+                return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def file_watcher_factory(file: str | Path, interval: float = 0.1) -> InotifyWatcher | PollingWatcher:
+    """
+    Returns an inotify watcher on Linux, a polling watcher otherwise or if inotify fails
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(file)
+        except (OSError, AttributeError) as e:
+            log.warning(f"inotify not available, polling {file} instead: {e}")
+    return PollingWatcher(file, interval=interval)
@@ -14,6 +14,34 @@ from iblutil.util import setup_logger
 log = setup_logger("iblrig")
 
 
+def sliding_mean_diffs(arr, window: int = 20) -> np.ndarray:
+    """Means of the differences of each sliding window of `window` samples: the sum of the differences
+    of a window telescopes to its last minus its first value"""
+    arr = np.asarray(arr, dtype=np.int64)
+    return (arr[window - 1 :] - arr[: arr.size - window + 1]) / (window - 1)
+
+
+class SlidingMeanDiffExtrema:
+    """Running min and max of `sliding_mean_diffs` over samples received by chunks, the windows spanning
+    two chunks included"""
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self.min = np.inf
+        self.max = -np.inf
+        self.nwindows = 0
+        self._tail = np.empty(0, dtype=np.int64)
+
+    def update(self, values) -> None:
+        arr = np.r_[self._tail, np.asarray(values, dtype=np.int64)]
+        if arr.size >= self.window:
+            mean_diffs = sliding_mean_diffs(arr, self.window)
+            self.min = min(self.min, mean_diffs.min())
+            self.max = max(self.max, mean_diffs.max())
+            self.nwindows += mean_diffs.size
+        self._tail = arr[-(self.window - 1) :]
+
+
 def frame2ttl_factory(serial_port: str, version: int = 2):
     f2ttl = Frame2TTLv2(serial_port)
     if f2ttl.hw_version != 2:
@@ -287,6 +315,41 @@ class Frame2TTLv2(Frame2TTL):
             log.error(f"Failed to read {nsamples} samples from device")
         return values
 
+    def read_sensor_chunks(self, nsamples: int, chunk_size: int = 1000):
+        """Reads N contiguous samples from the sensor, yielding them by chunks as they arrive
+        Command: 5 bytes | [b"V" (uint8), nSamples (uint32)]
+        Response: 2 bytes * nsamples | [sensorValue (uint16) * nsamples]
+        """
+        self.serial.write(
+            b"V" + int.to_bytes(nsamples, 4, byteorder="little", signed=False)
+        )
+        dt = np.dtype(np.uint16)
+        dt = dt.newbyteorder("<")
+        nread = 0
+        while nread < nsamples:
+            n = min(chunk_size, nsamples - nread)
+            values = np.frombuffer(self.serial.read(n * 2), dtype=dt)
+            nread += len(values)
+            yield values
+            if len(values) != n:
+                log.error(f"Failed to read {nsamples} samples from device")
+                return
+
+    def _measure_manual(self, nsamples: int = 20000, dark=False, light=False):
+        """Streams the sensor values and computes the threshold while they arrive, see `_calc_threshold`"""
+        extrema = SlidingMeanDiffExtrema(window=20)
+        chunks = []
+        for values in self.read_sensor_chunks(nsamples):
+            chunks.append(values)
+            extrema.update(values)
+        arr = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.uint16)
+        if len(arr) != nsamples:
+            return arr, None
+        if dark:
+            return arr, extrema.min * 2
+        if light:
+            return arr, extrema.max * 1.5
+
     def read_value(self) -> int:
         """Read one value from sensor (current)"""
         return self.read_sensor()
@@ -307,12 +370,9 @@ class Frame2TTLv2(Frame2TTL):
             self.auto_light = threshold
             log.info(f"Auto LIGHT threshold value: {threshold}")
         elif mode == "manual":
-            arr = self.read_sensor(20000)
-            if len(arr) != 20000:
+            arr, threshold = self._measure_manual(20000, light=True)
+            if threshold is None:
                 log.warning("Manual LIGHT threshold value could not be determined.")
-                threshold = None
-            else:
-                threshold = self._calc_threshold(arr, light=True)
             self.manual_light = threshold
             log.info(f"Manual LIGHT threshold value: {threshold}")
             return arr, threshold
@@ -333,12 +393,9 @@ class Frame2TTLv2(Frame2TTL):
             self.auto_dark = threshold
             log.info(f"Auto DARK threshold value: {threshold}")
         elif mode == "manual":
-            arr = self.read_sensor(20000)
-            if len(arr) != 20000:
+            arr, threshold = self._measure_manual(20000, dark=True)
+            if threshold is None:
                 log.warning("Manual DARK threshold value could not be determined.")
-                threshold = None
-            else:
-                threshold = self._calc_threshold(arr, dark=True)
             self.manual_dark = threshold
             log.info(f"Manual DARK threshold value: {threshold}")
             return arr, threshold
@@ -352,10 +409,7 @@ class Frame2TTLv2(Frame2TTL):
         - If the array is from a white sync square this will set the dark threshold
         by multiplying the min mean diff value by 2
         """
-        mean_diffs = []
-        for i, _ in enumerate(arr):
-            if i + 20 <= len(arr):
-                mean_diffs.append(np.diff(arr[i : i + 20]).mean())
+        mean_diffs = sliding_mean_diffs(arr, window=20)
         if dark:
             return np.min(mean_diffs) * 2
         if light:
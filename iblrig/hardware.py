@@ -9,14 +9,16 @@ import struct
 import subprocess
 import threading
 import time
+from contextlib import contextmanager
 from enum import IntEnum
 from pathlib import Path
+from typing import Callable, Hashable
 
 import numpy as np
 import serial
 import sounddevice as sd
 from serial.tools import list_ports
-from iblrig.rotary_encoder_module import RotaryEncoderModule
+from iblrig.rotary_encoder_module import RotaryEncoderModule, RotaryEncoderStream
 
 import iblrig.path_helper
 
@@ -25,6 +27,7 @@ from iblrig.tools import static_vars
 from iblutil.util import Bunch, setup_logger
 from pybpod_rotaryencoder_module.module import RotaryEncoder
 from pybpodapi.bpod.bpod_io import BpodIO
+from pybpodapi.protocol import StateMachine
 
 HARDWARE_SETTINGS = iblrig.path_helper.load_settings_yaml("hardware_settings.yaml")
 
@@ -92,6 +95,35 @@ class Bpod(BpodIO):
         super().close()
         self._is_initialized = False
 
+    @staticmethod
+    def compile_state_machine(sma: StateMachine, run_asap: bool | None = None) -> bytes:
+        """
+        Serializes a state machine into the exact payload that `send_state_machine` writes to the device.
+        The payload only depends on the state machine description, so it can be built once and re-sent
+        for every trial that uses the same state machine.
+
+        :param sma: state machine description
+        :param run_asap: passed through to the state machine header, see `send_state_machine`
+        :return: bytes message ready for `send_compiled_state_machine`
+        """
+        sma.update_state_numbers()
+        body = sma.build_message() + sma.build_message_global_timer() + sma.build_message_32_bits()
+        return sma.build_header(run_asap, len(body)) + body
+
+    def send_compiled_state_machine(self, message: bytes) -> None:
+        """
+        Sends a state machine payload previously built by `compile_state_machine`.
+        Equivalent to `send_state_machine` without rebuilding the message.
+
+        :param message: bytes returned by `compile_state_machine`
+        """
+        if not self.bpod_com_ready:
+            raise Exception("Bpod connection is closed")
+        if self._skip_all_trials is True:
+            return
+        self._bpodcom_send_state_machine(message)
+        self._new_sma_sent = True
+
     def __del__(self):
         with self._lock:
             if self.serial_port in Bpod._instances:
@@ -241,10 +273,59 @@ class Bpod(BpodIO):
         )
 
 
+class StateMachineCache:
+    """
+    Keeps the state machines of a session along with their compiled payload, keyed by the trial
+    parameters they depend on. Building and serializing a state machine is only done the first time
+    a key is seen, subsequent trials re-use the cached objects.
+    """
+
+    def __init__(self):
+        self._cache: dict[Hashable, tuple[StateMachine, bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._cache
+
+    def get(self, key: Hashable | None, build: Callable[[], StateMachine]) -> tuple[StateMachine, bytes]:
+        """
+        Returns the state machine and its compiled payload for the given key, building them if needed.
+
+        :param key: hashable trial parameters the state machine depends on, None disables caching
+        :param build: callable without arguments returning a new state machine
+        :return: (state machine, bytes payload)
+        """
+        if key is None:
+            sma = build()
+            return sma, Bpod.compile_state_machine(sma)
+        if key not in self._cache:
+            sma = build()
+            self._cache[key] = (sma, Bpod.compile_state_machine(sma))
+            log.debug(f"Compiled state machine for key {key}, {len(self._cache)} cached")
+        sma, message = self._cache[key]
+        # the runner keeps track of the current state in the object itself, rewind before re-use
+        sma.current_state = 0
+        sma.is_running = False
+        return sma, message
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
 class MyRotaryEncoder:
-    def __init__(self, gain, com, connect=False):
+    def __init__(self, gain, com, connect=False, stream=False):
+        """
+        :param stream: if True, the module streams its position to a background reader and
+         `get_angle` returns the latest streamed sample instead of querying the module
+        """
         self.RE_PORT = com
         self.connected = False
+        self.use_stream = stream
+        self.stream = None
+        # the encoder may be queried by the corridor render thread and the task at the same time
+        self._lock = threading.Lock()
         # How many degrees to turn forward before triggering the reward
         position_at_reward = (
             HARDWARE_SETTINGS.corridor["DISTANCE_TO_REWARD_ZONE"]
@@ -273,7 +354,21 @@ class MyRotaryEncoder:
         # Dict mapping threshold crossings with name ov RE event
         self.THRESHOLD_EVENTS = dict(zip(self.SET_THRESHOLDS, self.ENCODER_EVENTS))
 
+    @contextmanager
+    def _command(self):
+        """Exclusive access to the serial port for commands expecting an answer from the module"""
+        with self._lock:
+            if self.stream is None:
+                yield
+            else:
+                with self.stream.paused():
+                    yield
+
     def set_thresholds(self) -> None:
+        with self._command():
+            self._set_thresholds()
+
+    def _set_thresholds(self) -> None:
         self.rotary_encoder.enable_thresholds(self.ENABLE_THRESHOLDS)
         self.rotary_encoder.set_thresholds(self.SET_THRESHOLDS)
 
@@ -283,20 +378,57 @@ class MyRotaryEncoder:
         self.rotary_encoder = RotaryEncoderModule(serialport=self.RE_PORT, hardware_version=HARDWARE_SETTINGS.device_rotary_encoder["HARDWARE_VERSION"])
         # Reading the current position doesn't work unless you do this
         self.rotary_encoder.disable_stream()
+        # the module may still be streaming from a previous session that didn't stop it
+        self.rotary_encoder.drain_input()
         self.rotary_encoder.set_zero_position()
         self.set_thresholds()
         self.rotary_encoder.enable_evt_transmission()
         # Disable wrapping so we don't need to count the number of turns
         self.rotary_encoder.set_wrappoint(0)
         self.connected = True
+        if self.use_stream:
+            self.stream = RotaryEncoderStream(self.rotary_encoder)
+            self.stream.start()
 
     def reset_position(self):
+        with self._command():
+            self._reset_position()
+
+    def _reset_position(self) -> None:
         # I don't know if both of these are necessary
         self.rotary_encoder.set_position(0)
         self.rotary_encoder.set_zero_position()
+        if self.stream is not None:
+            # the module only streams when the wheel moves
+            last = self.stream.latest()
+            self.stream.append(0.0 if last is None else last[0], 0)
+
+    def reset_trial(self) -> None:
+        """Resets the position and the thresholds before a trial, within a single pause of the stream"""
+        with self._command():
+            self._reset_position()
+            self._set_thresholds()
+
+    def stop_stream(self) -> None:
+        """Stops the position stream, the module would otherwise keep streaming after the session"""
+        with self._lock:
+            if self.stream is not None:
+                self.stream.stop()
+                self.stream = None
 
     def get_angle(self) -> float | None:
-        return self.rotary_encoder.current_position() if self.connected else None
+        if not self.connected:
+            return None
+        if self.stream is not None:
+            return self.stream.latest_degrees()
+        with self._lock:
+            return self.rotary_encoder.current_position()
+
+    def latest_angle(self) -> float | None:
+        """Latest streamed position, it never queries the module: None if the encoder is not streaming"""
+        if self.stream is None:
+            return None
+        return self.stream.latest_degrees()
 
 
 def sound_device_factory(output="sysdefault", samplerate=None):
@@ -0,0 +1,122 @@
+"""
+Removal of the local sessions that are safely stored on the server.
+
+The local subjects folder is walked once with os.scandir: the sessions older than the retention period
+are selected from the date folder names, and their size is computed while listing them. The copy states
+of all the candidates are then resolved with a single listing of each remote folder, see
+`iblrig.transfer_experiments.probe_states`. The resulting plan can be reviewed before the sessions are
+deleted, in parallel.
+
+>>> plan = plan_local_cleanup(local_subjects_folder, remote_subjects_folder, weeks=2)
+>>> print(plan)
+>>> plan.execute()
+"""
+
+import datetime
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from iblrig.transfer_experiments import SessionCopier, probe_states
+from iblutil.util import setup_logger
+
+log = setup_logger("iblrig", level="INFO")
+
+
+def _scan_session(session_path: str, description_file: str) -> tuple[bool, int]:
+    """:return: whether the description file is at the root of the session folder, and the size of the folder"""
+    size, has_description = 0, False
+    stack = [session_path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+                    has_description |= entry.name == description_file and os.path.dirname(entry.path) == session_path
+    return has_description, size
+
+
+def _subdirectories(folder: str) -> list[os.DirEntry]:
+    try:
+        with os.scandir(folder) as entries:
+            return sorted((e for e in entries if e.is_dir(follow_symlinks=False)), key=lambda e: e.name)
+    except FileNotFoundError:
+        return []
+
+
+@dataclass
+class CleanupPlan:
+    """Sessions to delete, with their size in bytes"""
+
+    sessions: list[tuple[Path, int]] = field(default_factory=list)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self.sessions)
+
+    def __str__(self) -> str:
+        lines = [f"{session_path}, {size / 1024 ** 3:0.02f} Go" for session_path, size in self.sessions]
+        lines.append(f"Cleanup size {self.total_bytes / 1024 ** 3:0.02f} Go")
+        return "\n".join(lines)
+
+    def execute(self, max_workers: int = 4) -> int:
+        """
+        Deletes the sessions of the plan
+        :param max_workers: number of sessions deleted in parallel
+        :return: number of bytes reclaimed
+        """
+        reclaimed = 0
+
+        def remove(session: tuple[Path, int]) -> int:
+            try:
+                shutil.rmtree(session[0])
+                return session[1]
+            except OSError as e:
+                log.error(f"Could not remove {session[0]}: {e}")
+                return 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for size in executor.map(remove, self.sessions):
+                reclaimed += size
+        return reclaimed
+
+
+def plan_local_cleanup(
+    local_subjects_folder: Path,
+    remote_subjects_folder: Path,
+    copier: type[SessionCopier],
+    weeks: float = 2,
+    now: datetime.datetime | None = None,
+) -> CleanupPlan:
+    """
+    Lists the local sessions older than `weeks` whose copy is finalized on the server
+    :param local_subjects_folder: local Subjects folder
+    :param remote_subjects_folder: remote Subjects folder
+    :param copier: SessionCopier class of the device, its tag selects the sessions by experiment description file
+    :param weeks: retention period
+    :param now: reference date, defaults to the current date
+    :return: CleanupPlan
+    """
+    now = now or datetime.datetime.now()
+    description_file = f"_ibl_experiment.description_{copier.tag}.yaml"
+    candidates = []
+    for subject in _subdirectories(str(local_subjects_folder)):
+        for date in _subdirectories(subject.path):
+            try:
+                days_elapsed = (now - datetime.datetime.strptime(date.name, "%Y-%m-%d")).days
+            except ValueError:
+                continue
+            if days_elapsed < (weeks * 7):
+                continue
+            for number in _subdirectories(date.path):
+                has_description, size = _scan_session(number.path, description_file)
+                if has_description:
+                    candidates.append((copier(number.path, remote_subjects_folder=remote_subjects_folder), size))
+    # most recent sessions first
+    candidates.sort(key=lambda c: c[0].session_path.parts[-2:], reverse=True)
+    probe_states([c for c, _ in candidates])
+    return CleanupPlan(sessions=[(c.session_path, size) for c, size in candidates if c.state == 3])
@@ -7,6 +7,7 @@ repo change over time.
 """
 import argparse
 import datetime
+import functools
 from pathlib import Path
 from typing import Literal
 
@@ -154,10 +155,14 @@ def get_port_events(events: dict, name: str = "") -> list:
 
 
 def truncated_exponential(
-    scale: float = 0.35, min_value: float = 0.2, max_value: float = 0.5
-) -> float:
+    scale: float = 0.35,
+    min_value: float = 0.2,
+    max_value: float = 0.5,
+    size: int | tuple[int, ...] | None = None,
+    rng: np.random.Generator | None = None,
+) -> float | np.ndarray:
     """
-    Generate a truncated exponential random variable within a specified range.
+    Generate truncated exponential random variables within a specified range.
 
     Parameters
     ----------
@@ -167,28 +172,29 @@ def truncated_exponential(
         Minimum value for the truncated range. Defaults to 0.2.
     max_value : float, optional
         Maximum value for the truncated range. Defaults to 0.5.
+    size : int or tuple of ints, optional
+        Output shape. Defaults to None, in which case a single value is returned.
+    rng : numpy.random.Generator, optional
+        Random generator. Defaults to None, in which case the global numpy random state is used.
 
     Returns
     -------
-    float
-        Truncated exponential random variable.
+    float or np.ndarray
+        Truncated exponential random variable(s).
 
     Notes
     -----
-    This function generates a random variable from an exponential distribution
-    with the specified `scale`. It then checks if the generated value is within
-    the specified range `[min_value, max_value]`. If it is within the range, it returns
-    the generated value; otherwise, it recursively generates a new value until it falls
-    within the specified range.
-
-    The `scale` should typically be greater than or equal to the `min_value` to avoid
-    potential issues with infinite recursion.
+    The values are drawn by inverting the cumulative distribution function of the exponential
+    distribution restricted to `[min_value, max_value]`:
+
+        x = min_value - scale * log(1 - u * (1 - exp(-(max_value - min_value) / scale)))
+
+    with `u` uniform in [0, 1). Each value costs a single uniform draw, whatever the ratio between
+    `scale` and the range, and there is no rejection.
     """
-    x = np.random.exponential(scale)
-    if min_value <= x <= max_value:
-        return x
-    else:
-        return truncated_exponential(scale, min_value, max_value)
+    rng = np.random if rng is None else rng
+    u = rng.random(size)
+    return min_value - scale * np.log1p(u * np.expm1(-(max_value - min_value) / scale))
 
 
 def get_biased_probs(n: int, idx: int = -1, p_idx: float = 0.5) -> list[float]:
@@ -232,12 +238,102 @@ def get_biased_probs(n: int, idx: int = -1, p_idx: float = 0.5) -> list[float]:
     return p
 
 
+class ContrastSampler:
+    """
+    Draws contrasts from a fixed set, with the cumulative distribution computed once
+
+    Parameters
+    ----------
+    contrast_set : list[float]
+        The set of contrast values from which to draw.
+    probabilities : list[float], optional
+        Probability of each contrast, defaults to a uniform distribution.
+    rng : numpy.random.Generator, optional
+        Random generator shared by the draws. Defaults to None, in which case the global numpy
+        random state is used.
+    """
+
+    def __init__(
+        self,
+        contrast_set: list[float],
+        probabilities: list[float] | None = None,
+        rng: np.random.Generator | None = None,
+    ):
+        self.contrasts = np.asarray(contrast_set)
+        if self.contrasts.size == 0:
+            raise ValueError("The contrast set is empty.")
+        if probabilities is None:
+            probabilities = np.full(self.contrasts.size, 1 / self.contrasts.size)
+        self.probabilities = np.asarray(probabilities, dtype=float)
+        self.cdf = np.cumsum(self.probabilities)
+        self.cdf /= self.cdf[-1]
+        self.rng = rng
+
+    def draw(
+        self, size: int | tuple[int, ...] | None = None, rng: np.random.Generator | None = None
+    ) -> float | np.ndarray:
+        """
+        Draw one or several contrasts
+
+        Parameters
+        ----------
+        size : int or tuple of ints, optional
+            Output shape, ie. the number of trials of a session. Defaults to None, in which case a
+            single value is returned.
+        rng : numpy.random.Generator, optional
+            Random generator for this draw, defaults to the generator of the sampler.
+
+        Returns
+        -------
+        float or np.ndarray
+            The drawn contrast value(s).
+        """
+        rng = rng or self.rng or np.random
+        idx = np.searchsorted(self.cdf, rng.random(size), side="right")
+        return self.contrasts[np.minimum(idx, self.contrasts.size - 1)]
+
+
+@functools.lru_cache(maxsize=64)
+def _contrast_sampler(
+    contrast_set: tuple[float, ...], probability_type: str, idx: int, idx_probability: float
+) -> ContrastSampler:
+    if probability_type in ["skew_zero", "biased"]:
+        p = get_biased_probs(n=len(contrast_set), idx=idx, p_idx=idx_probability)
+        return ContrastSampler(contrast_set, p)
+    elif probability_type == "uniform":
+        return ContrastSampler(contrast_set)
+    else:
+        raise ValueError(
+            "Unsupported probability_type. Use 'skew_zero', 'biased', or 'uniform'."
+        )
+
+
+def get_contrast_sampler(
+    contrast_set: list[float],
+    probability_type: Literal["skew_zero", "biased", "uniform"] = "biased",
+    idx: int = -1,
+    idx_probability: float = 0.5,
+) -> ContrastSampler:
+    """
+    Get the sampler of a contrast set and probability type, see `draw_contrast`. The samplers are
+    cached, so that the probabilities are computed once per set of parameters.
+
+    Returns
+    -------
+    ContrastSampler
+        The contrast sampler, drawing from the global numpy random state by default.
+    """
+    return _contrast_sampler(tuple(contrast_set), probability_type, idx, idx_probability)
+
+
 def draw_contrast(
     contrast_set: list[float],
     probability_type: Literal["skew_zero", "biased", "uniform"] = "biased",
     idx: int = -1,
     idx_probability: float = 0.5,
-) -> float:
+    size: int | tuple[int, ...] | None = None,
+    rng: np.random.Generator | None = None,
+) -> float | np.ndarray:
     """
     Draw a contrast value from a given iterable based to the specified probability type
 
@@ -254,26 +350,22 @@ def draw_contrast(
         Index for probability manipulation (with "skew_zero" or "biased"), default: -1.
     idx_probability : float, optional
         Probability for the specified index (with "skew_zero" or "biased"), default: 0.5.
+    size : int or tuple of ints, optional
+        Number of contrasts to draw, default: None, a single value is drawn.
+    rng : numpy.random.Generator, optional
+        Random generator, default: None, the global numpy random state is used.
 
     Returns
     -------
-    float
-        The drawn contrast value.
+    float or np.ndarray
+        The drawn contrast value(s).
 
     Raises
     ------
     ValueError
         If an unsupported `probability_type` is provided.
     """
-    if probability_type in ["skew_zero", "biased"]:
-        p = get_biased_probs(n=len(contrast_set), idx=idx, p_idx=idx_probability)
-        return np.random.choice(contrast_set, p=p)
-    elif probability_type == "uniform":
-        return np.random.choice(contrast_set)
-    else:
-        raise ValueError(
-            "Unsupported probability_type. Use 'skew_zero', 'biased', or 'uniform'."
-        )
+    return get_contrast_sampler(contrast_set, probability_type, idx, idx_probability).draw(size, rng=rng)
 
 
 def online_std(
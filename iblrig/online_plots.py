@@ -1,18 +1,19 @@
 import datetime
 import json
-import time
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
-from pandas.api.types import CategoricalDtype
+from matplotlib.colors import to_hex
+from matplotlib.transforms import Bbox
 
 import one.alf.io
 from iblrig.choiceworld import get_subject_training_info
 from iblrig.misc import online_std
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.file_watcher import file_watcher_factory
+from iblrig.raw_data_loaders import JsonableReader, load_task_jsonable
 from iblutil.util import Bunch
 
 NTRIALS_INIT = 2000
@@ -24,6 +25,28 @@ ENGAGED_CRITIERION = {"secs": 45 * 60, "trial_count": 400}
 sns.set_style("darkgrid")
 
 
+LAST_TRIALS_COLUMNS = [
+    "correct",
+    "signed_contrast",
+    "stim_on",
+    "play_tone",
+    "reward_time",
+    "error_time",
+    "response_time",
+]
+SIGNED_CONTRAST_SET = np.r_[-np.flipud(CONTRAST_SET[1:]), CONTRAST_SET]
+PSYCHOMETRICS_COLUMNS = ["count", "response_time", "choice", "response_time_std", "choice_std"]
+# positions in the sets, the task parameters take these exact values
+PROBABILITY_INDEX = {p: i for i, p in enumerate(PROBABILITY_SET.tolist())}
+SIGNED_CONTRAST_INDEX = {c: i for i, c in enumerate(SIGNED_CONTRAST_SET.tolist())}
+
+
+def _set_index(index: dict, values: np.ndarray, x: float) -> int:
+    """position of x in a set of values, falls back to the nearest value if x isn't exactly in the set"""
+    i = index.get(x)
+    return int(np.argmin(np.abs(values - x))) if i is None else i
+
+
 class DataModel:
     """
     The data model is a pure numpy / pandas container for the choice world task.
@@ -32,6 +55,12 @@ class DataModel:
     per signed contrast and block contingency
     - a last trials dataframe that contains 20 trials worth of data for the timeline view
     - various counters such as ntrials and water delivered
+
+    The data is held in preallocated numpy arrays: ring buffers for the last trials and a dense
+    (probability x signed contrast) array for the psychometrics, that `update_trial` writes in place
+    without copying nor resizing them, besides the amortized growth of the response times.
+    The plots read the arrays with `last_trials_column` and `psychometrics_column`, the dataframe
+    properties are built on demand for the other callers.
     """
 
     task_settings = None
@@ -42,138 +71,78 @@ class DataModel:
         :param task_file:
         """
         self.session_path = one.alf.files.get_session_path(task_file) or ""
-        self.last_trials = pd.DataFrame(
-            columns=[
-                "correct",
-                "signed_contrast",
-                "stim_on",
-                "play_tone",
-                "reward_time",
-                "error_time",
-                "response_time",
-            ],
-            index=np.arange(NTRIALS_PLOT),
-        )
+        # ring buffers for the last trials, the oldest trial is at index self._ring_start
+        self._ring_start = 0
+        self._last_trials = np.full((NTRIALS_PLOT, len(LAST_TRIALS_COLUMNS)), np.nan)
+        self._rgb_background = np.ones((NTRIALS_PLOT, 1, 3), dtype=np.uint8) * 229
+        self._last_contrasts = np.zeros((NTRIALS_PLOT, 2))
+        # psychometrics accumulator, shape (probability, signed contrast, column)
+        self._psychometrics = np.full((PROBABILITY_SET.size, SIGNED_CONTRAST_SET.size, len(PSYCHOMETRICS_COLUMNS)), np.nan)
+        self._psychometrics[:, :, 0] = 0
+        self._response_times = np.full(NTRIALS_INIT, np.nan)
+        self.ntrials = 0
+        self.ntrials_correct = 0
+        self.ntrials_nan = np.nan
+        self.percent_correct = np.nan
+        self.percent_error = np.nan
+        self.water_delivered = 0
+        self.time_elapsed = 0
+        self.ntrials_engaged = 0  # those are the trials happening within the first 400s
 
-        if task_file is None or not Path(task_file).exists():
-            self.psychometrics = pd.DataFrame(
-                columns=[
-                    "count",
-                    "response_time",
-                    "choice",
-                    "response_time_std",
-                    "choice_std",
-                ],
-                index=pd.MultiIndex.from_product(
-                    [PROBABILITY_SET, np.r_[-np.flipud(CONTRAST_SET[1:]), CONTRAST_SET]]
-                ),
-            )
-            self.psychometrics["count"] = 0
-            self.trials_table = pd.DataFrame(
-                columns=["response_time"], index=np.arange(NTRIALS_INIT)
-            )
-            self.ntrials = 0
-            self.ntrials_correct = 0
-            self.ntrials_nan = np.nan
-            self.percent_correct = np.nan
-            self.percent_error = np.nan
-            self.water_delivered = 0
-            self.time_elapsed = 0
-            self.ntrials_engaged = (
-                0  # those are the trials happening within the first 400s
-            )
-        else:
+        if task_file is not None and Path(task_file).exists():
             self.get_task_settings(Path(task_file).parent)
             trials_table, bpod_data = load_task_jsonable(task_file)
-            # here we take the end time of the first trial as reference to avoid factoring in the delay
-            self.time_elapsed = (
-                bpod_data[-1]["Trial end timestamp"]
-                - bpod_data[0]["Trial end timestamp"]
-            )
-            trials_table["signed_contrast"] = (
-                np.sign(trials_table["position"]) * trials_table["contrast"]
-            )
-            trials_table["choice"] = trials_table["position"] > 0
-            trials_table.loc[~trials_table.trial_correct, "choice"] = ~trials_table[
-                "choice"
-            ][~trials_table.trial_correct]
-            trials_table["contrast"] = trials_table["contrast"].astype(
-                CategoricalDtype(
-                    categories=np.unique(np.r_[-CONTRAST_SET, CONTRAST_SET]),
-                    ordered=True,
-                )
-            )
-            trials_table["stim_probability_left"] = trials_table[
-                "stim_probability_left"
-            ].astype(CategoricalDtype(categories=PROBABILITY_SET, ordered=True))
-            self.psychometrics = trials_table.groupby(
-                ["stim_probability_left", "signed_contrast"]
-            ).agg(
-                count=pd.NamedAgg(column="signed_contrast", aggfunc="count"),
-                response_time=pd.NamedAgg(column="response_time", aggfunc=np.nanmean),
-                choice=pd.NamedAgg(column="choice", aggfunc="mean"),
-                response_time_std=pd.NamedAgg(
-                    column="response_time", aggfunc=np.nanstd
-                ),
-                choice_std=pd.NamedAgg(column="choice", aggfunc=np.nanmean),
-            )
-            self.ntrials = trials_table.shape[0]
-            self.ntrials_correct = np.sum(trials_table.trial_correct)
-            self.ntrials_nan = self.ntrials if self.ntrials > 0 else np.nan
-            self.percent_correct = self.ntrials_correct / self.ntrials_nan * 100
-            # agg.water_delivered = trials_table.water_delivered.iloc[-1]
-            self.water_delivered = trials_table.reward_amount.sum()
-            # init the last trials table
-            it = self.last_trials.index[-np.minimum(self.ntrials, NTRIALS_PLOT) :]
-            self.last_trials.loc[it, "correct"] = trials_table.trial_correct.iloc[
-                -NTRIALS_PLOT:
-            ].values
-            self.last_trials.loc[
-                it, "signed_contrast"
-            ] = trials_table.signed_contrast.iloc[-NTRIALS_PLOT:].values
-            self.last_trials.loc[it, "response_time"] = trials_table.response_time.iloc[
-                -NTRIALS_PLOT:
-            ].values
-            self.last_trials.loc[it, "stim_on"] = np.array(
-                [
-                    bpod_data[i]["States timestamps"]["stim_on"][0][0]
-                    for i in np.arange(-it.size, 0)
-                ]
-            )
-            self.last_trials.loc[it, "play_tone"] = np.array(
-                [
-                    bpod_data[i]["States timestamps"]["play_tone"][0][0]
-                    for i in np.arange(-it.size, 0)
-                ]
-            )
-            self.last_trials.loc[it, "reward_time"] = np.array(
-                [
-                    bpod_data[i]["States timestamps"]["reward"][0][0]
-                    for i in np.arange(-it.size, 0)
-                ]
-            )
-            self.last_trials.loc[it, "error_time"] = np.array(
-                [
-                    bpod_data[i]["States timestamps"]["error"][0][0]
-                    for i in np.arange(-it.size, 0)
-                ]
-            )
-            # we keep only a single column as buffer
-            self.trials_table = trials_table[["response_time"]]
-        # for the trials plots this is the background image showing green if correct, red if incorrect
-        self.rgb_background = np.ones((NTRIALS_PLOT, 1, 3), dtype=np.uint8) * 229
-        self.rgb_background[self.last_trials.correct == False, 0, 0] = 255  # noqa
-        self.rgb_background[self.last_trials.correct == True, 0, 1] = 255  # noqa
-        # keep the last contrasts as a 20 by 2 array
-        ileft = np.where(self.last_trials.signed_contrast < 0)[
-            0
-        ]  # negative position is left
-        iright = np.where(self.last_trials.signed_contrast > 0)[0]
-        self.last_contrasts = np.zeros((NTRIALS_PLOT, 2))
-        self.last_contrasts[ileft, 0] = np.abs(self.last_trials.signed_contrast[ileft])
-        self.last_contrasts[iright, 1] = np.abs(
-            self.last_trials.signed_contrast[iright]
+            for i in range(trials_table.shape[0]):
+                self.update_trial(trials_table.iloc[i], bpod_data[i])
+            if len(bpod_data) > 0:
+                # here we take the end time of the first trial as reference to avoid factoring in the delay
+                self.time_elapsed = bpod_data[-1]["Trial end timestamp"] - bpod_data[0]["Trial end timestamp"]
+
+    @property
+    def _ring_order(self) -> np.ndarray:
+        return (self._ring_start + np.arange(NTRIALS_PLOT)) % NTRIALS_PLOT
+
+    @property
+    def last_trials(self) -> pd.DataFrame:
+        """last trials table, the most recent trial being the last row"""
+        last_trials = pd.DataFrame(
+            self._last_trials[self._ring_order], columns=LAST_TRIALS_COLUMNS, index=np.arange(NTRIALS_PLOT)
+        )
+        last_trials["correct"] = [np.nan if np.isnan(c) else bool(c) for c in last_trials["correct"]]
+        return last_trials
+
+    def last_trials_column(self, column: str) -> np.ndarray:
+        """a column of `last_trials` as a numpy array, the most recent trial being the last element"""
+        return self._last_trials[self._ring_order, LAST_TRIALS_COLUMNS.index(column)]
+
+    @property
+    def rgb_background(self) -> np.ndarray:
+        """for the trials plots this is the background image showing green if correct, red if incorrect"""
+        return self._rgb_background[self._ring_order]
+
+    @property
+    def last_contrasts(self) -> np.ndarray:
+        """the last contrasts as a 20 by 2 array (left, right)"""
+        return self._last_contrasts[self._ring_order]
+
+    @property
+    def psychometrics(self) -> pd.DataFrame:
+        psychometrics = pd.DataFrame(
+            self._psychometrics.reshape(-1, len(PSYCHOMETRICS_COLUMNS)),
+            columns=PSYCHOMETRICS_COLUMNS,
+            index=pd.MultiIndex.from_product([PROBABILITY_SET, SIGNED_CONTRAST_SET]),
         )
+        psychometrics["count"] = psychometrics["count"].astype(int)
+        return psychometrics
+
+    def psychometrics_column(self, probability: float, column: str) -> np.ndarray:
+        """view of a column of `psychometrics` for a block probability, one value per SIGNED_CONTRAST_SET"""
+        ip = _set_index(PROBABILITY_INDEX, PROBABILITY_SET, probability)
+        return self._psychometrics[ip, :, PSYCHOMETRICS_COLUMNS.index(column)]
+
+    @property
+    def trials_table(self) -> pd.DataFrame:
+        return pd.DataFrame({"response_time": self._response_times[: max(self.ntrials, NTRIALS_INIT)]})
 
     def get_task_settings(self, session_directory: str | Path) -> None:
         task_settings_file = Path(session_directory).joinpath(
@@ -200,58 +169,37 @@ class DataModel:
             if trial_data.trial_correct
             else trial_data.position < 0
         )
-        self.trials_table.at[self.ntrials, "response_time"] = trial_data.response_time
+        if self.ntrials > self._response_times.size:
+            # amortized growth, only happens every NTRIALS_INIT * 2 ** n trials
+            self._response_times = np.r_[self._response_times, np.full(self._response_times.size, np.nan)]
+        self._response_times[self.ntrials - 1] = trial_data.response_time
 
         # update psychometrics using online statistics method
-        indexer = (trial_data.stim_probability_left, signed_contrast)
-        self.psychometrics.loc[indexer, ("count")] += 1
-        (
-            self.psychometrics.loc[indexer, ("response_time")],
-            self.psychometrics.loc[indexer, ("response_time_std")],
-        ) = online_std(
-            new_sample=trial_data.response_time,
-            new_count=self.psychometrics.loc[indexer, ("count")],
-            old_mean=self.psychometrics.loc[indexer, ("response_time")],
-            old_std=self.psychometrics.loc[indexer, ("response_time_std")],
-        )
-        (
-            self.psychometrics.loc[indexer, ("choice")],
-            self.psychometrics.loc[indexer, ("choice_std")],
-        ) = online_std(
-            new_sample=float(choice),
-            new_count=self.psychometrics.loc[indexer, ("count")],
-            old_mean=self.psychometrics.loc[indexer, ("choice")],
-            old_std=self.psychometrics.loc[indexer, ("choice_std")],
+        ip = _set_index(PROBABILITY_INDEX, PROBABILITY_SET, trial_data.stim_probability_left)
+        ic = _set_index(SIGNED_CONTRAST_INDEX, SIGNED_CONTRAST_SET, signed_contrast)
+        psy = self._psychometrics[ip, ic]
+        psy[0] += 1
+        psy[1], psy[3] = online_std(
+            new_sample=trial_data.response_time, new_count=psy[0], old_mean=psy[1], old_std=psy[3]
         )
-        # update last trials table
-        self.last_trials = self.last_trials.shift(-1)
-        i = NTRIALS_PLOT - 1
-        self.last_trials.at[i, "correct"] = trial_data.trial_correct
-        self.last_trials.at[i, "signed_contrast"] = signed_contrast
-        self.last_trials.at[i, "stim_on"] = bpod_data["States timestamps"]["stim_on"][
-            0
-        ][0]
-        self.last_trials.at[i, "play_tone"] = bpod_data["States timestamps"][
-            "play_tone"
-        ][0][0]
-        self.last_trials.at[i, "reward_time"] = bpod_data["States timestamps"][
-            "reward"
-        ][0][0]
-        self.last_trials.at[i, "error_time"] = bpod_data["States timestamps"]["error"][
-            0
-        ][0]
-        self.last_trials.at[i, "response_time"] = trial_data.response_time
-        # update rgb image
-        self.rgb_background = np.roll(self.rgb_background, -1, axis=0)
-        self.rgb_background[-1] = (
-            np.array([0, 255, 0]) if trial_data.trial_correct else np.array([255, 0, 0])
+        psy[2], psy[4] = online_std(new_sample=float(choice), new_count=psy[0], old_mean=psy[2], old_std=psy[4])
+
+        # update the last trials ring buffers: the oldest trial is overwritten by the new one
+        i = self._ring_start
+        self._ring_start = (self._ring_start + 1) % NTRIALS_PLOT
+        states = bpod_data["States timestamps"]
+        self._last_trials[i] = (
+            trial_data.trial_correct,
+            signed_contrast,
+            states["stim_on"][0][0],
+            states["play_tone"][0][0],
+            states["reward"][0][0],
+            states["error"][0][0],
+            trial_data.response_time,
         )
-        # update contrasts
-        self.last_contrasts = np.roll(self.last_contrasts, -1, axis=0)
-        self.last_contrasts[-1, :] = 0
-        self.last_contrasts[
-            -1, int(self.last_trials.signed_contrast.iloc[-1] > 0)
-        ] = abs(self.last_trials.signed_contrast.iloc[-1])
+        self._rgb_background[i, 0] = (0, 255, 0) if trial_data.trial_correct else (255, 0, 0)
+        self._last_contrasts[i] = 0
+        self._last_contrasts[i, int(signed_contrast > 0)] = abs(signed_contrast)
         self.ntrials_nan = self.ntrials if self.ntrials > 0 else np.nan
         self.percent_correct = self.ntrials_correct / self.ntrials_nan * 100
 
@@ -276,9 +224,9 @@ class DataModel:
         elif self.ntrials_engaged <= ENGAGED_CRITIERION["trial_count"]:
             return colour["green"]
         # the subject reaction time over the last 20 trials is more than 5 times greater than the overall reaction time
-        elif (
-            self.trials_table["response_time"][: self.ntrials].median() * 5
-        ) < self.last_trials["response_time"].median():
+        elif (np.nanmedian(self._response_times[: self.ntrials]) * 5) < np.nanmedian(
+            self._last_trials[:, LAST_TRIALS_COLUMNS.index("response_time")]
+        ):
             return colour["yellow"]
         # 90 > time > 45 min and subject's avg response time hasn't significantly decreased
         else:
@@ -295,7 +243,12 @@ class OnlinePlots:
     >>> OnlinePlots().run(task_file)
     """
 
-    def __init__(self, task_file=None):
+    def __init__(self, task_file=None, blit: bool = True):
+        """
+        :param task_file: jsonable file to load, or None to start empty
+        :param blit: if True and supported by the backend, only the artists that change are redrawn
+         on each trial on top of cached backgrounds, otherwise the whole figure is redrawn
+        """
         self.data = DataModel(task_file=task_file)
 
         # create figure and axes
@@ -338,16 +291,16 @@ class OnlinePlots:
         h.curve_reaction = {}
         for p in PROBABILITY_SET:
             h.curve_psych[p] = h.ax_psych.plot(
-                self.data.psychometrics.loc[p].index,
-                self.data.psychometrics.loc[p]["choice"],
+                SIGNED_CONTRAST_SET,
+                self.data.psychometrics_column(p, "choice"),
                 ".-",
                 zorder=10,
                 clip_on=False,
                 label=f"p = {p}",
             )
             h.curve_reaction[p] = h.ax_reaction.plot(
-                self.data.psychometrics.loc[p].index,
-                self.data.psychometrics.loc[p]["response_time"],
+                SIGNED_CONTRAST_SET,
+                self.data.psychometrics_column(p, "response_time"),
                 ".-",
                 label=f"p = {p}",
             )
@@ -375,7 +328,7 @@ class OnlinePlots:
         kwargs = dict(markersize=25, markeredgewidth=2)
         h.lines_trials = {
             "stim_on": h.ax_trials.plot(
-                self.data.last_trials.stim_on,
+                self.data.last_trials_column("stim_on"),
                 np.arange(NTRIALS_PLOT),
                 "|",
                 color="b",
@@ -383,7 +336,7 @@ class OnlinePlots:
                 label="stim_on",
             ),
             "reward_time": h.ax_trials.plot(
-                self.data.last_trials.reward_time,
+                self.data.last_trials_column("reward_time"),
                 np.arange(NTRIALS_PLOT),
                 "|",
                 color="g",
@@ -391,7 +344,7 @@ class OnlinePlots:
                 label="reward_time",
             ),
             "error_time": h.ax_trials.plot(
-                self.data.last_trials.error_time,
+                self.data.last_trials_column("error_time"),
                 np.arange(NTRIALS_PLOT),
                 "|",
                 color="r",
@@ -399,7 +352,7 @@ class OnlinePlots:
                 label="error_time",
             ),
             "play_tone": h.ax_trials.plot(
-                self.data.last_trials.play_tone,
+                self.data.last_trials_column("play_tone"),
                 np.arange(NTRIALS_PLOT),
                 "|",
                 color="m",
@@ -425,9 +378,78 @@ class OnlinePlots:
 
         self.h = h
         self.update_titles()
+        # artists redrawn on each trial, grouped by the figure region they are drawn in
+        self._dynamic_artists = {
+            "trials": [h.im_trials, *[line[0] for line in h.lines_trials.values()], h.scatter_contrast],
+            "psych": [curve[0] for curve in h.curve_psych.values()] + [h.ax_psych.get_legend()],
+            "reaction": [curve[0] for curve in h.curve_reaction.values()] + [h.ax_reaction.get_legend()],
+            "performance": [h.bar_correct[0], h.ax_performance.title],
+            "water": [h.bar_water[0], h.ax_water.title],
+            "title": [h.fig_title],
+        }
+        self._backgrounds = None
+        self.blit = blit and h.fig.canvas.supports_blit
+        if self.blit:
+            for artists in self._dynamic_artists.values():
+                for artist in artists:
+                    artist.set_animated(True)
+            h.fig.canvas.mpl_connect("draw_event", self._on_draw)
         plt.show(block=False)
         plt.draw()
 
+    def _blit_region(self, name: str, margin: bool = True):
+        """bounding box of a dynamic region: the axis and its title, or the figure title"""
+        renderer = self.h.fig.canvas.get_renderer()
+        extents = [a.get_window_extent(renderer) for a in self._dynamic_artists[name] if a.axes is None]
+        axes = {a.axes for a in self._dynamic_artists[name] if a.axes is not None}
+        extents += [ax.get_tightbbox(renderer) for ax in axes]
+        bbox = Bbox.union(extents)
+        return bbox.expanded(1.02, 1.1) if margin else bbox
+
+    def _on_draw(self, event) -> None:
+        """after a full draw, caches the static background of each region and draws the dynamic artists"""
+        canvas = self.h.fig.canvas
+        self._backgrounds = {}
+        for name in self._dynamic_artists:
+            bbox = self._blit_region(name)
+            self._backgrounds[name] = (bbox, canvas.copy_from_bbox(bbox))
+        self._draw_artists(self._dynamic_artists)
+
+    def _fits_background(self, name: str) -> bool:
+        """whether the dynamic artists of a region are still within the extent of its cached background"""
+        captured, current = self._backgrounds[name][0], self._blit_region(name, margin=False)
+        return (
+            captured.x0 <= current.x0 and captured.y0 <= current.y0 and captured.x1 >= current.x1 and captured.y1 >= current.y1
+        )
+
+    def _draw_artists(self, names) -> None:
+        for name in names:
+            for artist in self._dynamic_artists[name]:
+                self.h.fig.draw_artist(artist)
+
+    def render(self, regions=None) -> None:
+        """
+        Updates the figure on screen
+        :param regions: names of the regions that changed, defaults to all of them
+        """
+        canvas = self.h.fig.canvas
+        if not self.blit or self._backgrounds is None:
+            canvas.draw_idle()
+            return
+        regions = list(self._dynamic_artists) if regions is None else regions
+        if not all(self._fits_background(name) for name in regions):
+            # a text grew out of its cached background, which would leave part of the previous text on screen:
+            # the full draw captures the backgrounds again
+            canvas.draw_idle()
+            return
+        # the regions are restored and blitted with their extent at capture, which covers any shorter text
+        for name in regions:
+            canvas.restore_region(self._backgrounds[name][1])
+        self._draw_artists(regions)
+        for name in regions:
+            canvas.blit(self._backgrounds[name][0])
+        canvas.flush_events()
+
     def update_titles(self):
         protocol = (
             self.data.task_settings["PYBPOD_PROTOCOL"]
@@ -462,30 +484,32 @@ class OnlinePlots:
     def update_graphics(self, pupdate: float | None = None):
         background_color = self.data.compute_end_session_criteria()
         h = self.h
+        # a change of background colour invalidates the cached backgrounds: full redraw
+        full_redraw = to_hex(h.fig.get_facecolor()) != to_hex(background_color)
         h.fig.set_facecolor(background_color)
         self.update_titles()
         for p in PROBABILITY_SET:
             if pupdate is not None and p != pupdate:
                 continue
             # update psychometric curves
-            iok = ~np.isnan(
-                self.data.psychometrics.loc[p]["choice"].values.astype(np.float32)
-            )
-            xval = self.data.psychometrics.loc[p].index[iok]
-            h.curve_psych[p][0].set(
-                xdata=xval, ydata=self.data.psychometrics.loc[p]["choice"][iok]
-            )
+            choice = self.data.psychometrics_column(p, "choice")
+            iok = ~np.isnan(choice)
+            h.curve_psych[p][0].set(xdata=SIGNED_CONTRAST_SET[iok], ydata=choice[iok])
             h.curve_reaction[p][0].set(
-                xdata=xval, ydata=self.data.psychometrics.loc[p]["response_time"][iok]
+                xdata=SIGNED_CONTRAST_SET[iok], ydata=self.data.psychometrics_column(p, "response_time")[iok]
             )
-            # update the last trials plot
-            self.h.im_trials.set_array(self.data.rgb_background)
-            for k in ["stim_on", "reward_time", "error_time", "play_tone"]:
-                h.lines_trials[k][0].set(xdata=self.data.last_trials[k])
-            self.h.scatter_contrast.set_array(self.data.last_contrasts.T.flatten())
-            # update barplots
-            self.h.bar_correct[0].set(height=self.data.percent_correct)
-            self.h.bar_water[0].set(height=self.data.water_delivered)
+        # update the last trials plot
+        self.h.im_trials.set_array(self.data.rgb_background)
+        for k in ["stim_on", "reward_time", "error_time", "play_tone"]:
+            h.lines_trials[k][0].set(xdata=self.data.last_trials_column(k))
+        self.h.scatter_contrast.set_array(self.data.last_contrasts.T.flatten())
+        # update barplots
+        self.h.bar_correct[0].set(height=self.data.percent_correct)
+        self.h.bar_water[0].set(height=self.data.water_delivered)
+        if full_redraw:
+            h.fig.canvas.draw_idle()
+        else:
+            self.render()
 
     def _set_session_string(self) -> None:
         if isinstance(self.data.task_settings, dict):
@@ -507,6 +531,8 @@ class OnlinePlots:
     def run(self, task_file: Path | str) -> None:
         """
         This methods is for online use, it will watch for a file in conjunction with an iblrigv8 running task
+        The plots update as soon as complete trials are appended to the file, half-written lines being left
+        for the next update
         :param task_file:
         :return:
         """
@@ -515,22 +541,20 @@ class OnlinePlots:
         self._set_session_string()
         self.update_titles()
         self.h.fig.canvas.flush_events()
-        self.real_time = Bunch({"fseek": 0, "time_last_check": 0})
         flag_file = task_file.parent.joinpath("new_trial.flag")
-
-        while True:
-            self.h.fig.canvas.draw_idle()
-            self.h.fig.canvas.flush_events()
-            time.sleep(0.4)
-            if not plt.fignum_exists(self.h.fig.number):
-                break
-            if flag_file.exists():
-                trial_data, bpod_data = load_task_jsonable(
-                    task_file, offset=self.real_time.fseek
-                )
-                new_size = task_file.stat().st_size
-                for i in np.arange(len(bpod_data)):
-                    self.update_trial(trial_data.iloc[i], bpod_data[i])
-                self.real_time.fseek = new_size
-                self.real_time.time_last_check = time.time()
-                flag_file.unlink()
+        watcher = file_watcher_factory(task_file)
+        reader = JsonableReader(task_file)
+        changed = True
+        try:
+            while plt.fignum_exists(self.h.fig.number):
+                if changed:
+                    for record in reader.read_new():
+                        bpod_data = record.pop("behavior_data")
+                        self.update_trial(pd.Series(record), bpod_data)
+                    # the flag file is not needed anymore, remove it for tasks that still write it
+                    flag_file.unlink(missing_ok=True)
+                # keep the GUI responsive while waiting for the next trial
+                self.h.fig.canvas.flush_events()
+                changed = watcher.wait(timeout=0.05)
+        finally:
+            watcher.close()
@@ -1,10 +1,12 @@
-from typing import Any, List
+from typing import Any, Dict, Iterable, List
 
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
 from panda3d.core import (
     CardMaker,
     KeyboardButton,
+    NodePath,
+    Texture,
     WindowProperties,
     TextureStage,
 )
@@ -51,6 +53,8 @@ CAMERA_HEIGHT = 7.5
 CAMERA_START_Y = (CORRIDOR_LENGTH + ADDITIONAL_BACKWARDS_LENGTH) / 2 - CORRIDOR_LENGTH
 
 
+ITI_SCENE = "ITI"
+
 NUM_TURNS_PER_LAP = (
     HARDWARE_SETTINGS.corridor["CORRIDOR_LENGTH"]
     / HARDWARE_SETTINGS.corridor["WHEEL_CIRCUMFERENCE"]
@@ -58,6 +62,9 @@ NUM_TURNS_PER_LAP = (
 
 
 class Corridor(ShowBase):
+    # frames are only rendered when step() is called, see render_thread.CorridorRenderThread
+    free_running = False
+
     def __init__(self) -> None:
         ShowBase.__init__(self)
         # self.render.set_scale(HARDWARE_SETTINGS.corridor["SCREEN_WIDTH"] / SCREEN_WIDTH)
@@ -65,7 +72,9 @@ class Corridor(ShowBase):
         props = WindowProperties()
         props.setSize(SCREEN_WIDTH_PX, SCREEN_HEIGHT_PX)
 
-        self.win.requestProperties(props)
+        # offscreen buffers, ie. for the tests, have a fixed size
+        if hasattr(self.win, "requestProperties"):
+            self.win.requestProperties(props)
 
         # Panda3d has this janky logic where it pollutes the global namespace.
         # So this is actually defined
@@ -89,32 +98,16 @@ class Corridor(ShowBase):
         # Keep track of corridor nodes so we can remove them later
         self.corridor_nodes: List[Any] = []
 
+        # Textures are loaded once, and each corridor is built once as a detached scene graph.
+        # Changing corridor is then only a matter of swapping which scene is attached to render
+        self.textures: Dict[str, Texture] = {}
+        self.scenes: Dict[str, NodePath] = {}
+        self.active_scene: NodePath | None = None
+
     def start_trial(self, wall_texture: str) -> None:
         # If you want multiple textures in the same corridor
         # self.build_corridor(0, "blueTriangles.jpg", False)
-        self.clear_corridor()  # Clear existing corridor before building a new one
-        self.build_corridor(
-            CORRIDOR_WIDTH,
-            CORRIDOR_HEIGHT,
-            CORRIDOR_LENGTH + ADDITIONAL_BACKWARDS_LENGTH,
-            True,
-            wall_texture,
-        )
-
-        for landmark_pos in HARDWARE_SETTINGS.corridor["LANDMARK_POSITIONS"]:
-
-            self.add_landmark(
-                y_pos=CAMERA_START_Y
-                + (landmark_pos / CORRIDOR_LENGTH_CM) * CORRIDOR_LENGTH,
-                width=CORRIDOR_WIDTH,
-                height=CORRIDOR_HEIGHT,
-                length=int(
-                    HARDWARE_SETTINGS.corridor["LANDMARK_WIDTH"]
-                    / CORRIDOR_LENGTH_CM
-                    * CORRIDOR_LENGTH
-                ),
-                texture_name="horGrat.jpg",
-            )
+        self.show_scene(self.get_scene(wall_texture))
 
         # Debugging purposes: mark the reward zone
         # self.add_landmark(
@@ -135,21 +128,72 @@ class Corridor(ShowBase):
         for node in self.corridor_nodes:
             node.removeNode()
         self.corridor_nodes.clear()
+        if self.active_scene is not None:
+            self.active_scene.detachNode()
+            self.active_scene = None
 
     def ITI(self) -> None:
-        """Build a completely black corridor"""
-        self.clear_corridor()
-        self.build_corridor(
-            CORRIDOR_WIDTH,
-            CORRIDOR_HEIGHT,
-            CORRIDOR_LENGTH + ADDITIONAL_BACKWARDS_LENGTH,
-            True,
-            "black.png",
-            "black.png",
-            "black.png",
-        )
+        """Show a completely black corridor"""
+        self.show_iti()
         self.step()
 
+    def show_iti(self) -> None:
+        """Attaches the black corridor, it is displayed on the next frame"""
+        self.show_scene(self.get_scene(ITI_SCENE))
+
+    def get_texture(self, texture_name: str) -> Texture:
+        if texture_name not in self.textures:
+            self.textures[texture_name] = self.loader.load_texture(
+                f"iblrig/panda3d/corridor/textures/{texture_name}"
+            )
+        return self.textures[texture_name]
+
+    def get_scene(self, wall_texture: str) -> NodePath:
+        """
+        Returns the detached scene graph of the corridor with the given wall texture, building it if needed.
+        `ITI_SCENE` is the completely black corridor
+        """
+        if wall_texture not in self.scenes:
+            scene = NodePath(f"corridor_{wall_texture}")
+            if wall_texture == ITI_SCENE:
+                self.build_corridor(
+                    CORRIDOR_WIDTH,
+                    CORRIDOR_HEIGHT,
+                    CORRIDOR_LENGTH + ADDITIONAL_BACKWARDS_LENGTH,
+                    True,
+                    "black.png",
+                    "black.png",
+                    "black.png",
+                    parent=scene,
+                )
+            else:
+                self.build_corridor(
+                    CORRIDOR_WIDTH,
+                    CORRIDOR_HEIGHT,
+                    CORRIDOR_LENGTH + ADDITIONAL_BACKWARDS_LENGTH,
+                    True,
+                    wall_texture,
+                    parent=scene,
+                )
+                self.add_landmarks(parent=scene)
+            # merge the static cards to reduce the number of draw calls
+            scene.flattenStrong()
+            self.scenes[wall_texture] = scene
+        return self.scenes[wall_texture]
+
+    def preload(self, wall_textures: Iterable[str]) -> None:
+        """Builds the scenes of all corridors ahead of the session and uploads their textures to the GPU"""
+        for wall_texture in [*wall_textures, ITI_SCENE]:
+            scene = self.get_scene(wall_texture)
+            if self.win is not None:
+                scene.prepareScene(self.win.getGsg())
+
+    def show_scene(self, scene: NodePath) -> None:
+        """Detaches the current corridor and attaches the given scene to render"""
+        self.clear_corridor()
+        scene.reparentTo(self.render)
+        self.active_scene = scene
+
     def start(self) -> None:
         if not self.win:
             self.openMainWindow()
@@ -172,9 +216,19 @@ class Corridor(ShowBase):
     def step(self) -> None:
         self.taskMgr.step()
 
+    def render_frame(self) -> None:
+        """
+        Runs the tasks once, which renders a frame, without the SIGINT handling of `taskMgr.step()`:
+        signal handlers can only be set from the main thread
+        """
+        self.taskMgr.mgr.poll()
+
     def moveCameraTask(self, task: Any) -> Task.cont:
         speed = 10
         dt = globalClock.getDt()  # Get the actual delta time
+        # offscreen buffers have no keyboard
+        if self.mouseWatcherNode is None:
+            return Task.cont
 
         if self.mouseWatcherNode.is_button_down(KeyboardButton.up()):
             self.camera.setY(self.camera, speed * dt)
@@ -183,9 +237,37 @@ class Corridor(ShowBase):
 
         return Task.cont
 
+    def add_landmarks(self, parent: NodePath | None = None) -> None:
+        for landmark_pos in HARDWARE_SETTINGS.corridor["LANDMARK_POSITIONS"]:
+            self.add_landmark(
+                y_pos=CAMERA_START_Y
+                + (landmark_pos / CORRIDOR_LENGTH_CM) * CORRIDOR_LENGTH,
+                width=CORRIDOR_WIDTH,
+                height=CORRIDOR_HEIGHT,
+                length=int(
+                    HARDWARE_SETTINGS.corridor["LANDMARK_WIDTH"]
+                    / CORRIDOR_LENGTH_CM
+                    * CORRIDOR_LENGTH
+                ),
+                texture_name="horGrat.jpg",
+                parent=parent,
+            )
+
     def add_landmark(
-        self, y_pos: int, width: int, height: int, length: int, texture_name: str
+        self,
+        y_pos: int,
+        width: int,
+        height: int,
+        length: int,
+        texture_name: str,
+        parent: NodePath | None = None,
     ):
+        """
+        :param parent: node the landmark is attached to. Defaults to render, in which case the nodes are
+         removed by `clear_corridor`
+        """
+        track_nodes = parent is None
+        parent = self.render if parent is None else parent
         cm = CardMaker("corridor_segment")
         cm.setFrame(
             -length / 2,
@@ -196,11 +278,11 @@ class Corridor(ShowBase):
 
         offset_from_wall = 0.01
 
-        left_wall = self.render.attachNewNode(cm.generate())
+        left_wall = parent.attachNewNode(cm.generate())
         left_wall.setPos(-width / 2 + offset_from_wall, y_pos, height / 2)
         left_wall.setH(90)
 
-        right_wall = self.render.attachNewNode(cm.generate())
+        right_wall = parent.attachNewNode(cm.generate())
         right_wall.setPos(width / 2 - offset_from_wall, y_pos, height / 2)
         right_wall.setH(-90)
 
@@ -211,26 +293,24 @@ class Corridor(ShowBase):
             length / 2,
         )
 
-        floor = self.render.attachNewNode(cm.generate())
+        floor = parent.attachNewNode(cm.generate())
         floor.setPos(0, y_pos, offset_from_wall)
         floor.setP(-90)
 
-        ceiling = self.render.attachNewNode(cm.generate())
+        ceiling = parent.attachNewNode(cm.generate())
         ceiling.setPos(0, y_pos, height - offset_from_wall)
         ceiling.setP(-90)
 
+        texture = self.get_texture(texture_name)
         for model in [left_wall, right_wall, floor, ceiling]:
-            texture = self.loader.load_texture(
-                f"iblrig/panda3d/corridor/textures/{texture_name}"
-            )
-
             model.setTexture(texture, 1)
             model.setTwoSided(True)
-            model.reparentTo(self.render)
+            model.reparentTo(parent)
             num_texture_tiles = max(1, length // height)
             model.setTexScale(TextureStage.getDefault(), num_texture_tiles, 1)
 
-            self.corridor_nodes.append(model)
+            if track_nodes:
+                self.corridor_nodes.append(model)
 
     def build_corridor(
         self,
@@ -241,7 +321,14 @@ class Corridor(ShowBase):
         wall_texture: str,
         floor_texture: str = "floor.jpg",
         back_wall_texture: str = "endOfCorridor.png",
+        parent: NodePath | None = None,
     ) -> None:
+        """
+        :param parent: node the corridor is attached to. Defaults to render, in which case the nodes are
+         removed by `clear_corridor`
+        """
+        track_nodes = parent is None
+        parent = self.render if parent is None else parent
         cm = CardMaker("corridor_segment")
 
         corridor = {}
@@ -253,11 +340,11 @@ class Corridor(ShowBase):
             -length / 2,
             length / 2,
         )
-        corridor["floor"] = self.render.attachNewNode(cm.generate())
+        corridor["floor"] = parent.attachNewNode(cm.generate())
         corridor["floor"].setPos(0, 0, 0)
         corridor["floor"].setP(-90)
 
-        corridor["ceiling"] = self.render.attachNewNode(cm.generate())
+        corridor["ceiling"] = parent.attachNewNode(cm.generate())
         corridor["ceiling"].setPos(0, 0, height)
         corridor["ceiling"].setP(-90)
 
@@ -269,11 +356,11 @@ class Corridor(ShowBase):
             height / 2,
         )
 
-        corridor["left_wall"] = self.render.attachNewNode(cm.generate())
+        corridor["left_wall"] = parent.attachNewNode(cm.generate())
         corridor["left_wall"].setPos(-width / 2, 0, height / 2)
         corridor["left_wall"].setH(90)
 
-        corridor["right_wall"] = self.render.attachNewNode(cm.generate())
+        corridor["right_wall"] = parent.attachNewNode(cm.generate())
         corridor["right_wall"].setPos(width / 2, 0, height / 2)
         corridor["right_wall"].setH(-90)
 
@@ -286,7 +373,7 @@ class Corridor(ShowBase):
         )
 
         if add_back_wall:
-            corridor["back_wall"] = self.render.attachNewNode(cm.generate())
+            corridor["back_wall"] = parent.attachNewNode(cm.generate())
             corridor["back_wall"].setPos(0, length / 2, height / 2)
             corridor["back_wall"].setH(180)
 
@@ -296,13 +383,11 @@ class Corridor(ShowBase):
                 if model_name in ["floor", "ceiling"]
                 else back_wall_texture if model_name == "back_wall" else wall_texture
             )
-            texture = self.loader.load_texture(
-                f"iblrig/panda3d/corridor/textures/{texture_name}"
-            )
+            texture = self.get_texture(texture_name)
 
             model.setTexture(texture, 1)
             model.setTwoSided(True)
-            model.reparentTo(self.render)
+            model.reparentTo(parent)
 
             num_texture_tiles = int(length / height)
 
@@ -311,7 +396,8 @@ class Corridor(ShowBase):
             elif model_name in ["left_wall", "right_wall"]:
                 model.setTexScale(TextureStage.getDefault(), num_texture_tiles, 1)
 
-            self.corridor_nodes.append(model)
+            if track_nodes:
+                self.corridor_nodes.append(model)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import queue
+import threading
+from typing import Callable, Iterable
+
+from panda3d.core import loadPrcFileData
+
+from iblrig.panda3d.corridor.corridor import HARDWARE_SETTINGS, Corridor
+from iblutil.util import setup_logger
+
+log = setup_logger("iblrig")
+
+
+class CorridorRenderThread:
+    """
+    Runs the corridor in its own thread, rendering one frame per refresh of the monitor.
+
+    All Panda3D calls happen in this thread: the methods below only queue scene changes, which are applied
+    before the next frame. The camera follows the latest value returned by `position_source`, so the frame
+    rate is set by the monitor rather than by the rate of the Bpod softcodes.
+
+    :param position_source: callable returning the current wheel position in degrees, or None. It is called
+     on every frame and must not block: use `MyRotaryEncoder.latest_angle`, that reads the stream buffer
+    :param wall_textures: wall textures of the corridors built before the first frame
+    """
+
+    free_running = True
+
+    def __init__(
+        self,
+        position_source: Callable[[], float | None] | None = None,
+        wall_textures: Iterable[str] = (),
+    ):
+        self.position_source = position_source
+        self.wall_textures = list(wall_textures)
+        self.frame_count = 0
+        self._commands = queue.SimpleQueue()
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._start_error = None
+        self._error = None
+        self._thread = threading.Thread(target=self._render_loop, name="corridor_render", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._start_error is not None:
+            raise RuntimeError("Could not start the corridor render thread") from self._start_error
+
+    def _render_loop(self) -> None:
+        try:
+            # lock the frames on the vertical blank of the monitor
+            loadPrcFileData("", "sync-video 1")
+            corridor = Corridor()
+            corridor.start()
+            corridor.preload(self.wall_textures)
+        except Exception as e:
+            self._start_error = self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            while not self._stopping.is_set():
+                while True:
+                    try:
+                        method, args = self._commands.get_nowait()
+                    except queue.Empty:
+                        break
+                    getattr(corridor, method)(*args)
+                if self.position_source is not None:
+                    position = self.position_source()
+                    if position is not None:
+                        corridor.set_camera_position(position)
+                # with sync-video this blocks until the frame is flipped
+                corridor.render_frame()
+                self.frame_count += 1
+        except Exception as e:
+            self._error = e
+            log.error(f"Corridor render thread stopped: {e}")
+        finally:
+            corridor.destroy()
+
+    def _post(self, method: str, *args) -> None:
+        if not self._thread.is_alive():
+            raise RuntimeError("The corridor render thread is not running") from self._error
+        self._commands.put((method, args))
+
+    def start_trial(self, wall_texture: str) -> None:
+        self._post("start_trial", wall_texture)
+
+    def ITI(self) -> None:
+        self._post("show_iti")
+
+    def preload(self, wall_textures: Iterable[str]) -> None:
+        self._post("preload", list(wall_textures))
+
+    def set_camera_position(self, position: float) -> None:
+        self._post("set_camera_position", position)
+
+    def start(self) -> None:
+        """The window is opened by the render thread, nothing to do"""
+        pass
+
+    def step(self) -> None:
+        """Frames are rendered continuously by the thread, nothing to do"""
+        pass
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join()
+        if self._error is not None:
+            log.error(f"The corridor render thread failed after {self.frame_count} frames: {self._error}")
+
+
+def corridor_factory(
+    wall_textures: Iterable[str] = (),
+    position_source: Callable[[], float | None] | None = None,
+) -> Corridor | CorridorRenderThread:
+    """
+    Returns the corridor used by the tasks according to the hardware settings.
+    With `corridor: RENDER_THREAD: True` the corridor renders in its own thread at the refresh rate of the
+    monitor, following `position_source`. Otherwise the corridor is rendered by the Bpod softcode handler.
+    """
+    if HARDWARE_SETTINGS.corridor.get("RENDER_THREAD", False):
+        log.info("Corridor rendered in a dedicated thread")
+        return CorridorRenderThread(position_source=position_source, wall_textures=wall_textures)
+    return Corridor()
@@ -11,8 +11,7 @@ import yaml
 from packaging import version
 
 import iblrig
-from ibllib.io import session_params
-from ibllib.io.raw_data_loaders import load_settings
+from iblrig.session_index import SESSION_INDEX_FILE, SessionIndex
 from iblutil.util import Bunch, setup_logger
 
 log = setup_logger("iblrig")
@@ -23,6 +22,7 @@ def iterate_previous_sessions(subject_name, task_name, n=1, **kwargs):
     This function iterates over the sessions of a given subject in both the remote and local path
     and searches for a given protocol name. It returns the information of the last n found
     matching protocols in the form of a dictionary
+    The sessions are looked up in a persistent index stored in the local data folder, see `iblrig.session_index`
     :param subject_name:
     :param task_name: name of the protocol to look for in experiment description : '_iblrig_tasks_trainingChoiceWorld'
     :param **kwargs: optional arguments to be passed to iblrig.path_helper.get_local_and_remote_paths
@@ -31,23 +31,28 @@ def iterate_previous_sessions(subject_name, task_name, n=1, **kwargs):
         list of dictionaries with keys: session_path, experiment_description, task_settings, file_task_data
     """
     rig_paths = get_local_and_remote_paths(**kwargs)
-    sessions = _iterate_protocols(
-        rig_paths.local_subjects_folder.joinpath(subject_name), task_name=task_name, n=n
-    )
-    if rig_paths.remote_subjects_folder is not None:
-        remote_sessions = _iterate_protocols(
-            rig_paths.remote_subjects_folder.joinpath(subject_name),
+    with SessionIndex(Path(rig_paths.local_data_folder).joinpath(SESSION_INDEX_FILE)) as session_index:
+        sessions = _iterate_protocols(
+            rig_paths.local_subjects_folder.joinpath(subject_name),
             task_name=task_name,
             n=n,
+            session_index=session_index,
         )
-        if remote_sessions is not None:
-            sessions.extend(remote_sessions)
-        _, ises = np.unique([s["session_stub"] for s in sessions], return_index=True)
-        sessions = [sessions[i] for i in ises]
+        if rig_paths.remote_subjects_folder is not None:
+            remote_sessions = _iterate_protocols(
+                rig_paths.remote_subjects_folder.joinpath(subject_name),
+                task_name=task_name,
+                n=n,
+                session_index=session_index,
+            )
+            if remote_sessions is not None:
+                sessions.extend(remote_sessions)
+            _, ises = np.unique([s["session_stub"] for s in sessions], return_index=True)
+            sessions = [sessions[i] for i in ises]
     return sessions
 
 
-def _iterate_protocols(subject_folder, task_name, n=1):
+def _iterate_protocols(subject_folder, task_name, n=1, session_index=None):
     """
     This function iterates over the sessions of a given subject and searches for a given protocol name
     It will then return the information of the last n found matching protocols in the form of a
@@ -55,45 +60,38 @@ def _iterate_protocols(subject_folder, task_name, n=1):
     :param subject_folder:
     :param task_name: name of the protocol to look for in experiment description : '_iblrig_tasks_trainingChoiceWorld'
     :param n: number of maximum protocols to return
+    :param session_index: iblrig.session_index.SessionIndex instance, if None the subject folder is indexed in memory
     :return:
         list of dictionaries with keys: session_stub, session_path, experiment_description, task_settings, file_task_data
     """
     protocols = []
     if subject_folder is None or Path(subject_folder).exists() is False:
         return protocols
-    for file_experiment in sorted(
-        subject_folder.rglob("_ibl_experiment.description*.yaml"), reverse=True
-    ):
-        session_path = file_experiment.parent
-        ad = session_params.read_params(file_experiment)
-        if "tasks" not in ad:
-            continue
-        if task_name not in ad["tasks"][0]:
-            continue
+    if session_index is None:
+        with SessionIndex() as session_index:
+            return _iterate_protocols(subject_folder, task_name, n=n, session_index=session_index)
+    session_index.update(subject_folder)
+    for session in session_index.iter_protocol(subject_folder, task_name):
         # reversed: we look for the last task first if the protocol ran twice
-        for ad_task in reversed(ad["tasks"]):
-            adt = ad_task.get(task_name, None)
-            if not adt:
+        for protocol, collection, ntrials, task_settings in reversed(session.tasks):
+            if protocol != task_name:
                 return
-            task_settings = load_settings(
-                session_path, task_collection=adt["collection"]
-            )
+            if task_settings is None:
+                continue
             if (
-                task_settings.get("NTRIALS", 43) < 42
-            ):  # we consider that under 42 trials it is a dud session
+                ntrials if ntrials is not None else 43
+            ) < 42:  # we consider that under 42 trials it is a dud session
                 continue
             protocols.append(
                 Bunch(
                     {
-                        "session_stub": "_".join(
-                            file_experiment.parent.parts[-2:]
-                        ),  # 2019-01-01_001
-                        "session_path": file_experiment.parent,
-                        "task_collection": adt["collection"],
-                        "experiment_description": ad,
+                        "session_stub": session.session_stub,  # 2019-01-01_001
+                        "session_path": session.session_path,
+                        "task_collection": collection,
+                        "experiment_description": session.experiment_description,
                         "task_settings": task_settings,
-                        "file_task_data": session_path.joinpath(
-                            adt["collection"], "_iblrig_taskData.raw.jsonable"
+                        "file_task_data": session.session_path.joinpath(
+                            collection, "_iblrig_taskData.raw.jsonable"
                         ),
                     }
                 )
@@ -1,6 +1,10 @@
 import json
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
 from typing import Any
 
+import numpy as np
 import pandas as pd
 
 from iblutil.util import setup_logger
@@ -37,3 +41,242 @@ def load_task_jsonable(
 
     trials_table = pd.DataFrame(trials_table)
     return trials_table, bpod_data
+
+
+class JsonableReader:
+    """
+    Random access and incremental reads of a jsonable file, one json record per line.
+
+    The byte offset of the end of each complete line is indexed in memory. It can also be kept in an index
+    file (little-endian int64), so that re-opening a file only scans the lines appended since the index was
+    last written: the index file should be outside of the session folder, which is copied to the server.
+    A trailing line without a newline is considered as being written and is ignored until it is complete.
+
+    >>> reader = JsonableReader(session_path.joinpath('raw_task_data_00', '_iblrig_taskData.raw.jsonable'))
+    >>> len(reader)  # number of trials
+    >>> reader[-1]  # last trial
+    >>> for trial in reader.iter(start=-10): ...  # generator over the last 10 trials
+    >>> new_trials = reader.read_new()  # trials appended since the last call
+
+    :param jsonable_file: path to the jsonable file
+    :param index_file: path to the index file, None (default) keeps the index in memory only
+    """
+
+    def __init__(self, jsonable_file: str | Path, index_file: str | Path | None = None):
+        self.file = Path(jsonable_file)
+        self.index_file = Path(index_file) if index_file is not None else None
+        self._ends = np.zeros(0, dtype=np.int64)
+        self._n_saved = 0  # number of entries of the index file on disk, if it is consistent
+        self._n_read = 0
+        self._load_index()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._ends.size
+
+    @property
+    def end(self) -> int:
+        """byte offset of the end of the last complete line"""
+        return int(self._ends[-1]) if self._ends.size else 0
+
+    def offset(self, i: int) -> int:
+        """byte offset of the start of line i"""
+        i = range(len(self))[i]
+        return 0 if i == 0 else int(self._ends[i - 1])
+
+    def _load_index(self) -> None:
+        if self.index_file is None or not self.index_file.exists() or not self.file.exists():
+            return
+        if self.index_file.stat().st_size % 8:
+            log.warning(f"Discarding truncated index {self.index_file}")
+            return
+        ends = np.fromfile(self.index_file, dtype="<i8")
+        # the index is only valid if it describes the beginning of the current file
+        if ends.size and (ends[-1] > self.file.stat().st_size or np.any(np.diff(ends) <= 0)):
+            log.warning(f"Discarding invalid index {self.index_file}")
+            ends = np.zeros(0, dtype=np.int64)
+        elif ends.size:
+            with open(self.file, "rb") as fid:
+                fid.seek(int(ends[-1]) - 1)
+                if fid.read(1) != b"\n":
+                    log.warning(f"Discarding invalid index {self.index_file}")
+                    ends = np.zeros(0, dtype=np.int64)
+        self._ends = ends.astype(np.int64)
+        self._n_saved = self._ends.size
+
+    def refresh(self) -> int:
+        """
+        Indexes the complete lines appended to the file since the last call
+        :return: number of new lines
+        """
+        if not self.file.exists():
+            return 0
+        start = self.end
+        with open(self.file, "rb") as fid:
+            fid.seek(start)
+            data = fid.read()
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n"))
+        if newlines.size == 0:
+            return 0
+        new_ends = newlines.astype(np.int64) + start + 1
+        self._ends = np.r_[self._ends, new_ends]
+        if self.index_file is None:
+            return new_ends.size
+        try:
+            if self._n_saved == self._ends.size - new_ends.size and self._n_saved > 0:
+                with open(self.index_file, "ab") as fid:
+                    fid.write(new_ends.astype("<i8").tobytes())
+            else:
+                with open(self.index_file, "wb") as fid:
+                    fid.write(self._ends.astype("<i8").tobytes())
+            self._n_saved = self._ends.size
+        except OSError as e:
+            # read-only location: the index is kept in memory only
+            log.debug(f"Could not write {self.index_file}: {e}")
+        return new_ends.size
+
+    def _read_range(self, start: int, stop: int) -> Iterator[dict]:
+        if start >= stop:
+            return
+        with open(self.file, "rb") as fid:
+            fid.seek(self.offset(start))
+            for _ in range(start, stop):
+                yield json.loads(fid.readline())
+
+    def __getitem__(self, i: int) -> dict:
+        i = range(len(self))[i]
+        return next(self._read_range(i, i + 1))
+
+    def iter(self, start: int = 0, stop: int | None = None) -> Iterator[dict]:
+        """
+        Generator over the records, accepts negative indices like a slice
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        yield from self._read_range(start, stop)
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.iter()
+
+    def tail(self, n: int) -> list[dict]:
+        """:return: the last n records"""
+        return list(self.iter(start=max(len(self) - n, 0)))
+
+    def read_new(self) -> list[dict]:
+        """
+        :return: the records appended since the last call to `read_new`, all records on the first call
+        """
+        self.refresh()
+        records = list(self.iter(start=self._n_read))
+        self._n_read += len(records)
+        return records
+
+
+TASK_SUMMARY_FILE = "_iblrig_taskSummary.raw.json"
+TASK_SUMMARY_CACHE_DIR = Path.home().joinpath(".iblrig", "task_summaries")
+_SIGNATURE_TAIL_BYTES = 4096
+
+
+def _jsonable_signature(jsonable_file: Path) -> dict:
+    """size and checksum of the end of the file, a summary is only valid for the file it was computed from"""
+    size = jsonable_file.stat().st_size
+    with open(jsonable_file, "rb") as fid:
+        fid.seek(max(size - _SIGNATURE_TAIL_BYTES, 0))
+        tail_crc32 = zlib.crc32(fid.read())
+    return {"size": size, "tail_crc32": tail_crc32}
+
+
+def cached_task_summary_file(jsonable_file: str | Path, cache_dir: str | Path | None = None) -> Path:
+    """
+    Path of the summary of a task data jsonable in the local cache, used for the sessions that were not written
+    with a summary. The cache is keyed by subject, date, number and task collection so that the local and the
+    remote copies of a session share the same summary
+    :param jsonable_file: path to the <subject>/<date>/<number>/<collection>/_iblrig_taskData.raw.jsonable file
+    :param cache_dir: cache folder, defaults to TASK_SUMMARY_CACHE_DIR
+    :return: path of the summary file
+    """
+    cache_dir = TASK_SUMMARY_CACHE_DIR if cache_dir is None else Path(cache_dir)
+    return cache_dir.joinpath("_".join(Path(jsonable_file).parts[-5:-1]) + ".json")
+
+
+def compute_task_summary(jsonable_file: str | Path) -> dict:
+    """
+    Aggregates of a task data jsonable used to set up the next session of the subject
+    :param jsonable_file: path to the _iblrig_taskData.raw.jsonable file
+    :return: dictionary with keys ntrials, reward_amount (total volume in uL, missing values are ignored),
+     training_phase (of the last trial that records one: the trials without the key are skipped, None if no trial
+     has it) and n_responses (number of trials with response_side != 0)
+    """
+    summary = {"ntrials": 0, "reward_amount": 0.0, "training_phase": None, "n_responses": 0}
+    with open(jsonable_file) as fid:
+        for line in fid:
+            record = json.loads(line)
+            summary["ntrials"] += 1
+            reward_amount = record.get("reward_amount")
+            if reward_amount is not None and not np.isnan(reward_amount):
+                summary["reward_amount"] += reward_amount
+            # same as the trials table response_side != 0, where a missing value counts as a response
+            summary["n_responses"] += record.get("response_side") != 0
+            if "training_phase" in record:
+                summary["training_phase"] = record["training_phase"]
+    return summary
+
+
+def _write_task_summary(file_summary: Path, jsonable_file: Path, summary: dict) -> Path:
+    file_summary.parent.mkdir(parents=True, exist_ok=True)
+    with open(file_summary, "w") as fid:
+        json.dump({**summary, "jsonable": _jsonable_signature(jsonable_file)}, fid)
+    return file_summary
+
+
+def _read_task_summary(file_summary: Path, jsonable_file: Path) -> dict | None:
+    """:return: the summary if it exists and was computed from the current jsonable file, None otherwise"""
+    if not file_summary.exists():
+        return None
+    try:
+        with open(file_summary) as fid:
+            summary = json.load(fid)
+        if summary.pop("jsonable") == _jsonable_signature(jsonable_file):
+            return summary
+    except (ValueError, KeyError) as e:
+        log.warning(f"Discarding invalid summary {file_summary}: {e}")
+    return None
+
+
+def save_task_summary(jsonable_file: str | Path, summary: dict | None = None) -> Path:
+    """
+    Writes the summary of a task data jsonable next to it, as TASK_SUMMARY_FILE. It is written at the end of the
+    session so that it is copied to the server along with the task data
+    :param jsonable_file: path to the _iblrig_taskData.raw.jsonable file
+    :param summary: summary as returned by `compute_task_summary`, computed if None
+    :return: path of the summary file
+    """
+    jsonable_file = Path(jsonable_file)
+    summary = compute_task_summary(jsonable_file) if summary is None else summary
+    return _write_task_summary(jsonable_file.with_name(TASK_SUMMARY_FILE), jsonable_file, summary)
+
+
+def load_task_summary(jsonable_file: str | Path, cache_dir: str | Path | None = None) -> dict:
+    """
+    Loads the summary of a task data jsonable, see `compute_task_summary`. The summary written with the session is
+    used if it is up to date. Otherwise, ie. for the sessions that predate the summaries, the summary is read from
+    the local cache, or computed from the jsonable and cached for the next call: the session folders, which can be
+    on the server, are never written to
+    :param jsonable_file: path to the _iblrig_taskData.raw.jsonable file, local or remote
+    :param cache_dir: cache folder, defaults to TASK_SUMMARY_CACHE_DIR
+    :return: dictionary with keys ntrials, reward_amount, training_phase and n_responses
+    """
+    jsonable_file = Path(jsonable_file)
+    summary = _read_task_summary(jsonable_file.with_name(TASK_SUMMARY_FILE), jsonable_file)
+    if summary is not None:
+        return summary
+    file_summary = cached_task_summary_file(jsonable_file, cache_dir=cache_dir)
+    summary = _read_task_summary(file_summary, jsonable_file)
+    if summary is not None:
+        return summary
+    summary = compute_task_summary(jsonable_file)
+    try:
+        _write_task_summary(file_summary, jsonable_file, summary)
+    except OSError as e:
+        # the summary will be computed again next time
+        log.debug(f"Could not write {file_summary}: {e}")
+    return summary
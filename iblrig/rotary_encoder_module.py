@@ -1,9 +1,34 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
 from pybpodapi.com.arcom import ArCOM, ArduinoTypes
 
+from iblutil.util import Bunch, setup_logger
 
+log = setup_logger("iblrig")
 
 hardware_version: int
 
+# stream packets are a 1 byte prefix ('P' for position, 'E' for event), 2 bytes and a uint32 time in ms
+# for position packets the 2 bytes are the int16 position, for events they are the origin and event bytes
+STREAM_DTYPE = np.dtype([("prefix", "S1"), ("data", "<i2"), ("time", "<u4")])
+# entries of the SD card log are an int32 position and a uint32 time in ms
+LOG_DTYPE = np.dtype([("position", "<i4"), ("time", "<u4")])
+
+
+def parse_stream(buffer: bytes) -> tuple[np.ndarray, bytes]:
+    """
+    Decodes stream packets in bulk
+    :param buffer: raw bytes received from the module
+    :return: structured array of complete packets (STREAM_DTYPE) and the trailing bytes of an incomplete
+     packet, to be prepended to the next buffer
+    """
+    n_packets = len(buffer) // STREAM_DTYPE.itemsize
+    packets = np.frombuffer(buffer, dtype=STREAM_DTYPE, count=n_packets)
+    return packets, buffer[n_packets * STREAM_DTYPE.itemsize :]
+
 
 class RotaryEncoderModule(object):
 
@@ -32,6 +57,8 @@ class RotaryEncoderModule(object):
         if serialport:
             self.open(serialport)
         self.hardware_version = hardware_version
+        # incomplete stream packet carried over between calls of read_stream
+        self._stream_carry = b""
 
     def open(self, serialport):
         """
@@ -54,6 +81,13 @@ class RotaryEncoderModule(object):
         wrap_point = 2048.0 if self.hardware_version == 2 else 512.0
         return round(((float(pos) / wrap_point) * 180.0) * 10.0) / 10.0
 
+    def ticks_to_degrees(self, ticks: np.ndarray) -> np.ndarray:
+        """
+        Vectorised version of the conversion from encoder ticks to degrees
+        """
+        wrap_point = 2048.0 if self.hardware_version == 2 else 512.0
+        return np.round(np.asarray(ticks) / wrap_point * 180.0 * 10.0) / 10.0
+
     def __degrees_2_pos(self, degrees):
         wrap_point = 2048.0 if self.hardware_version == 2 else 512.0
 
@@ -99,46 +133,81 @@ class RotaryEncoderModule(object):
         """
         self.arcom.write_array([self.COM_TOGGLESTREAM, 0])
 
+    def drain_input(self, quiet: float = 0.02, timeout: float = 0.5) -> int:
+        """
+        Discards the incoming bytes until none has been received for `quiet` seconds. After `disable_stream`,
+        the packets sent by the module before it got the command can still be on their way in the USB buffers,
+        they would otherwise be read as the answers of the next commands
+        :param quiet: duration without any incoming byte, longer than the USB latency
+        :param timeout: maximum duration of the drain
+        :return: number of bytes discarded
+        """
+        serial_object = self.arcom.serial_object
+        n_bytes = 0
+        t_start = t_last = time.monotonic()
+        while (now := time.monotonic()) - t_last < quiet:
+            if now - t_start > timeout:
+                log.warning("The rotary encoder is still streaming after it was asked to stop")
+                break
+            if waiting := serial_object.in_waiting:
+                n_bytes += len(serial_object.read(waiting))
+                t_last = time.monotonic()
+            else:
+                time.sleep(0.001)
+        serial_object.reset_input_buffer()
+        return n_bytes
+
+    def _read_exact(self, n_bytes: int) -> bytes:
+        """
+        Reads n_bytes from the serial port in as few calls as possible
+        """
+        data = bytearray()
+        while len(data) < n_bytes:
+            chunk = self.arcom.serial_object.read(n_bytes - len(data))
+            if not chunk:
+                raise TimeoutError(f"Expected {n_bytes} bytes from the rotary encoder, got {len(data)}")
+            data += chunk
+        return bytes(data)
+
+    def read_stream_arrays(self) -> Bunch:
+        """
+        Reads and decodes in bulk the data being streamed through the USB port.
+        Incomplete packets are kept and completed on the next call.
+
+        :return: Bunch of numpy arrays: `time` (s) and `position` (degrees) of the position packets,
+         `event_time` (s), `event_origin` and `event` of the event packets
+        """
+        available = self.arcom.bytes_available()
+        data = self.arcom.serial_object.read(available) if available > 0 else b""
+        packets, self._stream_carry = parse_stream(self._stream_carry + data)
+        is_pos = packets["prefix"] == b"P"
+        is_evt = packets["prefix"] == b"E"
+        evt_data = packets["data"][is_evt].astype(np.int32) & 0xFFFF
+        return Bunch(
+            time=packets["time"][is_pos] / 1000.0,
+            position=self.ticks_to_degrees(packets["data"][is_pos]),
+            event_time=packets["time"][is_evt] / 1000.0,
+            event_origin=(evt_data & 0xFF).astype(np.uint8),
+            event=(evt_data >> 8).astype(np.uint8),
+        )
+
     def read_stream(self):
         """
         Reads the data being streamed through the USB port.
+        :return: list of ["P", time, position] and ["E", time, origin, event] entries in the order received
         """
-        res = []
         available = self.arcom.bytes_available()
-
-        if available > 1:
-            msg = self.arcom.read_bytes_array(available)
-
-            while len(msg) >= 7:
-                if msg[0] == b"P":
-                    position = int.from_bytes(
-                        b"".join(msg[1:3]), byteorder="little", signed=True
-                    )
-                    evt_time = (
-                        float(
-                            int.from_bytes(
-                                b"".join(msg[3:7]), byteorder="little", signed=False
-                            )
-                        )
-                        / 1000.0
-                    )
-                    position_degrees = self.__pos_2_degrees(position)
-                    res.append(["P", evt_time, position_degrees])
-                elif msg[0] == b"E":
-                    origin = msg[1]
-                    event = msg[2]
-                    evt_time = (
-                        float(
-                            int.from_bytes(
-                                b"".join(msg[3:7]), byteorder="little", signed=False
-                            )
-                        )
-                        / 1000.0
-                    )
-                    res.append(["E", evt_time, origin, event])
-
-                msg = msg[7:]
-
+        data = self.arcom.serial_object.read(available) if available > 0 else b""
+        packets, self._stream_carry = parse_stream(self._stream_carry + data)
+        times = packets["time"] / 1000.0
+        positions = self.ticks_to_degrees(packets["data"])
+        res = []
+        for prefix, data_, evt_time, position in zip(packets["prefix"], packets["data"], times, positions):
+            if prefix == b"P":
+                res.append(["P", float(evt_time), float(position)])
+            elif prefix == b"E":
+                data_ = int(data_) & 0xFFFF
+                res.append(["E", float(evt_time), bytes([data_ & 0xFF]), bytes([data_ >> 8])])
         return res
 
     def current_position(self):
@@ -194,32 +263,23 @@ class RotaryEncoderModule(object):
         """
         self.arcom.write_array([self.COM_STOPLOGGING])
 
+    def get_logged_data_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieves the logged data in the SD Card in a single bulk transfer.
+        :return: times (s) and positions (degrees)
+        """
+        self.arcom.write_array([self.COM_GETLOGDATA])
+        n_logs = int.from_bytes(self._read_exact(4), byteorder="little", signed=False)
+        logs = np.frombuffer(self._read_exact(n_logs * LOG_DTYPE.itemsize), dtype=LOG_DTYPE)
+        return logs["time"] / 1000.0, self.ticks_to_degrees(logs["position"])
+
     def get_logged_data(self):
         """
         Retrieves the logged data in the SD Card.
+        :return: list of (time, position) tuples
         """
-        self.arcom.write_array([self.COM_GETLOGDATA])
-        msg = self.arcom.read_bytes_array(4)
-        n_logs = int.from_bytes(b"".join(msg), byteorder="little", signed=False)
-        data = []
-
-        for i in range(0, n_logs):
-            msg = self.arcom.read_bytes_array(8)
-            data_in_bytes = b"".join(msg)
-
-            position = int.from_bytes(
-                data_in_bytes[:4], byteorder="little", signed=True
-            )
-            evt_time = (
-                float(
-                    int.from_bytes(data_in_bytes[4:], byteorder="little", signed=False)
-                )
-                / 1000.0
-            )
-            position_degrees = self.__pos_2_degrees(position)
-            data.append((evt_time, position_degrees))
-
-        return data
+        times, positions = self.get_logged_data_arrays()
+        return list(zip(times.tolist(), positions.tolist()))
 
     def set_prefix(self, prefix):
         """
@@ -253,3 +313,152 @@ class RotaryEncoderModule(object):
         data = ArduinoTypes.get_uint8_array([self.COM_SETWRAPPOINT, ticks])
         self.arcom.write_array(data)
         return self.arcom.read_uint8() == 1
+
+
+class RotaryEncoderStream:
+    """
+    Reads the position stream of the rotary encoder module in a background thread.
+    The positions are written into a preallocated ring buffer of (time, ticks), so the latest position
+    can be read at any rate without a round trip on the serial port.
+
+    The serial port is owned by the reader thread while streaming: commands expecting an answer from
+    the module must be sent within `paused()`.
+
+    >>> stream = RotaryEncoderStream(module)
+    >>> stream.start()
+    >>> stream.latest_degrees()
+    >>> with stream.paused():
+    >>>     module.set_position(0)
+    >>> stream.stop()
+
+    :param module: connected RotaryEncoderModule
+    :param size: number of samples kept in the ring buffer
+    """
+
+    def __init__(self, module: RotaryEncoderModule, size: int = 2**16):
+        self.module = module
+        self.size = size
+        self.times = np.zeros(size, dtype=np.float64)
+        self.ticks = np.zeros(size, dtype=np.int32)
+        # total number of samples written, the latest sample is at index (n_samples - 1) % size
+        self.n_samples = 0
+        self._carry = b""
+        self._thread = None
+        self._stopping = threading.Event()
+        self._pause_request = threading.Event()
+        self._parked = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._carry = b""
+        self.module.enable_stream()
+        self._thread = threading.Thread(target=self._read_loop, name="rotary_encoder_stream", daemon=True)
+        self._thread.start()
+
+    def _cancel_read(self) -> None:
+        # the wheel may be still, in which case the reader would wait for the serial timeout
+        serial_object = self.module.arcom.serial_object
+        if hasattr(serial_object, "cancel_read"):
+            serial_object.cancel_read()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._pause_request.clear()
+        self._cancel_read()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.module.disable_stream()
+        self._carry = b""
+        self.module.drain_input()
+
+    @contextmanager
+    def paused(self):
+        """
+        Stops the stream and parks the reader thread so that commands can read the module answers
+        """
+        if not self.is_running:
+            yield
+            return
+        self._parked.clear()
+        self._pause_request.set()
+        self._cancel_read()
+        self._parked.wait()
+        self.module.disable_stream()
+        # drop the packets that were in flight when the stream was stopped, the answers of the commands
+        # and the stream after resuming then start on a packet boundary
+        self._carry = b""
+        self.module.drain_input()
+        try:
+            yield
+        finally:
+            self.module.enable_stream()
+            self._pause_request.clear()
+
+    def append(self, time: float, ticks: int) -> None:
+        i = self.n_samples % self.size
+        self.times[i] = time
+        self.ticks[i] = ticks
+        # the counter is incremented last, readers never see a partially written sample
+        self.n_samples += 1
+
+    def latest(self) -> tuple[float, int] | None:
+        """
+        :return: (time in seconds, position in ticks) of the latest sample, None if nothing was received
+        """
+        n = self.n_samples
+        if n == 0:
+            return None
+        i = (n - 1) % self.size
+        return float(self.times[i]), int(self.ticks[i])
+
+    def latest_degrees(self) -> float | None:
+        sample = self.latest()
+        return None if sample is None else float(self.module.ticks_to_degrees(sample[1]))
+
+    def last_samples(self, n: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param n: number of samples, defaults to all the samples held in the buffer
+        :return: times (s) and ticks of the last n samples in chronological order
+        """
+        n_samples = self.n_samples
+        n = min(n_samples, self.size) if n is None else min(n, n_samples, self.size)
+        idx = np.arange(n_samples - n, n_samples) % self.size
+        return self.times[idx].copy(), self.ticks[idx].copy()
+
+    def extend(self, times: np.ndarray, ticks: np.ndarray) -> None:
+        n = min(times.size, self.size)
+        idx = np.arange(self.n_samples + times.size - n, self.n_samples + times.size) % self.size
+        self.times[idx] = times[-n:]
+        self.ticks[idx] = ticks[-n:]
+        self.n_samples += times.size
+
+    def parse(self, data: bytes) -> None:
+        """
+        Decodes position packets into the ring buffer, incomplete packets are kept for the next call
+        """
+        packets, self._carry = parse_stream(self._carry + data)
+        packets = packets[packets["prefix"] == b"P"]
+        if packets.size > 0:
+            self.extend(packets["time"] / 1000.0, packets["data"])
+
+    def _read_loop(self) -> None:
+        serial_object = self.module.arcom.serial_object
+        while not self._stopping.is_set():
+            if self._pause_request.is_set():
+                self._parked.set()
+                self._stopping.wait(0.001)
+                continue
+            try:
+                # blocks until at least one byte or the serial timeout
+                data = serial_object.read(max(1, serial_object.in_waiting))
+            except Exception as e:
+                log.error(f"Rotary encoder stream stopped: {e}")
+                break
+            if data:
+                self.parse(data)
+        self._parked.set()
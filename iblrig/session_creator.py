@@ -21,45 +21,90 @@ def draw_block_len(factor, min_=20, max_=100):
 
 
 # EPHYS CHOICE WORLD
-def make_ephysCW_pc(prob_type="biased"):
+EPHYS_CW_CONTRASTS = [1.0, 0.25, 0.125, 0.0625, 0.0]
+EPHYS_CW_DTYPE = np.dtype(
+    [
+        ("position", np.int16),
+        ("contrast", np.float64),
+        ("stim_probability_left", np.float64),
+        ("quiescent_period", np.float64),
+        ("stim_phase", np.float64),
+        ("block_num", np.int32),
+    ]
+)
+
+
+def make_ephysCW_session(
+    seed: int | np.random.Generator | None = None,
+    prob_type: str = "biased",
+    n_trials: int = 2001,
+    len_first_block: int = 90,
+) -> np.ndarray:
+    """
+    Generates the trials of an ephys choice world session, with all the random variables drawn in bulk.
+    The first block is unbiased and contains a balanced set of positions and contrasts, the following
+    blocks alternate between 0.8 and 0.2 probability of left stimulus, with a length drawn from a
+    truncated exponential. Blocks are added until the session has at least `n_trials` trials.
+    :param seed: seed or numpy random Generator, the same seed always gives the same session
+    :param prob_type: 'biased': the 0 contrast is drawn half as often as the other contrasts, so that the
+     signed contrasts are uniform, 'uniform': all contrasts are equally likely
+    :param n_trials: minimum number of trials
+    :param len_first_block: number of trials of the unbiased first block
+    :return: structured array with fields position, contrast, stim_probability_left, quiescent_period,
+     stim_phase and block_num, see EPHYS_CW_DTYPE
+    """
+    rng = np.random.default_rng(seed)
+    contrasts = np.array(EPHYS_CW_CONTRASTS)
+    # block lengths: the minimum length bounds the number of blocks needed
+    n_blocks_max = math.ceil(max(n_trials - len_first_block, 0) / 20) + 1
+    len_blocks = np.r_[len_first_block, misc.truncated_exponential(60, 20, 100, size=n_blocks_max, rng=rng).astype(int)]
+    n_blocks = np.searchsorted(np.cumsum(len_blocks), n_trials) + 1
+    len_blocks = len_blocks[:n_blocks]
+    first_prob_left = 0.8 if rng.random() < 0.5 else 0.2
+    block_probs = np.r_[0.5, np.where(np.arange(n_blocks - 1) % 2, 1 - first_prob_left, first_prob_left)]
+    block_probs = np.round(block_probs, 1)
+
+    trials = np.zeros(np.sum(len_blocks), dtype=EPHYS_CW_DTYPE)
+    trials["block_num"] = np.repeat(np.arange(n_blocks), len_blocks)
+    trials["stim_probability_left"] = np.repeat(block_probs, len_blocks)
+    # first block: balanced positions and contrasts, shuffled
+    half = len_first_block // 2
+    first_contrasts = np.sort(np.tile(contrasts, 10))[::-1][:half]
+    first = rng.permutation(len_first_block)
+    trials["position"][:len_first_block] = np.r_[np.full(half, -35), np.full(half, 35)][first]
+    trials["contrast"][:len_first_block] = np.r_[first_contrasts, first_contrasts][first]
+    # biased blocks
+    n_biased = trials.size - len_first_block
+    biased = trials[len_first_block:]
+    biased["position"] = np.where(rng.random(n_biased) < biased["stim_probability_left"], -35, 35)
+    sampler = misc.get_contrast_sampler(EPHYS_CW_CONTRASTS, "biased" if prob_type in ["skew_zero", "biased"] else "uniform")
+    biased["contrast"] = sampler.draw(n_biased, rng=rng)
+    # quiescent period: 0.2 + x, where x~exp(0.35), t ∈ 0.2 <= R <= 0.5
+    trials["quiescent_period"] = 0.2 + misc.truncated_exponential(0.35, 0.2, 0.5, size=trials.size, rng=rng)
+    trials["stim_phase"] = rng.uniform(0, 2 * math.pi, size=trials.size)
+    return trials
+
+
+def make_ephysCW_pc(prob_type="biased", seed=None):
     """make_ephysCW_pc Makes positions, contrasts and block lengths for ephysCW
         Generates ~2000 trias
     :prob_type: (str) 'biased': 0 contrast half has likely to be drawn, 'uniform': 0 contrast as
     likely as other contrasts
+    :seed: seed of the random generator, if None it is drawn from the numpy global random state
     :return: pc
     :rtype: [type]
     """
-    contrasts = [1.0, 0.25, 0.125, 0.0625, 0.0]
-    len_block = [90]
-    pos = [-35] * int(len_block[0] / 2) + [35] * int(len_block[0] / 2)
-    cont = np.sort(contrasts * 10)[::-1][:-5].tolist()
-    prob = [0.5] * len_block[0]
-    pc = np.array([pos, cont + cont, prob]).T
-    np.random.shuffle(pc)  # only shuffles on the first dimension
-
-    prob_left = 0.8 if draw_position([-35, 35], 0.5) < 0 else 0.2
-    while len(pc) < 2001:
-        len_block.append(draw_block_len(60, min_=20, max_=100))
-        for _x in range(len_block[-1]):
-            p = draw_position([-35, 35], prob_left)
-            c = misc.draw_contrast(contrasts, probability_type=prob_type)
-            pc = np.append(pc, np.array([[p, c, prob_left]]), axis=0)
-            # do this in PC space
-        prob_left = np.round(np.abs(1 - prob_left), 1)
-
+    seed = np.random.randint(0, 2**31) if seed is None else seed
+    trials = make_ephysCW_session(seed=seed, prob_type=prob_type)
+    pc = np.c_[trials["position"], trials["contrast"], trials["stim_probability_left"]]
+    len_block = np.bincount(trials["block_num"]).tolist()
     return pc, len_block
 
 
 def make_ephysCW_pcqs(pc):
     qperiod_base = 0.2  # + x, where x~exp(0.35), t ∈ 0.2 <= R <= 0.5
-    sphase = []
-    qperiod = []
-    for _i in pc:
-        sphase.append(np.random.uniform(0, 2 * math.pi))
-        qperiod.append(
-            qperiod_base
-            + misc.truncated_exponential(scale=0.35, min_value=0.2, max_value=0.5)
-        )
+    sphase = np.random.uniform(0, 2 * math.pi, size=len(pc))
+    qperiod = qperiod_base + misc.truncated_exponential(0.35, 0.2, 0.5, size=len(pc))
     qs = np.array([qperiod, sphase]).T
     pcqs = np.append(pc, qs, axis=1)
     perm = [0, 1, 3, 4, 2]
@@ -0,0 +1,219 @@
+"""
+Persistent index of the sessions of the subjects folders.
+
+Looking for the previous sessions of a subject used to walk the whole subject folder, local or on the
+server, and to parse the experiment description and task settings of every session. The index keeps the
+parsed protocol, collection, number of trials and end time of each task in a SQLite database, so that
+finding the last sessions of a given protocol is a single query.
+
+The index is updated incrementally: a date folder is only listed again if its modification time
+changed, and only the sessions that are not finished, or new, are parsed again.
+Only the sessions at the subject/date/number depth of the ALF layout are indexed, with their experiment
+description files at the root of the session folder.
+
+>>> with SessionIndex(local_data_folder.joinpath(SESSION_INDEX_FILE)) as index:
+>>>     index.update(subject_folder)
+>>>     for record in index.iter_protocol(subject_folder, '_iblrig_tasks_trainingChoiceWorld'):
+>>>         ...
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from ibllib.io import session_params
+from ibllib.io.raw_data_loaders import load_settings
+from iblutil.util import Bunch, setup_logger
+
+log = setup_logger("iblrig")
+
+SESSION_INDEX_FILE = "_iblrig_session_index.sqlite"
+# folders modified more recently than this are listed again on the next update, as a file system with a
+# coarse time resolution could give the same modification time to a change that happens right after
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_path TEXT PRIMARY KEY,
+    subject_folder TEXT NOT NULL,
+    date_folder TEXT NOT NULL,
+    session_stub TEXT NOT NULL,
+    signature TEXT,
+    finished INTEGER NOT NULL DEFAULT 0,
+    experiment_description TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_subject ON sessions (subject_folder, session_stub);
+CREATE INDEX IF NOT EXISTS sessions_date ON sessions (date_folder);
+CREATE TABLE IF NOT EXISTS tasks (
+    session_path TEXT NOT NULL REFERENCES sessions (session_path) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    protocol TEXT NOT NULL,
+    collection TEXT,
+    ntrials INTEGER,
+    end_time TEXT,
+    task_settings TEXT,
+    PRIMARY KEY (session_path, position)
+);
+CREATE INDEX IF NOT EXISTS tasks_protocol ON tasks (protocol, position);
+"""
+
+
+def _description_files(session_path: Path) -> list[Path]:
+    """
+    Experiment description files of a session in the order they are read: the merged description first,
+    then the behaviour device description, then the other devices descriptions in alphabetical order
+    """
+    files = session_path.glob("_ibl_experiment.description*.yaml")
+    priority = {"_ibl_experiment.description.yaml": 0, "_ibl_experiment.description_behavior.yaml": 1}
+    return sorted(files, key=lambda f: (priority.get(f.name, 2), f.name))
+
+
+def _mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class SessionIndex:
+    """
+    SQLite index of the sessions found in one or several subject folders
+    :param db_file: path of the database, it is created if needed. ':memory:' gives a temporary index
+    """
+
+    def __init__(self, db_file: str | Path = ":memory:"):
+        if db_file != ":memory:":
+            Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self.db_file = db_file
+        self.con = sqlite3.connect(str(db_file), timeout=10)
+        self.con.execute("PRAGMA foreign_keys = ON")
+        self.con.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.con.close()
+
+    def update(self, subject_folder: Path) -> None:
+        """
+        Brings the index of a subject folder up to date
+        :param subject_folder: folder containing the date folders, ie. /data/Subjects/SW_001
+        """
+        subject_folder = Path(subject_folder)
+        now = time.time_ns()
+        date_folders = sorted(p for p in subject_folder.iterdir() if p.is_dir()) if subject_folder.exists() else []
+        with self.con:
+            indexed = self._session_paths("subject_folder", subject_folder)
+            removed = {p.parent for p in indexed} - set(date_folders)
+            for date_folder in removed:
+                self.con.execute("DELETE FROM sessions WHERE date_folder = ?", (str(date_folder),))
+                self.con.execute("DELETE FROM folders WHERE path = ?", (str(date_folder),))
+            for date_folder in date_folders:
+                mtime = _mtime_ns(date_folder)
+                row = self.con.execute("SELECT mtime_ns FROM folders WHERE path = ?", (str(date_folder),)).fetchone()
+                if mtime is not None and row is not None and row[0] == mtime:
+                    # no session folder was added or removed: only the unfinished sessions may have changed
+                    session_paths = self._session_paths("date_folder", date_folder, finished=False)
+                else:
+                    session_paths = sorted(p for p in date_folder.iterdir() if p.is_dir())
+                    for session_path in set(self._session_paths("date_folder", date_folder)) - set(session_paths):
+                        self.con.execute("DELETE FROM sessions WHERE session_path = ?", (str(session_path),))
+                for session_path in session_paths:
+                    self._update_session(subject_folder, session_path)
+                if mtime is not None and now - mtime < MTIME_RESOLUTION_NS:
+                    mtime = None
+                self.con.execute("INSERT OR REPLACE INTO folders VALUES (?, ?)", (str(date_folder), mtime))
+
+    def _session_paths(self, column: str, folder: Path, finished: bool | None = None) -> list[Path]:
+        query = f"SELECT session_path FROM sessions WHERE {column} = ?"
+        if finished is not None:
+            query += f" AND finished = {int(finished)}"
+        return [Path(r[0]) for r in self.con.execute(query, (str(folder),))]
+
+    def _update_session(self, subject_folder: Path, session_path: Path) -> None:
+        """Parses the experiment description and task settings of a session if they changed since the last update"""
+        description_files = _description_files(session_path)
+        # the tasks are read from the first description that lists them, the other devices have none
+        ad = None
+        for file_experiment in description_files:
+            ad = session_params.read_params(file_experiment)
+            if ad and "tasks" in ad:
+                break
+        tasks = [next(iter(t.items())) for t in (ad or {}).get("tasks", [])]
+        files = description_files + [
+            next(session_path.joinpath(task.get("collection", "")).glob("_iblrig_taskSettings.raw*.json"), None)
+            for _, task in tasks
+        ]
+        signature = json.dumps([(str(f), _mtime_ns(f)) if f else None for f in files])
+        row = self.con.execute("SELECT signature FROM sessions WHERE session_path = ?", (str(session_path),)).fetchone()
+        if row is not None and row[0] == signature:
+            return
+        settings_files = files[len(description_files):]
+        records = []
+        for position, (protocol, task) in enumerate(tasks):
+            task_settings = load_settings(session_path, task_collection=task["collection"]) if settings_files[position] else None
+            task_settings = task_settings or {}
+            records.append(
+                (
+                    str(session_path),
+                    position,
+                    protocol,
+                    task.get("collection"),
+                    task_settings.get("NTRIALS"),
+                    task_settings.get("SESSION_END_TIME"),
+                    json.dumps(task_settings, default=str) if task_settings else None,
+                )
+            )
+        # a session is final once all its tasks recorded an end time, it won't be parsed again
+        finished = len(records) > 0 and all(r[5] is not None for r in records)
+        self.con.execute("DELETE FROM sessions WHERE session_path = ?", (str(session_path),))
+        self.con.execute(
+            "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(session_path),
+                str(subject_folder),
+                str(session_path.parent),
+                "_".join(session_path.parts[-2:]),
+                signature,
+                int(finished),
+                json.dumps(ad, default=str) if ad is not None else None,
+            ),
+        )
+        self.con.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+
+    def iter_protocol(self, subject_folder: Path, task_name: str):
+        """
+        Iterates over the sessions of a subject whose first task is `task_name`, most recent first
+        :param subject_folder: folder containing the date folders, ie. /data/Subjects/SW_001
+        :param task_name: protocol name, ie. '_iblrig_tasks_trainingChoiceWorld'
+        :return: generator of Bunch with keys session_stub, session_path, experiment_description and tasks,
+         a list of (protocol, collection, ntrials, task_settings) tuples in the order of the description
+        """
+        sessions = self.con.execute(
+            "SELECT s.session_path, s.session_stub, s.experiment_description FROM sessions s "
+            "JOIN tasks t ON t.session_path = s.session_path AND t.position = 0 "
+            "WHERE s.subject_folder = ? AND t.protocol = ? ORDER BY s.session_stub DESC",
+            (str(Path(subject_folder)), task_name),
+        ).fetchall()
+        for session_path, session_stub, experiment_description in sessions:
+            tasks = self.con.execute(
+                "SELECT protocol, collection, ntrials, task_settings FROM tasks WHERE session_path = ? ORDER BY position",
+                (session_path,),
+            ).fetchall()
+            yield Bunch(
+                {
+                    "session_stub": session_stub,
+                    "session_path": Path(session_path),
+                    "experiment_description": json.loads(experiment_description),
+                    "tasks": [(p, c, n, json.loads(s) if s else None) for p, c, n, s in tasks],
+                }
+            )
@@ -1,14 +1,23 @@
+import collections
+import hashlib
+import json
+import os
+from pathlib import Path
+
 import numpy as np
 from scipy.signal import chirp
 
-from iblutil.util import setup_logger
+from iblutil.util import Bunch, setup_logger
 from pybpod_soundcard_module.module_api import DataType, SampleRate, SoundCardModule
 
 log = setup_logger("iblrig")
 
+SOUND_CACHE_DIR = Path.home().joinpath(".iblrig", "sounds")
+SOUND_CARD_UPLOADS_FILE = "sound_card_uploads.json"
+
 
 def make_sound(
-    rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01, chans="L+TTL"
+    rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01, chans="L+TTL", rng=None
 ):
     """
     Build sounds and save bin file for upload to soundcard or play via
@@ -29,6 +38,8 @@ def make_sound(
     :param chans: ['mono', 'L', 'R', 'stereo', 'L+TTL', 'TTL+R'] number of
                    sound channels and type of output, defaults to 'L+TTL'
     :type chans: str, optional
+    :param rng: random generator of the white noise, defaults to the global numpy random state
+    :type rng: numpy.random.Generator, optional
     :return: streo sound from mono definitions
     :rtype: np.ndarray with shape (Nsamples, 2)
     """
@@ -54,7 +65,7 @@ def make_sound(
     null = np.zeros(len(tone))
 
     if frequency == -1:
-        tone = amplitude * np.random.rand(tone.size)
+        tone = amplitude * (rng or np.random).random(tone.size)
 
     if chans == "mono":
         sound = np.array(tone)
@@ -121,14 +132,131 @@ def format_sound(sound, file_path=None, flat=False):
     return bin_sound.flatten() if flat else bin_sound
 
 
-def configure_sound_card(card=None, sounds=None, indexes=None, sample_rate=96):
+def _flat_int32(sound):
+    """int32 contiguous vector of a sound, formatted unless it already is"""
+    if sound.dtype == np.int32:
+        return np.ascontiguousarray(sound).reshape(-1)
+    return format_sound(sound, flat=True)
+
+
+def sound_digest(sound, sample_rate=None):
+    """content hash of the int32 buffer of a sound, and of its sample rate"""
+    h = hashlib.sha1(_flat_int32(sound).tobytes())
+    h.update(str(sample_rate).encode())
+    return h.hexdigest()
+
+
+class SoundCache:
+    """
+    Sounds built by `make_sound` and formatted as int32 buffers, ready to upload to the sound card or to
+    play with sounddevice, keyed by the full set of parameters. The buffers are kept in memory, and stored
+    as .npy files that are memory mapped by the next sessions. Unseeded white noises are not stored on disk.
+
+    The cache also records the digest of the last sound uploaded at each index of the Harp sound cards, keyed
+    by an identifier of the card such as its serial number, so that `configure_sound_card` can skip the sounds
+    already on an identified card.
+
+    :param cache_dir: folder of the buffers and upload record, None to keep them in memory only
+    """
+
+    def __init__(self, cache_dir=SOUND_CACHE_DIR):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._buffers = {}
+        self._uploads = None
+
+    @staticmethod
+    def key(rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01, chans="L+TTL", seed=None):
+        params = dict(
+            rate=rate, frequency=frequency, duration=duration, amplitude=amplitude, fade=fade, chans=chans, seed=seed
+        )
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def get(self, rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01, chans="L+TTL", seed=None):
+        """
+        Returns the int32 buffer of a sound, see `make_sound` for the parameters
+        :param seed: seed of the white noise (frequency=-1), the same seed always gives the same noise
+        :return: read-only int32 np.ndarray of shape (n_samples, n_channels)
+        """
+        key = self.key(rate, frequency, duration, amplitude, fade, chans, seed)
+        if key in self._buffers:
+            return self._buffers[key]
+        file_buffer = None
+        if self.cache_dir is not None and (frequency != -1 or seed is not None):
+            file_buffer = self.cache_dir.joinpath(f"{key}.npy")
+        buffer = None
+        if file_buffer is not None and file_buffer.exists():
+            try:
+                buffer = np.load(file_buffer, mmap_mode="r")
+            except (OSError, ValueError):
+                log.warning(f"Corrupted sound cache file {file_buffer}, rebuilding it")
+        if buffer is None:
+            rng = np.random.default_rng(seed) if seed is not None else None
+            sound = make_sound(rate, frequency, duration, amplitude, fade, chans, rng=rng)
+            buffer = format_sound(sound)
+            if file_buffer is not None:
+                buffer = self._save(file_buffer, buffer)
+            buffer.flags.writeable = False
+        self._buffers[key] = buffer
+        return buffer
+
+    @staticmethod
+    def _save(file_buffer, buffer):
+        try:
+            file_buffer.parent.mkdir(parents=True, exist_ok=True)
+            file_tmp = file_buffer.with_suffix(f".{os.getpid()}.part")
+            with open(file_tmp, "wb") as fid:
+                np.save(fid, buffer)
+            os.replace(file_tmp, file_buffer)
+            return np.load(file_buffer, mmap_mode="r")
+        except OSError as e:
+            log.warning(f"Could not write the sound cache file {file_buffer}: {e}")
+            return buffer
+
+    @property
+    def uploads(self):
+        """digests of the sounds uploaded to the sound cards, by card identifier and index"""
+        if self._uploads is None:
+            self._uploads = {}
+            if self.cache_dir is not None and self.cache_dir.joinpath(SOUND_CARD_UPLOADS_FILE).exists():
+                try:
+                    self._uploads = json.loads(self.cache_dir.joinpath(SOUND_CARD_UPLOADS_FILE).read_text())
+                except (OSError, ValueError):
+                    log.warning("Corrupted sound card upload record, all the sounds will be uploaded")
+        return self._uploads
+
+    def is_uploaded(self, card_id, index, digest):
+        uploads = self.uploads.get(str(card_id))
+        return isinstance(uploads, dict) and uploads.get(str(index)) == digest
+
+    def record_upload(self, card_id, index, digest):
+        if not isinstance(self.uploads.get(str(card_id)), dict):
+            self.uploads[str(card_id)] = {}
+        self.uploads[str(card_id)][str(index)] = digest
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.cache_dir.joinpath(SOUND_CARD_UPLOADS_FILE).write_text(json.dumps(self.uploads, indent=1))
+        except OSError as e:
+            log.warning(f"Could not write the sound card upload record: {e}")
+
+
+def configure_sound_card(card=None, sounds=None, indexes=None, sample_rate=96, cache=None, card_id=None, force=False):
+    """
+    Uploads sounds to the Harp sound card
+    :param card: SoundCardModule, if None the card is opened and closed, only if a sound needs to be uploaded
+    :param sounds: list of sounds, float arrays from `make_sound` or int32 buffers from `SoundCache.get`
+    :param indexes: list of the sound indexes on the card
+    :param sample_rate: 96 or 192 (KHz)
+    :param cache: SoundCache recording the uploads
+    :param card_id: identifier of the card, such as its serial number. Only with an identifier are the sounds
+     identical to the last upload to this card at their index skipped, otherwise all the sounds are uploaded
+    :param force: uploads all the sounds, even if the cache records them on the card
+    """
     if indexes is None:
         indexes = []
     if sounds is None:
         sounds = []
-    if card is None:
-        card = SoundCardModule()
-        close_card = True
 
     if sample_rate in (192, 192000):
         sample_rate = SampleRate._192000HZ
@@ -142,14 +270,160 @@ def configure_sound_card(card=None, sounds=None, indexes=None, sample_rate=96):
         log.error("Wrong number of sounds and indexes")
         raise (ValueError)
 
-    sounds = [format_sound(s, flat=True) for s in sounds]
+    # the record of the uploads is only trusted for an identified card
+    skip_uploaded = cache is not None and card_id is not None and not force
+    uploads = []
     for sound, index in zip(sounds, indexes):
+        digest = sound_digest(sound, sample_rate) if cache is not None and card_id is not None else None
+        if skip_uploaded and cache.is_uploaded(card_id, index, digest):
+            log.info(f"Sound {index} already on the sound card {card_id}, skipping upload")
+            continue
+        uploads.append((_flat_int32(sound), index, digest))
+    if len(uploads) == 0:
+        return
+
+    close_card = card is None
+    if card is None:
+        card = SoundCardModule()
+    for sound, index, digest in uploads:
         card.send_sound(sound, index, sample_rate, DataType.INT32)
+        if digest is not None:
+            cache.record_upload(card_id, index, digest)
 
     if close_card:
         card.close()
 
 
+class SoundEngine:
+    """
+    Plays preloaded sounds through a persistent output stream of the computer sound card.
+
+    `sounddevice.play` opens a new stream on each call, which adds tens of milliseconds of latency and
+    jitter to the sound onset. The engine opens a single stream when the session starts: the Bpod soft
+    code handler posts commands to a deque, which the audio callback consumes at the start of its next
+    block, without taking any lock.
+
+    The onset latency of each sound is measured as the time between the command and the output of the
+    first TTL sample of the buffer, as encoded by `make_sound`, from the timestamps of the stream.
+
+    >>> engine = SoundEngine(sd, samplerate=44100, channels=2)
+    >>> engine.preload("GO_TONE", make_sound(rate=44100, chans="L+TTL"), ttl_channel=1)
+    >>> engine.start()
+    >>> engine.play("GO_TONE")
+    >>> engine.close()
+
+    :param sd: sounddevice module, as configured by `iblrig.hardware.sound_device_factory`
+    :param samplerate: sample rate of the stream
+    :param channels: number of channels of the stream
+    :param blocksize: frames per callback, 0 lets the host choose an optimal, possibly varying, size
+    :param latency: output latency of the stream, 'low' or in seconds
+    :param max_latencies: number of onset latencies kept for the report
+    """
+
+    def __init__(self, sd, samplerate=44100, channels=2, blocksize=0, latency="low", max_latencies=10000):
+        self.sd = sd
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.latency = latency
+        self.stream = None
+        self.buffers = {}
+        self.latencies = collections.deque(maxlen=max_latencies)
+        self._commands = collections.deque()
+        # state of the audio thread
+        self._current = None
+        self._position = 0
+        self._onset = None
+
+    def preload(self, name, sound, ttl_channel=None):
+        """
+        Converts a sound to the stream format and keeps it in memory
+        :param name: name of the sound, ie. 'GO_TONE'
+        :param sound: float sound from `make_sound` or int32 buffer from `SoundCache.get`
+        :param ttl_channel: channel of the TTL pulse, its first sample is used as the onset
+        """
+        sound = np.asarray(sound)
+        if sound.dtype == np.int32:
+            sound = sound / ((2**31) - 1)
+        sound = np.ascontiguousarray(sound.reshape(sound.shape[0], -1), dtype=np.float32)
+        if sound.shape[1] != self.channels:
+            raise ValueError(f"Sound {name} has {sound.shape[1]} channels, the stream has {self.channels}")
+        ttl = np.flatnonzero(sound[:, ttl_channel] > 0.5) if ttl_channel is not None else []
+        self.buffers[name] = (sound, ttl[0] if len(ttl) else 0)
+
+    def start(self):
+        if self.stream is not None:
+            return
+        self.stream = self.sd.OutputStream(
+            samplerate=self.samplerate,
+            channels=self.channels,
+            dtype="float32",
+            blocksize=self.blocksize,
+            latency=self.latency,
+            callback=self._callback,
+        )
+        self.stream.start()
+        log.info(f"Sound output stream started, latency {self.stream.latency * 1000:.1f} ms")
+
+    def _check_started(self):
+        if self.stream is None:
+            raise RuntimeError("The sound engine is not started, call start() first")
+
+    def play(self, name):
+        self._check_started()
+        if name not in self.buffers:
+            raise KeyError(f"Sound {name} is not preloaded, available sounds: {list(self.buffers)}")
+        self._commands.append((name, self.stream.time))
+
+    def stop(self):
+        self._check_started()
+        self._commands.append((None, self.stream.time))
+
+    def close(self):
+        if self.stream is None:
+            return
+        self.stream.stop()
+        self.stream.close()
+        self.stream = None
+        report = self.latency_report()
+        if report.n:
+            log.info(
+                f"Sound onset latency over {report.n} sounds: {report.mean * 1000:.2f} ± {report.std * 1000:.2f} ms, "
+                f"max {report.max * 1000:.2f} ms"
+            )
+
+    def latency_report(self):
+        """:return: Bunch with the number, mean, standard deviation and maximum of the onset latencies (s)"""
+        latencies = np.array(self.latencies)
+        if latencies.size == 0:
+            return Bunch(n=0, mean=np.nan, std=np.nan, max=np.nan)
+        return Bunch(n=latencies.size, mean=latencies.mean(), std=latencies.std(), max=latencies.max())
+
+    def _callback(self, outdata, frames, time_info, status):
+        while self._commands:
+            name, t_command = self._commands.popleft()
+            if name is None or name not in self.buffers:
+                # an exception would abort the stream, unknown names are rejected by play()
+                self._current, self._onset = None, None
+            else:
+                self._current, self._position = self.buffers[name], 0
+                self._onset = t_command
+        if self._current is None:
+            outdata.fill(0)
+            return
+        sound, i_ttl = self._current
+        n = min(frames, sound.shape[0] - self._position)
+        outdata[:n] = sound[self._position : self._position + n]
+        outdata[n:] = 0
+        if self._onset is not None:
+            t_ttl = time_info.outputBufferDacTime + i_ttl / self.samplerate
+            self.latencies.append(t_ttl - self._onset)
+            self._onset = None
+        self._position += n
+        if self._position >= sound.shape[0]:
+            self._current = None
+
+
 # FIXME: in _passiveCW use SoundCardModule to give to this v instead of finding device yourself
 def trigger_sc_sound(sound_idx, card=None):
     if card is None:
@@ -161,6 +161,18 @@ class TestAdaptiveReward(unittest.TestCase):
                 )
 
 
+class TestTrainingContrasts(unittest.TestCase):
+    def test_training_phases(self):
+        for phase in range(6):
+            contrasts = iblrig.choiceworld.contrasts_set(phase)
+            positive_contrasts = contrasts[contrasts >= 0]
+            self.assertEqual(iblrig.choiceworld.training_phase_from_contrast_set(positive_contrasts[::-1]), phase)
+            draws = iblrig.choiceworld.draw_training_contrast(phase, size=1000, rng=np.random.default_rng(phase))
+            np.testing.assert_array_equal(np.unique(draws), contrasts)
+        with self.assertRaises(Exception):
+            iblrig.choiceworld.training_phase_from_contrast_set([0.3, 1])
+
+
 class TestsBiasedBlocksGeneration(unittest.TestCase):
     @staticmethod
     def count_contrasts(pc):
@@ -189,3 +201,17 @@ class TestsBiasedBlocksGeneration(unittest.TestCase):
         c = self.count_contrasts(pc)
         c[4] /= 2
         assert np.all(np.abs(1 - c * 10) <= 0.2)
+
+    def test_session_reproducible(self):
+        trials = session_creator.make_ephysCW_session(seed=1234)
+        np.testing.assert_array_equal(trials, session_creator.make_ephysCW_session(seed=1234))
+        self.assertFalse(np.array_equal(trials, session_creator.make_ephysCW_session(seed=4321)))
+        self.assertGreaterEqual(trials.size, 2001)
+        # unbiased first block of 90 trials, then alternating 0.8 / 0.2 blocks of 20 to 100 trials
+        len_blocks = np.bincount(trials["block_num"])
+        self.assertEqual(len_blocks[0], 90)
+        self.assertTrue(np.all((len_blocks[1:] >= 20) & (len_blocks[1:] <= 100)))
+        block_probs = trials["stim_probability_left"][np.cumsum(len_blocks) - 1]
+        self.assertEqual(block_probs[0], 0.5)
+        np.testing.assert_allclose(block_probs[1:-1] + block_probs[2:], 1)
+        self.assertTrue(np.all((trials["quiescent_period"] >= 0.4) & (trials["quiescent_period"] <= 0.7)))
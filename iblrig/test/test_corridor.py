@@ -0,0 +1,58 @@
+import time
+import unittest
+from unittest import mock
+
+from panda3d.core import loadPrcFileData
+
+# render to offscreen buffers, without audio, so that the tests run on machines without a display
+loadPrcFileData("", "window-type offscreen\naudio-library-name null")
+
+from iblrig.panda3d.corridor.corridor import ITI_SCENE, Corridor  # noqa: E402
+from iblrig.panda3d.corridor.render_thread import CorridorRenderThread  # noqa: E402
+
+
+class TestCorridorScenes(unittest.TestCase):
+    def setUp(self):
+        self.corridor = Corridor()
+        self.addCleanup(self.corridor.destroy)
+
+    def test_texture_and_scene_reuse(self):
+        corridor = self.corridor
+        with mock.patch.object(corridor.loader, "load_texture", wraps=corridor.loader.load_texture) as load_texture:
+            corridor.preload([])
+            self.assertEqual(load_texture.call_count, 1)  # the black corridor has a single texture
+            scene = corridor.get_scene(ITI_SCENE)
+            corridor.show_iti()
+            corridor.show_iti()
+            texture = corridor.get_texture("pebble.jpg")
+            self.assertIs(texture, corridor.get_texture("pebble.jpg"))
+            self.assertEqual(load_texture.call_count, 2)
+        self.assertIs(corridor.active_scene, scene)
+        self.assertEqual(corridor.render.find_all_matches(f"corridor_{ITI_SCENE}").get_num_paths(), 1)
+        corridor.clear_corridor()
+        self.assertTrue(scene.get_parent().is_empty())
+        self.assertIs(corridor.get_scene(ITI_SCENE), scene)
+        corridor.render_frame()
+
+
+class TestCorridorRenderThread(unittest.TestCase):
+    def test_render_thread(self):
+        positions = []
+
+        def position_source():
+            positions.append(10.0)
+            return 10.0
+
+        thread = CorridorRenderThread(position_source=position_source)
+        try:
+            thread.ITI()
+            t0 = time.monotonic()
+            while thread.frame_count < 2 and time.monotonic() - t0 < 10:
+                time.sleep(0.01)
+        finally:
+            thread.stop()
+        self.assertIsNone(thread._error)
+        self.assertGreaterEqual(thread.frame_count, 2)
+        self.assertGreaterEqual(len(positions), 2)
+        with self.assertRaises(RuntimeError):
+            thread.ITI()
@@ -0,0 +1,39 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from iblrig.file_watcher import InotifyWatcher, PollingWatcher
+
+
+class TestFileWatchers(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.file = Path(self.td.name).joinpath("_iblrig_taskData.raw.jsonable")
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def _check_watcher(self, watcher):
+        try:
+            self.assertFalse(watcher.wait(timeout=0.05))
+            timer = threading.Timer(0.05, self.file.write_text, args=('{"trial_num": 0}\n',))
+            timer.start()
+            self.assertTrue(watcher.wait(timeout=5))
+            timer.join()
+            # a single write may be reported as several events
+            while watcher.wait(timeout=0.05):
+                pass
+            # changes to other files of the folder are ignored
+            self.file.with_name("other.txt").write_text("other")
+            self.assertFalse(watcher.wait(timeout=0.05))
+        finally:
+            watcher.close()
+
+    def test_polling(self):
+        self._check_watcher(PollingWatcher(self.file, interval=0.01))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify(self):
+        self._check_watcher(InotifyWatcher(self.file))
@@ -0,0 +1,36 @@
+import io
+import unittest
+
+import numpy as np
+
+from iblrig import frame2TTL
+
+
+class TestThresholds(unittest.TestCase):
+    def setUp(self):
+        self.arr = np.random.default_rng(0).integers(1000, 3000, 20000).astype(np.uint16)
+
+    def test_sliding_mean_diffs(self):
+        signed = self.arr.astype(np.int64)
+        expected = [np.diff(signed[i : i + 20]).mean() for i in range(signed.size - 19)]
+        np.testing.assert_allclose(frame2TTL.sliding_mean_diffs(self.arr), expected)
+        # the windows spanning two chunks give the same extrema as the whole array
+        extrema = frame2TTL.SlidingMeanDiffExtrema(window=20)
+        for chunk in np.array_split(self.arr, [5, 13, 1000, 7777]):
+            extrema.update(chunk)
+        self.assertEqual(extrema.nwindows, len(expected))
+        self.assertEqual((extrema.min, extrema.max), (np.min(expected), np.max(expected)))
+
+    def test_measure_manual(self):
+        f2ttl = frame2TTL.Frame2TTLv2.__new__(frame2TTL.Frame2TTLv2)
+        f2ttl.serial = io.BytesIO(self.arr.astype("<u2").tobytes())
+        f2ttl.serial.write = lambda _: None
+        arr, threshold = f2ttl._measure_manual(20000, light=True)
+        np.testing.assert_array_equal(arr, self.arr)
+        self.assertEqual(threshold, f2ttl._calc_threshold(self.arr, light=True))
+        # incomplete acquisition
+        f2ttl.serial = io.BytesIO(self.arr[:15000].astype("<u2").tobytes())
+        f2ttl.serial.write = lambda _: None
+        arr, threshold = f2ttl._measure_manual(20000, dark=True)
+        self.assertEqual(arr.size, 15000)
+        self.assertIsNone(threshold)
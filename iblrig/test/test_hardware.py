@@ -1,6 +1,8 @@
 import unittest
+from unittest.mock import MagicMock, patch
 
-from iblrig.hardware import Bpod
+from iblrig.hardware import Bpod, MyRotaryEncoder, StateMachineCache
+from iblutil.util import Bunch
 
 
 class TestHardware(unittest.TestCase):
@@ -17,3 +19,59 @@ class TestHardware(unittest.TestCase):
         self.assertEqual({"COM3", "COM4"}, Bpod._instances.keys())
         bpod0.__del__()
         self.assertEqual({"COM4"}, Bpod._instances.keys())
+
+
+class TestStateMachineCache(unittest.TestCase):
+    def setUp(self):
+        # the payload is checked by the pybpodapi tests, here it only needs to identify the state machine
+        patcher = patch.object(Bpod, "compile_state_machine", side_effect=lambda sma: f"payload {sma.key}".encode())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.built = []
+
+    def build(self, key):
+        self.built.append(key)
+        return Bunch(key=key, current_state=3, is_running=True)
+
+    def test_hit_and_miss(self):
+        cache = StateMachineCache()
+        sma0, message0 = cache.get((True, 1), lambda: self.build((True, 1)))
+        self.assertEqual(b"payload (True, 1)", message0)
+        # a running state machine is rewound when it is handed out again
+        sma0.current_state, sma0.is_running = 5, True
+        sma1, message1 = cache.get((True, 1), lambda: self.build((True, 1)))
+        self.assertIs(sma0, sma1)
+        self.assertIs(message0, message1)
+        self.assertEqual((0, False), (sma1.current_state, sma1.is_running))
+        # another key is a miss
+        sma2, _ = cache.get((False, 1), lambda: self.build((False, 1)))
+        self.assertIsNot(sma0, sma2)
+        self.assertEqual([(True, 1), (False, 1)], self.built)
+        self.assertEqual(2, len(cache))
+        self.assertIn((False, 1), cache)
+        # None disables the cache
+        cache.get(None, lambda: self.build(None))
+        cache.get(None, lambda: self.build(None))
+        self.assertEqual([(True, 1), (False, 1), None, None], self.built)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(4, Bpod.compile_state_machine.call_count)
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+
+class TestMyRotaryEncoder(unittest.TestCase):
+    def test_reset_trial_and_stop(self):
+        encoder = MyRotaryEncoder(gain=1, com="COM#")
+        encoder.rotary_encoder = MagicMock()
+        stream = encoder.stream = MagicMock()
+        stream.latest.return_value = (1.5, 12)
+        encoder.reset_trial()
+        # both commands are sent within a single pause of the stream
+        stream.paused.assert_called_once()
+        encoder.rotary_encoder.set_position.assert_called_once_with(0)
+        encoder.rotary_encoder.set_thresholds.assert_called_once_with(encoder.SET_THRESHOLDS)
+        stream.append.assert_called_once_with(1.5, 0)
+        encoder.stop_stream()
+        stream.stop.assert_called_once()
+        self.assertIsNone(encoder.stream)
+        encoder.stop_stream()
@@ -1,9 +1,20 @@
+import json
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import numpy as np
 
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.raw_data_loaders import (
+    TASK_SUMMARY_FILE,
+    JsonableReader,
+    compute_task_summary,
+    load_task_jsonable,
+    load_task_summary,
+    save_task_summary,
+)
 
 
 class TestLoadTaskData(unittest.TestCase):
@@ -32,3 +43,106 @@ class TestLoadTaskData(unittest.TestCase):
                 )
 
         assert bpod_data_full[-1] == bpod_data[0]
+
+
+class TestJsonableReader(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.jsonable_file = Path(self.td.name).joinpath("_iblrig_taskData.raw.jsonable")
+        shutil.copy(Path(__file__).parent.joinpath("fixtures", "task_data_short.jsonable"), self.jsonable_file)
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_random_access(self):
+        reader = JsonableReader(self.jsonable_file)
+        trials_table, bpod_data = load_task_jsonable(self.jsonable_file)
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(reader[-1]["behavior_data"], bpod_data[-1])
+        self.assertEqual([t["trial_num"] for t in reader], trials_table["trial_num"].tolist())
+        self.assertEqual(reader.tail(1), [reader[1]])
+        # the index is kept in memory, nothing is added to the session
+        self.assertIsNone(reader.index_file)
+        self.assertEqual(list(Path(self.td.name).iterdir()), [self.jsonable_file])
+
+    def test_appends(self):
+        index_file = Path(self.td.name).joinpath("cache", "taskData.idx")
+        index_file.parent.mkdir()
+        reader = JsonableReader(self.jsonable_file, index_file=index_file)
+        self.assertEqual(len(reader.read_new()), 2)
+        self.assertEqual(reader.read_new(), [])
+        # a half written line is ignored until it is complete
+        line = json.dumps({"trial_num": 2}) + "\n"
+        with open(self.jsonable_file, "a") as fid:
+            fid.write(line[:5])
+        self.assertEqual(reader.read_new(), [])
+        with open(self.jsonable_file, "a") as fid:
+            fid.write(line[5:])
+        self.assertEqual(reader.read_new(), [{"trial_num": 2}])
+        # a new reader picks up the index saved on disk
+        reader = JsonableReader(self.jsonable_file, index_file=index_file)
+        self.assertEqual(len(reader), 3)
+        self.assertEqual(reader.offset(2), self.jsonable_file.stat().st_size - len(line))
+
+
+class TestTaskSummary(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.td.name).joinpath("cache")
+        self.jsonable_file = Path(self.td.name).joinpath(
+            "local", "Subjects", "subject", "2023-01-01", "001", "raw_task_data_00", "_iblrig_taskData.raw.jsonable"
+        )
+        self.jsonable_file.parent.mkdir(parents=True)
+        shutil.copy(Path(__file__).parent.joinpath("fixtures", "task_data_short.jsonable"), self.jsonable_file)
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_summary_with_session(self):
+        trials_table, _ = load_task_jsonable(self.jsonable_file)
+        file_summary = save_task_summary(self.jsonable_file)
+        # the summary is written next to the task data, it is copied to the server with the session
+        self.assertEqual(file_summary, self.jsonable_file.with_name(TASK_SUMMARY_FILE))
+        remote_file = Path(self.td.name).joinpath("remote", *self.jsonable_file.parts[-6:])
+        shutil.copytree(self.jsonable_file.parent, remote_file.parent)
+        with mock.patch("iblrig.raw_data_loaders.compute_task_summary") as compute:
+            summary = load_task_summary(remote_file, cache_dir=self.cache_dir)
+            compute.assert_not_called()
+        self.assertEqual(summary["ntrials"], trials_table.shape[0])
+        self.assertAlmostEqual(summary["reward_amount"], trials_table["reward_amount"].sum())
+        self.assertEqual(summary["n_responses"], np.sum(trials_table["response_side"] != 0))
+        self.assertFalse(self.cache_dir.exists())
+        # an out of date summary is not used
+        with open(self.jsonable_file) as fid:
+            record = json.loads(fid.readline())
+        record["training_phase"] = 4
+        with open(self.jsonable_file, "a") as fid:
+            fid.write(json.dumps(record) + "\n")
+        summary = load_task_summary(self.jsonable_file, cache_dir=self.cache_dir)
+        self.assertEqual(summary["ntrials"], trials_table.shape[0] + 1)
+        self.assertEqual(summary["training_phase"], 4)
+
+    def test_summary_cache(self):
+        # sessions written without a summary: it is cached locally, outside of the session
+        summary = load_task_summary(self.jsonable_file, cache_dir=self.cache_dir)
+        self.assertEqual(list(self.jsonable_file.parent.iterdir()), [self.jsonable_file])
+        self.assertEqual(len(list(self.cache_dir.iterdir())), 1)
+        # the cached summary is used as long as the task data doesn't change, also for the remote copy of the session
+        remote_file = Path(self.td.name).joinpath("remote", *self.jsonable_file.parts[-6:])
+        shutil.copytree(self.jsonable_file.parent, remote_file.parent)
+        with mock.patch("iblrig.raw_data_loaders.compute_task_summary") as compute:
+            self.assertEqual(load_task_summary(self.jsonable_file, cache_dir=self.cache_dir), summary)
+            self.assertEqual(load_task_summary(remote_file, cache_dir=self.cache_dir), summary)
+            compute.assert_not_called()
+        self.assertEqual(list(remote_file.parent.iterdir()), [remote_file])
+
+    def test_missing_values(self):
+        with open(self.jsonable_file) as fid:
+            record = json.loads(fid.readline())
+        with open(self.jsonable_file, "a") as fid:
+            for reward_amount, response_side in [(float("nan"), None), (None, 0), (1.5, float("nan"))]:
+                fid.write(json.dumps(dict(record, reward_amount=reward_amount, response_side=response_side)) + "\n")
+        trials_table, _ = load_task_jsonable(self.jsonable_file)
+        summary = compute_task_summary(self.jsonable_file)
+        self.assertAlmostEqual(summary["reward_amount"], trials_table["reward_amount"].sum())
+        self.assertEqual(summary["n_responses"], np.sum(trials_table["response_side"] != 0))
@@ -0,0 +1,48 @@
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+
+from iblrig.local_cleanup import plan_local_cleanup
+from iblrig.transfer_experiments import BehaviorCopier
+
+
+class TestPlanLocalCleanup(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.local_subjects_folder = Path(self.td.name).joinpath("local", "Subjects")
+        self.remote_subjects_folder = Path(self.td.name).joinpath("remote", "Subjects")
+        self.remote_subjects_folder.mkdir(parents=True)
+
+    def make_session(self, date, status=None, size=100):
+        session_path = self.local_subjects_folder.joinpath("subject", date, "001")
+        session_path.joinpath("raw_task_data_00").mkdir(parents=True)
+        session_path.joinpath("_ibl_experiment.description_behavior.yaml").write_text("tasks: []\n")
+        session_path.joinpath("raw_task_data_00", "data.bin").write_bytes(b"0" * size)
+        if status is not None:
+            stub = BehaviorCopier(session_path, self.remote_subjects_folder).file_remote_experiment_description
+            stub.parent.mkdir(parents=True)
+            stub.touch()
+            stub.with_suffix(f".status_{status}").touch()
+        return session_path
+
+    def test_plan(self):
+        old_final = self.make_session("2023-01-01", status="final", size=1000)
+        old_complete = self.make_session("2023-01-02", status="complete")
+        recent_final = self.make_session("2023-01-20", status="final")
+        self.local_subjects_folder.joinpath("subject", "not_a_date").mkdir()
+        plan = plan_local_cleanup(
+            self.local_subjects_folder,
+            self.remote_subjects_folder,
+            copier=BehaviorCopier,
+            weeks=2,
+            now=datetime.datetime(2023, 1, 25),
+        )
+        self.assertEqual([s[0] for s in plan.sessions], [old_final])
+        self.assertEqual(plan.total_bytes, 1000 + len("tasks: []\n"))
+        self.assertIn("Cleanup size", str(plan))
+        self.assertEqual(plan.execute(), plan.total_bytes)
+        self.assertFalse(old_final.exists())
+        self.assertTrue(old_complete.exists())
+        self.assertTrue(recent_final.exists())
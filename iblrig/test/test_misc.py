@@ -43,6 +43,35 @@ class TestMisc(unittest.TestCase):
             IndexError, misc.draw_contrast, [0, 1], "biased", 2
         )  # assert exception for out-of-range index
 
+    def test_contrast_sampler(self):
+        contrast_set = [1.0, 0.5, 0.0]
+        sampler = misc.get_contrast_sampler(contrast_set, "biased")
+        self.assertIs(sampler, misc.get_contrast_sampler(contrast_set, "biased"))
+        np.testing.assert_allclose(sampler.probabilities, misc.get_biased_probs(3))
+        contrasts = sampler.draw(10000, rng=np.random.default_rng(0))
+        self.assertEqual(contrasts.shape, (10000,))
+        f_obs = np.unique(contrasts, return_counts=True)[1]
+        assert stats.chisquare(f_obs, np.array([0.5, 1, 1]) / 2.5 * 10000).pvalue > 0.05
+        np.testing.assert_array_equal(
+            misc.draw_contrast(contrast_set, "uniform", size=20, rng=np.random.default_rng(1)),
+            misc.draw_contrast(contrast_set, "uniform", size=20, rng=np.random.default_rng(1)),
+        )
+        self.assertIn(misc.draw_contrast(contrast_set), contrast_set)
+
+    def test_truncated_exponential(self):
+        rng = np.random.default_rng(0)
+        for scale, min_value, max_value in [(0.35, 0.2, 0.5), (60, 20, 100)]:
+            x = misc.truncated_exponential(scale, min_value, max_value, size=5000, rng=rng)
+            self.assertEqual(x.shape, (5000,))
+            self.assertTrue(np.all((x >= min_value) & (x <= max_value)))
+            expected = stats.truncexpon(b=(max_value - min_value) / scale, loc=min_value, scale=scale)
+            assert stats.kstest(x, expected.cdf).pvalue > 0.01
+        self.assertIsInstance(misc.truncated_exponential(), float)
+        np.testing.assert_array_equal(
+            misc.truncated_exponential(size=10, rng=np.random.default_rng(1)),
+            misc.truncated_exponential(size=10, rng=np.random.default_rng(1)),
+        )
+
     def test_online_std(self):
         n = 41
         b = np.random.rand(n)
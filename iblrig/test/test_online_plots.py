@@ -34,3 +34,79 @@ class TestOnlinePlots(unittest.TestCase):
     @classmethod
     def tearDownClass(cls) -> None:
         cls.task_file.unlink()
+
+
+class TestDataModel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.task_file = Path(__file__).parent.joinpath("fixtures", "task_data_short.jsonable")
+        self.trials_table, self.bpod_data = load_task_jsonable(self.task_file)
+
+    def test_from_existing_file(self):
+        data = op.DataModel(task_file=self.task_file)
+        self.assertEqual(data.ntrials, 2)
+        self.assertEqual(data.psychometrics["count"].sum(), 2)
+        self.assertEqual(data.psychometrics.loc[(0.5, -0.25), "count"], 1)
+        self.assertEqual(data.last_trials["correct"].iloc[-2:].tolist(), [False, True])
+        np.testing.assert_array_equal(data.last_contrasts[-2:], [[0.25, 0], [0, 1]])
+        np.testing.assert_array_equal(data.rgb_background[-1, 0], [0, 255, 0])
+
+    def test_ring_buffers(self):
+        data = op.DataModel(task_file=None)
+        n = op.NTRIALS_PLOT + 5
+        for i in range(n):
+            trial = self.trials_table.iloc[i % 2].copy()
+            trial["response_time"] = float(i)
+            data.update_trial(trial, self.bpod_data[i % 2])
+        # the most recent trial is the last row
+        np.testing.assert_array_equal(data.last_trials["response_time"].values, np.arange(5, n))
+        self.assertEqual(data.last_trials["correct"].tolist()[-2:], [True, False])
+        self.assertEqual(data.trials_table["response_time"].iloc[n - 1], n - 1)
+        self.assertEqual(data.psychometrics.loc[(0.5, 1.0), "count"], n // 2)
+
+    def test_set_index(self):
+        self.assertEqual(op._set_index(op.PROBABILITY_INDEX, op.PROBABILITY_SET, 0.8), 2)
+        self.assertEqual(op._set_index(op.SIGNED_CONTRAST_INDEX, op.SIGNED_CONTRAST_SET, -0.0), 5)
+        # values off the set, ie. floating point errors, fall back on the nearest value
+        self.assertEqual(op._set_index(op.SIGNED_CONTRAST_INDEX, op.SIGNED_CONTRAST_SET, -0.06251), 4)
+
+    def test_numpy_columns(self):
+        """the arrays used by the plots match the dataframes"""
+        data = op.DataModel(task_file=self.task_file)
+        for column in ["stim_on", "response_time"]:
+            np.testing.assert_array_equal(data.last_trials_column(column), data.last_trials[column].values)
+        for p in op.PROBABILITY_SET:
+            choice = data.psychometrics_column(p, "choice")
+            np.testing.assert_array_equal(choice, data.psychometrics.loc[p]["choice"].values)
+            # a view of the accumulator, it follows the updates
+            self.assertTrue(np.shares_memory(choice, data._psychometrics))
+
+
+class TestBlitting(unittest.TestCase):
+    def setUp(self) -> None:
+        self.task_file = Path(__file__).parent.joinpath("fixtures", "task_data_short.jsonable")
+        self.trials_table, self.bpod_data = load_task_jsonable(self.task_file)
+
+    def test_trial_update_does_not_redraw_figure(self):
+        myop = op.OnlinePlots()
+        self.assertTrue(myop.blit)
+        myop.h.fig.canvas.draw()
+        draws = []
+        myop.h.fig.canvas.mpl_connect("draw_event", draws.append)
+        myop.update_trial(self.trials_table.iloc[1], self.bpod_data[1])
+        self.assertEqual(draws, [])
+        self.assertEqual(myop.h.bar_correct[0].get_height(), myop.data.percent_correct)
+
+    def test_growing_text_captures_backgrounds(self):
+        myop = op.OnlinePlots()
+        myop.h.fig.canvas.draw()
+        draws = []
+        myop.h.fig.canvas.mpl_connect("draw_event", draws.append)
+        # a longer title doesn't fit the cached background: full redraw
+        myop.h.ax_water.title.set_text("total reward\n" + "9" * 30 + "μL")
+        myop.render()
+        self.assertEqual(len(draws), 1)
+        self.assertTrue(all(myop._fits_background(name) for name in myop._dynamic_artists))
+        # a shorter title is blitted over the background of the longer one
+        myop.h.ax_water.title.set_text("total reward\n1.0μL")
+        myop.render()
+        self.assertEqual(len(draws), 1)
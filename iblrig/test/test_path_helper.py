@@ -1,9 +1,15 @@
 """Tests for iblrig.path_helper module."""
+import json
+import shutil
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
+
+import yaml
 
 import iblrig.path_helper
+import iblrig.session_index
 from iblrig.base_tasks import BonsaiRecordingMixin
 
 
@@ -97,5 +103,81 @@ class TestHardwareSettings(unittest.TestCase):
         )
 
 
+class TestSessionIndex(unittest.TestCase):
+    """Test for iblrig.path_helper.iterate_previous_sessions with the persistent session index"""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.local_path = Path(tmp.name)
+        self.subject_folder = self.local_path.joinpath("cortexlab", "Subjects", "SW_001")
+
+    def make_session(self, date, number, protocol, ntrials, end_time=None):
+        session_path = self.subject_folder.joinpath(date, number)
+        collection = "raw_task_data_00"
+        session_path.joinpath(collection).mkdir(parents=True)
+        description = {"tasks": [{protocol: {"collection": collection}}]}
+        with open(session_path.joinpath("_ibl_experiment.description_behavior.yaml"), "w") as fp:
+            yaml.safe_dump(description, fp)
+        self.write_settings(session_path, ntrials, end_time)
+        return session_path
+
+    @staticmethod
+    def write_settings(session_path, ntrials, end_time=None):
+        settings = {"NTRIALS": ntrials, "SESSION_END_TIME": end_time, "IBLRIG_VERSION": "7.2.3"}
+        with open(session_path.joinpath("raw_task_data_00", "_iblrig_taskSettings.raw.json"), "w") as fp:
+            json.dump(settings, fp)
+
+    def previous_sessions(self, n=2):
+        return iblrig.path_helper.iterate_previous_sessions(
+            "SW_001", task_name="training", local_path=self.local_path, lab="cortexlab", n=n
+        )
+
+    def test_iterate_previous_sessions(self):
+        self.make_session("2023-01-01", "001", "training", 400, end_time="2023-01-01T12:00:00")
+        self.make_session("2023-01-02", "001", "passive", 400, end_time="2023-01-02T12:00:00")
+        ongoing = self.make_session("2023-01-02", "002", "training", 0)
+        sessions = self.previous_sessions()
+        self.assertEqual([s.session_stub for s in sessions], ["2023-01-01_001"])
+        self.assertEqual(sessions[0].task_settings["NTRIALS"], 400)
+        self.assertTrue(self.local_path.joinpath(iblrig.session_index.SESSION_INDEX_FILE).exists())
+        # the unfinished session is parsed again once its settings are written at the end
+        self.write_settings(ongoing, 500, end_time="2023-01-02T13:00:00")
+        sessions = self.previous_sessions()
+        self.assertEqual([s.session_stub for s in sessions], ["2023-01-01_001", "2023-01-02_002"])
+        self.assertEqual(
+            sessions[1].file_task_data, ongoing.joinpath("raw_task_data_00", "_iblrig_taskData.raw.jsonable")
+        )
+        # new and removed sessions are picked up
+        shutil.rmtree(self.subject_folder.joinpath("2023-01-01"))
+        self.make_session("2023-01-03", "001", "training", 300, end_time="2023-01-03T12:00:00")
+        sessions = self.previous_sessions(n=5)
+        self.assertEqual([s.session_stub for s in sessions], ["2023-01-02_002", "2023-01-03_001"])
+
+    def test_finished_sessions_are_not_parsed_again(self):
+        self.make_session("2023-01-01", "001", "training", 400, end_time="2023-01-01T12:00:00")
+        with iblrig.session_index.SessionIndex() as index:
+            index.update(self.subject_folder)
+            with mock.patch("iblrig.session_index.load_settings") as load_settings:
+                index.update(self.subject_folder)
+                load_settings.assert_not_called()
+            records = list(index.iter_protocol(self.subject_folder, "training"))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].tasks[0][:3], ("training", "raw_task_data_00", 400))
+
+    def test_several_description_files(self):
+        session_path = self.make_session("2023-01-01", "001", "training", 400, end_time="2023-01-01T12:00:00")
+        # another device description listed first alphabetically, with its own tasks, and one without tasks
+        with open(session_path.joinpath("_ibl_experiment.description_audio.yaml"), "w") as fp:
+            yaml.safe_dump({"tasks": [{"passive": {"collection": "raw_task_data_00"}}]}, fp)
+        with open(session_path.joinpath("_ibl_experiment.description_video.yaml"), "w") as fp:
+            yaml.safe_dump({"devices": {"cameras": {"left": {}}}}, fp)
+        self.assertEqual([s.session_stub for s in self.previous_sessions()], ["2023-01-01_001"])
+        # the merged description has precedence over the devices descriptions
+        with open(session_path.joinpath("_ibl_experiment.description.yaml"), "w") as fp:
+            yaml.safe_dump({"tasks": [{"passive": {"collection": "raw_task_data_00"}}]}, fp)
+        self.assertEqual(self.previous_sessions(), [])
+
+
 if __name__ == "__main__":
     unittest.main(exit=False)
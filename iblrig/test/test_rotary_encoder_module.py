@@ -0,0 +1,151 @@
+import struct
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from iblrig.rotary_encoder_module import RotaryEncoderModule, RotaryEncoderStream
+
+
+def _packet(prefix: bytes, ticks: int, time_ms: int) -> bytes:
+    return struct.pack("<chI", prefix, ticks, time_ms)
+
+
+class FakeSerial:
+    def __init__(self):
+        self.buffer = b""
+        self.lock = threading.Lock()
+
+    def feed(self, data: bytes) -> None:
+        with self.lock:
+            self.buffer += data
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.buffer)
+
+    def read(self, n: int) -> bytes:
+        time.sleep(0.001)
+        with self.lock:
+            data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def reset_input_buffer(self) -> None:
+        with self.lock:
+            self.buffer = b""
+
+    def cancel_read(self) -> None:
+        pass
+
+
+class FakeArCOM:
+    def __init__(self):
+        self.serial_object = FakeSerial()
+        self.written = []
+
+    def write_array(self, array):
+        self.written.append(list(array))
+
+    def bytes_available(self):
+        return self.serial_object.in_waiting
+
+
+class TestRotaryEncoderStream(unittest.TestCase):
+    def setUp(self):
+        self.module = RotaryEncoderModule(hardware_version=2)
+        self.module.arcom = FakeArCOM()
+
+    def test_parse_partial_packets(self):
+        stream = RotaryEncoderStream(self.module, size=4)
+        data = b"".join(_packet(b"P", i - 3, 10 * i) for i in range(6)) + _packet(b"E", 1, 55)
+        # feed the bytes in chunks that do not align with the packets
+        for i in range(0, len(data), 5):
+            stream.parse(data[i : i + 5])
+        self.assertEqual(stream.n_samples, 6)
+        self.assertEqual(stream.latest(), (0.05, 2))
+        times, ticks = stream.last_samples()
+        np.testing.assert_array_equal(ticks, [-1, 0, 1, 2])
+        np.testing.assert_allclose(times, [0.02, 0.03, 0.04, 0.05])
+        self.assertEqual(stream.latest_degrees(), float(self.module.ticks_to_degrees(2)))
+
+    def test_thread_and_pause(self):
+        stream = RotaryEncoderStream(self.module)
+        self.assertIsNone(stream.latest())
+        stream.start()
+        self.module.arcom.serial_object.feed(_packet(b"P", 1024, 1000))
+        t0 = time.time()
+        while stream.n_samples == 0 and time.time() - t0 < 2:
+            time.sleep(0.005)
+        self.assertEqual(stream.latest_degrees(), 90.0)
+        with stream.paused():
+            # nothing sent while paused reaches the buffer, it is left to the command
+            self.module.arcom.serial_object.feed(b"\x01")
+            time.sleep(0.02)
+            self.assertEqual(self.module.arcom.serial_object.in_waiting, 1)
+        stream.stop()
+        # enable, disable, enable, disable
+        self.assertEqual([w[1] for w in self.module.arcom.written], [1, 0, 1, 0])
+
+    def _deliver_packets_after_stop(self):
+        serial_object = self.module.arcom.serial_object
+        write_array = self.module.arcom.write_array
+
+        def write_array_with_latency(array):
+            write_array(array)
+            if list(array) == [RotaryEncoderModule.COM_TOGGLESTREAM, 0]:
+                # the packets sent before the module got the command arrive after it, the last one split
+                packets = _packet(b"P", 1, 1) * 3
+                threading.Timer(0.003, serial_object.feed, args=(packets[:10],)).start()
+                threading.Timer(0.006, serial_object.feed, args=(packets[10:],)).start()
+
+        self.module.arcom.write_array = write_array_with_latency
+
+    def test_pause_drops_packets_in_flight(self):
+        stream = RotaryEncoderStream(self.module)
+        stream.start()
+        serial_object = self.module.arcom.serial_object
+        self._deliver_packets_after_stop()
+        with stream.paused():
+            # the command answers start on an empty buffer
+            time.sleep(0.01)
+            self.assertEqual(serial_object.in_waiting, 0)
+            serial_object.feed(b"\x01")
+            self.assertEqual(serial_object.read(1), b"\x01")
+        stream.stop()
+        self.assertEqual(stream.n_samples, 0)
+
+    def test_stop_drops_packets_in_flight(self):
+        stream = RotaryEncoderStream(self.module)
+        stream.start()
+        self._deliver_packets_after_stop()
+        stream.stop()
+        # the next commands, or the next session, start on an empty buffer
+        time.sleep(0.01)
+        self.assertEqual(self.module.arcom.serial_object.in_waiting, 0)
+        self.assertFalse(stream.is_running)
+
+
+class TestRotaryEncoderModule(unittest.TestCase):
+    def setUp(self):
+        self.module = RotaryEncoderModule(hardware_version=1)
+        self.module.arcom = FakeArCOM()
+
+    def test_read_stream(self):
+        data = _packet(b"P", 256, 1500) + struct.pack("<cBBI", b"E", 3, 7, 1600) + _packet(b"P", -512, 1700)
+        # the last packet arrives in two reads
+        self.module.arcom.serial_object.feed(data[:-3])
+        self.assertEqual(self.module.read_stream(), [["P", 1.5, 90.0], ["E", 1.6, b"\x03", b"\x07"]])
+        self.module.arcom.serial_object.feed(data[-3:])
+        out = self.module.read_stream_arrays()
+        np.testing.assert_array_equal(out.time, [1.7])
+        np.testing.assert_array_equal(out.position, [-180.0])
+        self.assertEqual(out.event.size, 0)
+
+    def test_get_logged_data(self):
+        positions = np.array([0, 128, -256, 70000], dtype=np.int32)
+        times = np.array([0, 1, 2, 3000], dtype=np.uint32)
+        logs = np.column_stack([positions.view(np.uint32), times]).astype("<u4").tobytes()
+        self.module.arcom.serial_object.feed(struct.pack("<I", positions.size) + logs)
+        data = self.module.get_logged_data()
+        self.assertEqual(data, [(0.0, 0.0), (0.001, 45.0), (0.002, -90.0), (3.0, 24609.4)])
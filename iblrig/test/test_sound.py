@@ -0,0 +1,118 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from iblrig import sound
+
+
+class TestSoundCache(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.cache_dir = Path(self.td.name)
+
+    def test_get(self):
+        cache = sound.SoundCache(self.cache_dir)
+        tone = cache.get(rate=96000, frequency=5000, duration=0.1, amplitude=0.1)
+        self.assertEqual(tone.dtype, np.int32)
+        self.assertIs(tone, cache.get(rate=96000, frequency=5000, duration=0.1, amplitude=0.1))
+        np.testing.assert_array_equal(
+            tone, sound.format_sound(sound.make_sound(rate=96000, frequency=5000, duration=0.1, amplitude=0.1))
+        )
+        # a new cache maps the buffer stored on disk
+        tone_disk = sound.SoundCache(self.cache_dir).get(rate=96000, frequency=5000, duration=0.1, amplitude=0.1)
+        self.assertIsInstance(tone_disk, np.memmap)
+        np.testing.assert_array_equal(tone, tone_disk)
+        # white noises are stored on disk only if seeded
+        sound.SoundCache(self.cache_dir).get(frequency=-1)
+        self.assertEqual(len(list(self.cache_dir.glob("*.npy"))), 1)
+        noise = sound.SoundCache(self.cache_dir).get(frequency=-1, seed=3)
+        np.testing.assert_array_equal(noise, sound.SoundCache(None).get(frequency=-1, seed=3))
+        self.assertEqual(len(list(self.cache_dir.glob("*.npy"))), 2)
+
+    def test_upload(self):
+        cache = sound.SoundCache(self.cache_dir)
+        sounds = [cache.get(frequency=5000), cache.get(frequency=-1, seed=0)]
+        card = mock.MagicMock()
+        # without a card identifier, all the sounds are uploaded every time
+        for _ in range(2):
+            sound.configure_sound_card(card, sounds, [2, 3], sample_rate=96, cache=cache)
+        self.assertEqual(card.send_sound.call_count, 4)
+        card.reset_mock()
+        sound.configure_sound_card(card, sounds, [2, 3], sample_rate=96, cache=cache, card_id="SN001")
+        self.assertEqual(card.send_sound.call_count, 2)
+        # identical sounds are not uploaded again to the same card, even by another session
+        card.reset_mock()
+        cache = sound.SoundCache(self.cache_dir)
+        sounds = [cache.get(frequency=5000), cache.get(frequency=-1, seed=1)]
+        sound.configure_sound_card(card, sounds, [2, 3], sample_rate=96, cache=cache, card_id="SN001")
+        self.assertEqual(card.send_sound.call_count, 1)
+        self.assertEqual(card.send_sound.call_args[0][1], 3)
+        sound.configure_sound_card(card, sounds, [2, 3], sample_rate=96, cache=cache, card_id="SN001", force=True)
+        self.assertEqual(card.send_sound.call_count, 3)
+        # another card gets all the sounds
+        sound.configure_sound_card(card, sounds, [2, 3], sample_rate=96, cache=cache, card_id="SN002")
+        self.assertEqual(card.send_sound.call_count, 5)
+        card.close.assert_not_called()
+
+
+class FakeOutputStream:
+    """Stands for sounddevice.OutputStream, the test calls the audio callback"""
+
+    latency = 0.005
+
+    def __init__(self, callback, **kwargs):
+        self.callback = callback
+        self.kwargs = kwargs
+        self.time = 0.0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestSoundEngine(unittest.TestCase):
+    def test_engine(self):
+        engine = sound.SoundEngine(mock.MagicMock(OutputStream=FakeOutputStream), samplerate=1000, channels=2)
+        with self.assertRaises(RuntimeError):
+            engine.play("GO_TONE")
+        engine.preload("GO_TONE", sound.make_sound(rate=1000, frequency=100, duration=0.1, chans="L+TTL"), ttl_channel=1)
+        engine.preload("WHITE_NOISE", sound.SoundCache(None).get(rate=1000, frequency=-1, duration=0.1, chans="L+TTL"))
+        engine.start()
+        self.assertEqual(engine.stream.kwargs["dtype"], "float32")
+        with self.assertRaises(KeyError):
+            engine.play("UNKNOWN")
+
+        def run_block(t_dac, frames=32):
+            outdata = np.ones((frames, 2), dtype=np.float32)
+            engine.stream.callback(outdata, frames, mock.MagicMock(outputBufferDacTime=t_dac), None)
+            return outdata
+
+        np.testing.assert_array_equal(run_block(1.0), 0)
+        engine.stream.time = 1.01
+        engine.play("GO_TONE")
+        out = run_block(1.05)
+        np.testing.assert_array_equal(out, engine.buffers["GO_TONE"][0][:32])
+        self.assertAlmostEqual(engine.latency_report().mean, 0.04)
+        # the tone plays until its end, then the stream outputs silence
+        out = np.concatenate([run_block(1.1) for _ in range(3)])
+        np.testing.assert_array_equal(out[:68], engine.buffers["GO_TONE"][0][32:])
+        np.testing.assert_array_equal(out[68:], 0)
+        engine.play("WHITE_NOISE")
+        engine.stop()
+        np.testing.assert_array_equal(run_block(1.2), 0)
+        engine.play("WHITE_NOISE")
+        self.assertTrue(np.any(run_block(1.3) != 0))
+        self.assertEqual(engine.latency_report().n, 2)
+        engine.close()
+        self.assertIsNone(engine.stream)
+        with self.assertRaises(ValueError):
+            engine.preload("MONO", sound.make_sound(rate=1000, chans="mono"))
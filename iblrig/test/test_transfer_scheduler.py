@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from iblrig.transfer_experiments import BandwidthLimiter, copy_tree
+from iblrig.transfer_scheduler import TransferScheduler, server_share
+
+
+class FakeCopier:
+    state = 1
+    throttle = None
+    lock = threading.Lock()
+
+    def __init__(self, session_path, remote_subjects_folder, log):
+        self.session_path = session_path
+        self.remote_subjects_folder = remote_subjects_folder
+        self.log = log
+
+    def run(self, **kwargs):
+        with self.copy_slots, self.lock:
+            self.log.append(("start", self.session_path.name, self.remote_subjects_folder))
+        self.throttle.consume(100)
+        time.sleep(0.05)
+        self.state = 2
+        with self.lock:
+            self.log.append(("end", self.session_path.name, self.remote_subjects_folder))
+
+
+class TestTransferScheduler(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+
+    def test_scheduling(self):
+        log = []
+        scheduler = TransferScheduler(max_sessions=3, max_per_destination=2)
+        for i, size in enumerate([5000, 10, 300, 20]):
+            session_path = Path(self.td.name).joinpath(f"session_{i}")
+            session_path.mkdir()
+            session_path.joinpath("data.bin").write_bytes(b"0" * size)
+            # the sessions of different subjects folders on the same share compete for the same server
+            remote = f"//server/share/Subjects{i}" if i < 3 else "//nas/share/Subjects"
+            scheduler.add(FakeCopier(session_path, remote, log))
+        jobs = scheduler.run()
+        self.assertTrue(all(job.status for job in jobs))
+        self.assertEqual(scheduler.limiter.bytes, 400)
+        # smallest sessions first, with at most 2 concurrent sessions per destination
+        self.assertEqual([e[1] for e in log if e[0] == "start"][:3], ["session_1", "session_3", "session_2"])
+        running = {"server": 0, "nas": 0}
+        for event, _, destination in log:
+            server = destination.split("/")[2]
+            running[server] += 1 if event == "start" else -1
+            self.assertLessEqual(running[server], 2)
+
+    def test_no_limit_per_destination(self):
+        log = []
+        scheduler = TransferScheduler(max_sessions=4)
+        for i in range(4):
+            session_path = Path(self.td.name).joinpath(f"session_{i}")
+            session_path.mkdir()
+            scheduler.add(FakeCopier(session_path, "//server/share/Subjects", log))
+        scheduler.run()
+        # all the sessions copied to the same server run together
+        self.assertEqual([e[0] for e in log[:4]], ["start"] * 4)
+
+    def test_server_share(self):
+        self.assertEqual(server_share(r"\\SERVER\Share\Subjects"), server_share("//server/share/Data/Subjects"))
+        self.assertNotEqual(server_share("//server/share/Subjects"), server_share("//nas/share/Subjects"))
+        self.assertEqual(server_share("/"), "/")
+
+
+class CountingSemaphore(threading.BoundedSemaphore):
+    def __init__(self, value):
+        super().__init__(value)
+        self.active = self.max_active = 0
+
+    def __enter__(self):
+        super().__enter__()
+        with FakeCopier.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+
+    def __exit__(self, *args):
+        with FakeCopier.lock:
+            self.active -= 1
+        super().__exit__(*args)
+
+
+class TestCopySlots(unittest.TestCase):
+    def test_copy_slots_shared(self):
+        """the files copied by all the sessions are bounded by the copy slots"""
+        slots = CountingSemaphore(2)
+        with tempfile.TemporaryDirectory() as td:
+            threads = []
+            for i in range(3):
+                local = Path(td).joinpath(f"local{i}")
+                local.mkdir()
+                for j in range(4):
+                    local.joinpath(f"file{j}.bin").write_bytes(os.urandom(1000))
+                kwargs = dict(max_workers=4, slots=slots)
+                threads.append(threading.Thread(target=copy_tree, args=(local, Path(td).joinpath(f"remote{i}")), kwargs=kwargs))
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            for i in range(3):
+                self.assertEqual(len(list(Path(td).joinpath(f"remote{i}").iterdir())), 4)
+        self.assertEqual(slots.max_active, 2)
+
+
+class TestBandwidthLimiter(unittest.TestCase):
+    def test_rate(self):
+        limiter = BandwidthLimiter(rate=1e6)
+        t0 = time.monotonic()
+        for _ in range(4):
+            limiter.consume(100_000)
+        # the first second worth of data goes through without waiting
+        self.assertLess(time.monotonic() - t0, 0.1)
+        limiter.consume(1_200_000)
+        self.assertGreater(time.monotonic() - t0, 0.5)
+        self.assertEqual(limiter.bytes, 1_600_000)
@@ -1,4 +1,6 @@
 import copy
+import json
+import os
 import random
 import tempfile
 import unittest
@@ -9,7 +11,18 @@ import iblrig.commands
 import iblrig.raw_data_loaders
 from ibllib.io import session_params
 from iblrig.test.base import TASK_KWARGS
-from iblrig.transfer_experiments import BehaviorCopier, EphysCopier, VideoCopier
+from iblrig.transfer_experiments import (
+    VERIFY_STRATEGIES,
+    BehaviorCopier,
+    EphysCopier,
+    TransferManifest,
+    VideoCopier,
+    _copy_file_checksum,
+    copy_folders,
+    copy_tree,
+    probe_states,
+)
+from iblutil.io import hashfile
 from tasks._iblrig_tasks_trainingChoiceWorld.task import Session
 
 
@@ -91,6 +104,24 @@ class TestIntegrationTransferExperiments(unittest.TestCase):
             )
             self.assertEqual(sc.state, 3)
 
+    def test_behavior_crashed_session_missing_rewards(self):
+        """the water delivered of a crashed session is patched from the trials with a reward amount"""
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as td:
+            session = _create_behavior_session(td, ntrials=50, hard_crash=True)
+            trials, _ = iblrig.raw_data_loaders.load_task_jsonable(session.paths.DATA_FILE_PATH)
+            with open(session.paths.DATA_FILE_PATH) as fid:
+                record = json.loads(fid.readline())
+            with open(session.paths.DATA_FILE_PATH, "a") as fid:
+                for reward_amount in (float("nan"), None):
+                    fid.write(json.dumps(dict(record, reward_amount=reward_amount)) + "\n")
+            session.paths.SESSION_FOLDER.joinpath("transfer_me.flag").touch()
+            with mock.patch("iblrig.path_helper.load_settings_yaml", return_value=session.iblrig_settings):
+                iblrig.commands.transfer_data()
+            with open(session.paths.SESSION_RAW_DATA_FOLDER.joinpath("_iblrig_taskSettings.raw.json")) as fid:
+                settings = json.load(fid)
+            self.assertEqual(settings["NTRIALS"], 52)
+            self.assertEqual(settings["TOTAL_WATER_DELIVERED"], int(trials["reward_amount"].sum()))
+
     def test_behavior_do_not_copy_dummy_sessions(self):
         """
         Here we test the case when an aborted session or a session with less than 42 trials attempts to be copied
@@ -250,3 +281,117 @@ class TestUnitTransferExperiments(unittest.TestCase):
                 final_experiment_description["devices"]["cameras"].keys()
             ) == set(["body", "left", "right"])
             assert set(final_experiment_description["sync"].keys()) == set(["nidq"])
+
+
+class TestCopyTree(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.local_folder = Path(self.td.name).joinpath("local", "raw_ephys_data")
+        self.remote_folder = Path(self.td.name).joinpath("remote", "raw_ephys_data")
+        self.local_folder.joinpath("probe00").mkdir(parents=True)
+        self.files = {
+            "probe00/ephys.ap.bin": os.urandom(3 * 1024 + 17),
+            "probe00/ephys.ap.meta": b"nchannels=385",
+            "empty.bin": b"",
+            "transfer_me.flag": b"",
+        }
+        for name, data in self.files.items():
+            self.local_folder.joinpath(name).write_bytes(data)
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_copy_tree(self):
+        for verify in VERIFY_STRATEGIES:
+            with self.subTest(verify=verify):
+                hashes = copy_tree(
+                    self.local_folder, self.remote_folder, overwrite=True, verify=verify, max_workers=2
+                )
+                self.assertFalse(self.remote_folder.joinpath("transfer_me.flag").exists())
+                self.assertEqual(set(hashes), set(self.files) - {"transfer_me.flag"})
+                for name, file_hash in hashes.items():
+                    self.assertEqual(self.remote_folder.joinpath(name).read_bytes(), self.files[name])
+                    self.assertEqual(file_hash, hashfile.blake2b(self.local_folder.joinpath(name), False))
+        with self.assertRaises(FileExistsError):
+            copy_tree(self.local_folder, self.remote_folder)
+
+    def test_small_chunks(self):
+        src = self.local_folder.joinpath("probe00", "ephys.ap.bin")
+        dst = Path(self.td.name).joinpath("ephys.ap.bin")
+        _copy_file_checksum(src, dst, chunk_size=100)
+        self.assertEqual(dst.read_bytes(), src.read_bytes())
+        self.assertEqual(dst.stat().st_mtime, src.stat().st_mtime)
+
+    def test_resume_with_manifest(self):
+        src = self.local_folder.joinpath("probe00", "ephys.ap.bin")
+        dst = self.remote_folder.joinpath("probe00", "ephys.ap.bin")
+        dst.parent.mkdir(parents=True)
+        manifest = TransferManifest(self.remote_folder.joinpath("manifest.json"), root=self.remote_folder)
+        # interrupted transfer: 1000 bytes were recorded as copied, the remote file has a few more
+        dst.write_bytes(b"\0" * 1000 + self.files["probe00/ephys.ap.bin"][1000:1100])
+        manifest.update(dst, src.stat(), 1000, force=True)
+        manifest = TransferManifest(manifest.file, root=self.remote_folder)
+        file_hash = _copy_file_checksum(src, dst, verify="none", chunk_size=256, manifest=manifest)
+        self.assertEqual(file_hash, hashfile.blake2b(src, False))
+        # the first 1000 bytes were not copied again
+        self.assertEqual(dst.read_bytes(), b"\0" * 1000 + self.files["probe00/ephys.ap.bin"][1000:])
+        # the copy was not verified: it is complete but its hash is not recorded
+        entry = manifest.get(dst, src.stat())
+        self.assertEqual(entry["transferred"], src.stat().st_size)
+        self.assertIsNone(entry["blake2b"])
+        # a complete file is skipped without hash verification
+        _copy_file_checksum(src, dst, verify="size", manifest=manifest)
+        self.assertEqual(dst.read_bytes()[:1000], b"\0" * 1000)
+        # the hash verification of the complete file fails, it is copied again and its hash recorded
+        hashes = copy_tree(self.local_folder, self.remote_folder, manifest=manifest)
+        self.assertEqual(dst.read_bytes(), self.files["probe00/ephys.ap.bin"])
+        self.assertEqual(hashes["probe00/ephys.ap.bin"], file_hash)
+        self.assertEqual(manifest.get(dst, src.stat())["blake2b"], file_hash)
+        # a verified file is skipped, and a modified source is copied again
+        with mock.patch("iblrig.transfer_experiments.hashfile.blake2b") as blake2b:
+            self.assertEqual(copy_tree(self.local_folder, self.remote_folder, manifest=manifest), hashes)
+        blake2b.assert_not_called()
+        src.write_bytes(b"new data")
+        copy_tree(self.local_folder, self.remote_folder, manifest=TransferManifest(manifest.file, root=self.remote_folder))
+        self.assertEqual(dst.read_bytes(), b"new data")
+
+    def test_verification_failure(self):
+        with mock.patch("iblrig.transfer_experiments.hashfile.blake2b", return_value="0"):
+            self.assertFalse(copy_folders(self.local_folder, self.remote_folder))
+
+
+class TestProbeStates(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.remote_subjects_folder = Path(self.td.name).joinpath("remote", "Subjects")
+        self.remote_subjects_folder.mkdir(parents=True)
+        # one session per state: not registered, pending, complete and final, all on the same day
+        self.copiers = []
+        for number, status in enumerate([None, "pending", "complete", "final"]):
+            session_path = Path(self.td.name).joinpath("local", "Subjects", "subject", "2023-01-01", f"00{number}")
+            session_path.mkdir(parents=True)
+            copier = BehaviorCopier(session_path, remote_subjects_folder=self.remote_subjects_folder)
+            if status is not None:
+                stub = copier.file_remote_experiment_description
+                stub.parent.mkdir(parents=True)
+                stub.touch()
+                stub.with_suffix(f".status_{status}").touch()
+            self.copiers.append(copier)
+
+    def test_probe_states(self):
+        with mock.patch("iblrig.transfer_experiments.os.listdir", wraps=os.listdir) as listdir:
+            probe_states(self.copiers)
+        # subjects, subject, date and the 3 _devices folders
+        self.assertEqual(listdir.call_count, 6)
+        self.assertEqual([c.state for c in self.copiers], [0, 1, 2, 3])
+        self.assertEqual([c.get_state(refresh=True) for c in self.copiers], [c.get_state() for c in self.copiers])
+
+    def test_state_cache(self):
+        copier = self.copiers[1]
+        self.assertEqual(copier.state, 1)
+        status_file = copier.glob_file_remote_copy_status("pending")
+        status_file.rename(status_file.with_suffix(".status_complete"))
+        self.assertEqual(copier.state, 1)  # cached
+        copier.invalidate_state()
+        self.assertEqual(copier.state, 2)
@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from iblrig.trial_store import TrialStore, load_trial_store, split_trials
+from iblrig.trial_writer import TrialWriter
+
+
+def _trial(i):
+    return {
+        "trial_start_time": float(i),
+        "states_info": [{"name": f"state_{j}", "start_time": j, "end_time": j + 1} for j in range(i)],
+        "events_info": [],
+        "rotary_encoder_position": [0.5 * j for j in range(3 * i)],
+        "texture": "pebble.jpg",
+        "texture_rewarded": bool(i % 2),
+    }
+
+
+class TestTrialStore(unittest.TestCase):
+    def test_round_trip(self):
+        store = TrialStore()
+        for i in range(5):
+            store.append(_trial(i))
+        with tempfile.TemporaryDirectory() as td:
+            data = load_trial_store(store.save(Path(td).joinpath("_iblrig_trials.raw.npz")))
+        self.assertEqual(data["texture_rewarded"].tolist(), [False, True, False, True, False])
+        np.testing.assert_array_equal(data["rotary_encoder_position.offsets"], [0, 0, 3, 9, 18, 30])
+        positions = split_trials(data, "rotary_encoder_position")
+        np.testing.assert_array_equal(positions[2], [0, 0.5, 1, 1.5, 2, 2.5])
+        names = split_trials(data, "states_info.name")
+        self.assertEqual(names[3].tolist(), ["state_0", "state_1", "state_2"])
+        self.assertTrue(all(e.size == 0 for e in split_trials(data, "events_info.name")))
+
+    def test_inconsistent_fields(self):
+        store = TrialStore()
+        store.append(_trial(1))
+        missing_key = _trial(2)
+        del missing_key["states_info"][1]["end_time"]
+        scalar_to_list = dict(_trial(2), texture_rewarded=[True])
+        list_to_scalar = dict(_trial(2), rotary_encoder_position=0.5)
+        missing_field = _trial(2)
+        missing_field.pop("texture")
+        for record in (missing_key, scalar_to_list, list_to_scalar, missing_field, dict(_trial(2), extra=1)):
+            with self.assertRaises(ValueError):
+                store.append(record)
+        # the rejected records left the store untouched
+        self.assertEqual(1, len(store))
+        self.assertEqual(1, store.to_arrays()["states_info.end_time"].size)
+        # the first trial has no events, their keys are set by the first non-empty list
+        store.append(dict(_trial(2), events_info=[{"name": "Port1In", "start_time": 0.1}]))
+        with self.assertRaises(ValueError):
+            store.append(dict(_trial(3), events_info=[{"name": "Port1In"}]))
+        self.assertEqual(2, len(store))
+
+    def test_missing_values(self):
+        store = TrialStore()
+        for texture, reward in (("pebble.jpg", 1.5), (None, None)):
+            store.append({"texture": texture, "reward_amount": reward})
+        arrays = store.to_arrays()
+        self.assertEqual(["pebble.jpg", ""], arrays["texture"].tolist())
+        np.testing.assert_array_equal([1.5, np.nan], arrays["reward_amount"])
+
+    def test_writer_store(self):
+        with tempfile.TemporaryDirectory() as td:
+            local_file = Path(td).joinpath("_iblrig_trials.raw.jsonable")
+            store_file = Path(td).joinpath("_iblrig_trials.raw.npz")
+            with TrialWriter(local_file, store_file=store_file) as writer:
+                for i in range(4):
+                    writer.put(_trial(i))
+            data = load_trial_store(store_file)
+            expected = TrialStore.from_jsonable(local_file).to_arrays()
+        self.assertEqual(set(data.keys()), set(expected.keys()))
+        for k in expected:
+            np.testing.assert_array_equal(data[k], expected[k])
@@ -0,0 +1,96 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from iblrig.trial_writer import RemoteMirror, TrialWriter
+
+
+class TestTrialWriter(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.local_file = Path(self.td.name).joinpath("local", "_iblrig_trials.raw.jsonable")
+        self.remote_folder = Path(self.td.name).joinpath("remote")
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_write_and_mirror(self):
+        records = [{"trial": i, "rotary_encoder_position": list(range(i))} for i in range(100)]
+        with TrialWriter(self.local_file, remote_folder=self.remote_folder, maxsize=4) as writer:
+            for r in records:
+                writer.put(r)
+        with open(self.local_file) as fid:
+            self.assertEqual(records, [json.loads(line) for line in fid])
+        remote_file = self.remote_folder.joinpath(self.local_file.name)
+        self.assertEqual(self.local_file.read_bytes(), remote_file.read_bytes())
+
+    def test_write_retry(self):
+        append = TrialWriter._append
+        n_calls = []
+
+        def flaky_append(writer, lines):
+            # the first attempts leave a partial record behind and fail
+            n_calls.append(len(lines))
+            if len(n_calls) < 3:
+                with open(writer.local_file, "a") as fid:
+                    fid.write(lines[0][:5])
+                raise OSError("disk unavailable")
+            append(writer, lines)
+
+        records = [{"trial": i} for i in range(5)]
+        with mock.patch.object(TrialWriter, "_append", flaky_append):
+            writer = TrialWriter(self.local_file, min_backoff=0.01)
+            for r in records:
+                writer.put(r)
+            self.assertTrue(writer.close())
+        self.assertGreaterEqual(len(n_calls), 3)
+        with open(self.local_file) as fid:
+            self.assertEqual(records, [json.loads(line) for line in fid])
+
+    def test_write_failure(self):
+        writer = TrialWriter(self.local_file, maxsize=1, min_backoff=0.01, close_retries=2)
+        # the records are kept while the disk fails, the trial loop is never blocked nor interrupted
+        with mock.patch.object(TrialWriter, "_append", side_effect=OSError("disk unavailable")) as append:
+            t0 = time.monotonic()
+            for i in range(5):
+                writer.put({"trial": i})
+            self.assertLess(time.monotonic() - t0, 1)
+            self.assertFalse(writer.close())
+        self.assertEqual([{"trial": i} for i in range(5)], writer.unwritten)
+        self.assertGreaterEqual(append.call_count, 3)
+
+    def test_not_serializable(self):
+        with TrialWriter(self.local_file) as writer:
+            writer.put({"trial": 0, "data": object()})
+            writer.put({"trial": 1})
+        with open(self.local_file) as fid:
+            records = [json.loads(line) for line in fid]
+        self.assertEqual([0, 1], [r["trial"] for r in records])
+        self.assertIsInstance(records[0]["data"], str)
+
+    def test_store_failure(self):
+        store_file = self.local_file.with_suffix(".npz")
+        writer = TrialWriter(self.local_file, store_file=store_file)
+        writer.put({"trial": 0})
+        writer.put({"trial": 1})
+        with mock.patch("iblrig.trial_writer.TrialStore.append", side_effect=ValueError("inconsistent fields")):
+            self.assertTrue(writer.close())
+        # the store is given up, the trials file is complete
+        self.assertFalse(store_file.exists())
+        with open(self.local_file) as fid:
+            self.assertEqual([{"trial": 0}, {"trial": 1}], [json.loads(line) for line in fid])
+
+    def test_mirror_resumes(self):
+        self.local_file.parent.mkdir(parents=True)
+        self.local_file.write_text('{"a": 1}\n{"a": 2}\n')
+        remote_file = self.remote_folder.joinpath(self.local_file.name)
+        self.remote_folder.mkdir()
+        # interrupted copy: only part of the file made it to the remote
+        remote_file.write_text('{"a": 1}\n{"a"')
+        mirror = RemoteMirror(self.local_file, remote_file)
+        self.assertEqual(mirror.sync(), 5)
+        self.assertEqual(self.local_file.read_bytes(), remote_file.read_bytes())
+        self.assertEqual(mirror.sync(), 0)
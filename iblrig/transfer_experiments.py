@@ -1,10 +1,17 @@
 import abc
 import ctypes
+import fnmatch
+import hashlib
+import json
 import os
+import queue
 import shutil
+import threading
+import time
 import traceback
-from collections.abc import Callable
-from os.path import samestat
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Any
 
@@ -73,56 +80,348 @@ def long_running(func: Callable[..., Any]) -> Callable[..., Any]:
     return inner
 
 
-@long_running
-def _copy2_checksum(src: str, dst: str, *args, **kwargs) -> str:
+COPY_CHUNK_SIZE = 8 * 1024**2
+COPY_MAX_WORKERS = 4
+VERIFY_STRATEGIES = ("hash", "size", "none")
+
+
+class BandwidthLimiter:
     """
-    Copy a file from source to destination with checksum verification.
+    Limits the rate of the copies sharing it, and counts the bytes copied.
 
-    This function copies a file from the source path to the destination path
-    while verifying the BLAKE2B hash of the source and destination files. If the
-    BLAKE2B hashes do not match after copying, an OSError is raised.
+    Each chunk consumes tokens from a bucket refilled at `rate` bytes per second, the copy sleeps when the
+    bucket is in debt. Without a rate only the bytes are counted.
 
     Parameters
     ----------
-    src : str
+    rate : float, optional
+        Maximum rate in bytes per second, None for no limit.
+    """
+
+    def __init__(self, rate: float | None = None):
+        self.rate = rate
+        self.bytes = 0
+        self._tokens = rate or 0
+        self._t_last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int) -> None:
+        """Accounts for nbytes copied, blocks as long as needed to respect the rate"""
+        with self._lock:
+            self.bytes += nbytes
+            if not self.rate:
+                return
+            now = time.monotonic()
+            # the bucket holds at most one second worth of data
+            self._tokens = min(self.rate, self._tokens + (now - self._t_last) * self.rate) - nbytes
+            self._t_last = now
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TransferManifest:
+    """
+    Record of the files copied to a remote session, used to resume interrupted transfers.
+
+    For each file the manifest records the size and modification time of the source, the number of bytes
+    already written to the destination and, once the copy is complete and verified by hash, the BLAKE2B hash
+    of the file. It is
+    saved as json next to the remote experiment description stub, regularly during the copy.
+
+    Parameters
+    ----------
+    file : Path
+        Path of the json manifest file.
+    root : Path
+        Remote folder the file keys are relative to, ie. the remote session path.
+    save_interval : float
+        Minimum time in seconds between two saves of the manifest while files are being copied.
+    """
+
+    def __init__(self, file: Path, root: Path, save_interval: float = 5.0):
+        self.file = Path(file)
+        self.root = Path(root)
+        self.save_interval = save_interval
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        if self.file.exists():
+            try:
+                with open(self.file) as fid:
+                    self.entries = json.load(fid)["files"]
+            except (ValueError, KeyError) as e:
+                log.warning(f"Discarding invalid transfer manifest {self.file}: {e}")
+
+    def key(self, dst: Path) -> str:
+        return Path(dst).relative_to(self.root).as_posix()
+
+    def get(self, dst: Path, src_stat: os.stat_result) -> dict | None:
+        """Returns the entry of a destination file if it was recorded for the current version of the source"""
+        entry = self.entries.get(self.key(dst))
+        if entry and entry["size"] == src_stat.st_size and entry["mtime_ns"] == src_stat.st_mtime_ns:
+            return entry
+        return None
+
+    def update(self, dst: Path, src_stat: os.stat_result, transferred: int, blake2b: str | None = None, force=False):
+        with self._lock:
+            self.entries[self.key(dst)] = {
+                "size": src_stat.st_size,
+                "mtime_ns": src_stat.st_mtime_ns,
+                "transferred": transferred,
+                "blake2b": blake2b,
+            }
+            if force or time.monotonic() - self._last_save > self.save_interval:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        file_tmp = self.file.with_name(f"{self.file.name}.part")
+        with open(file_tmp, "w") as fid:
+            json.dump({"files": self.entries}, fid, indent=1)
+        file_tmp.replace(self.file)
+        self._last_save = time.monotonic()
+
+
+def _copy_file_checksum(
+    src: str | Path,
+    dst: str | Path,
+    verify: str = "hash",
+    chunk_size: int = COPY_CHUNK_SIZE,
+    manifest: TransferManifest | None = None,
+    throttle: BandwidthLimiter | None = None,
+    slots: threading.Semaphore | None = None,
+) -> str:
+    """
+    Copy a file from source to destination, hashing the source while it is copied.
+
+    The source is read once, in chunks, by a reader thread that computes its BLAKE2B hash while the
+    chunks are written to the destination. The copy is then verified according to `verify`.
+
+    With a transfer manifest, a file already copied is skipped, and a partially copied file is resumed
+    from the last recorded chunk: only the beginning of the local file is read again to compute the hash.
+    The manifest records the hash of a file only once it has been verified by hash; a copy verified by
+    size, or not at all, is verified again at the requested level before it is skipped.
+
+    Parameters
+    ----------
+    src : str, Path
         The path to the source file.
-    dst : str
+    dst : str, Path
         The path to the destination file.
-    *args, **kwargs
-        Additional arguments and keyword arguments to pass to `shutil.copy2`.
+    verify : str
+        'hash': the destination is read back and its BLAKE2B hash is compared to the source's,
+        'size': only the size of the destination is checked, 'none': no verification.
+    chunk_size : int
+        Size in bytes of the chunks read and written.
+    manifest : TransferManifest, optional
+        Manifest recording the progress of the copy.
+    throttle : BandwidthLimiter, optional
+        Limits the rate of the copy and counts the bytes written.
+    slots : threading.Semaphore, optional
+        Shared by the concurrent copies to bound the number of files, and of chunks in memory, copied at once.
 
     Returns
     -------
     str
-        The path to the copied file.
+        The BLAKE2B hash of the source file.
 
     Raises
     ------
     OSError
-        If the BLAKE2B hashes of the source and destination files do not match.
+        If the verification of the destination file fails.
     """
-    log.info(f"Processing `{src}`:")
-    log.info("  - calculating hash of local file")
-    src_md5 = hashfile.blake2b(src, False)
-    if os.path.exists(dst) and samestat(os.stat(src), os.stat(dst)):
-        log.info("  - file already exists at destination")
-        log.info("  - calculating hash of remote file")
-        if src_md5 == hashfile.blake2b(dst, False):
-            log.info("  - local and remote BLAKE2B hashes match, skipping copy")
-            return dst
-        else:
-            log.info("  - local and remote hashes DO NOT match")
-    log.info(f"  - copying file to `{dst}`")
-    return_val = shutil.copy2(src, dst, *args, **kwargs)
-    log.info("  - calculating hash of remote file")
-    if not src_md5 == hashfile.blake2b(dst, False):
-        raise OSError(f"Error copying {src}: hash mismatch.")
-    log.info("  - local and remote hashes match, copy successful")
-    return return_val
+    if verify not in VERIFY_STRATEGIES:
+        raise ValueError(f"verify should be one of {VERIFY_STRATEGIES}, got {verify}")
+    src_stat = os.stat(src)
+    dst_size = os.stat(dst).st_size if os.path.exists(dst) else None
+    entry = manifest.get(dst, src_stat) if manifest is not None else None
+    offset = 0
+    if entry is not None and dst_size is not None:
+        if entry["transferred"] == dst_size == src_stat.st_size:
+            if entry["blake2b"]:
+                log.info(f"`{dst}` already copied and verified, skipping")
+                return entry["blake2b"]
+            # the copy was not verified by hash: check it now, at the requested level
+            src_hash = hashfile.blake2b(src, False)
+            if verify != "hash":
+                log.info(f"`{dst}` already copied, skipping")
+                return src_hash
+            if src_hash == hashfile.blake2b(dst, False):
+                log.info(f"`{dst}` already copied, skipping")
+                manifest.update(dst, src_stat, src_stat.st_size, blake2b=src_hash, force=True)
+                return src_hash
+            log.warning(f"`{dst}` hash mismatch, copying again")
+        elif dst_size >= entry["transferred"]:
+            offset = entry["transferred"]
+    log.info(f"Copying `{src}` to `{dst}`" + (f", resuming at byte {offset}" if offset else ""))
+    src_hash = hashlib.blake2b()
+    chunks = queue.Queue(maxsize=4)
+    stop = threading.Event()
+
+    def read_chunks():
+        try:
+            with open(src, "rb") as fsrc:
+                # the part of the file already copied is only hashed
+                while fsrc.tell() < offset and (chunk := fsrc.read(min(chunk_size, offset - fsrc.tell()))):
+                    src_hash.update(chunk)
+                while not stop.is_set() and (chunk := fsrc.read(chunk_size)):
+                    # hashing releases the GIL, it overlaps with the writes of the previous chunks
+                    src_hash.update(chunk)
+                    chunks.put(chunk)
+            chunks.put(None)
+        except BaseException as e:
+            chunks.put(e)
+
+    # the chunks are only in memory while the file holds a copy slot
+    with slots if slots is not None else nullcontext():
+        reader = threading.Thread(target=read_chunks, daemon=True)
+        reader.start()
+        try:
+            with open(dst, "r+b" if offset else "wb") as fdst:
+                fdst.truncate(offset)
+                fdst.seek(offset)
+                transferred = offset
+                while (chunk := chunks.get()) is not None:
+                    if isinstance(chunk, BaseException):
+                        raise chunk
+                    if throttle is not None:
+                        throttle.consume(len(chunk))
+                    fdst.write(chunk)
+                    transferred += len(chunk)
+                    if manifest is not None:
+                        fdst.flush()
+                        manifest.update(dst, src_stat, transferred)
+        finally:
+            # unblock the reader if the write failed
+            stop.set()
+            while reader.is_alive():
+                try:
+                    chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+    shutil.copystat(src, dst)
+    src_hash = src_hash.hexdigest()
+    try:
+        match verify:
+            case "hash":
+                if src_hash != hashfile.blake2b(dst, False):
+                    raise OSError(f"Error copying {src}: hash mismatch.")
+            case "size":
+                if src_stat.st_size != os.stat(dst).st_size:
+                    raise OSError(f"Error copying {src}: size mismatch.")
+    except OSError:
+        if manifest is not None:
+            # the next transfer starts this file from scratch
+            manifest.update(dst, src_stat, 0, force=True)
+        raise
+    if manifest is not None:
+        # only a hash verified copy is recorded with its hash, the others are checked again when skipped
+        manifest.update(dst, src_stat, src_stat.st_size, blake2b=src_hash if verify == "hash" else None, force=True)
+    log.debug(f"Copied `{src}`, BLAKE2B {src_hash}")
+    return src_hash
+
+
+@long_running
+def copy_tree(
+    local_folder: Path,
+    remote_folder: Path,
+    overwrite: bool = False,
+    ignore: tuple[str, ...] = ("transfer_me.flag",),
+    verify: str = "hash",
+    max_workers: int = COPY_MAX_WORKERS,
+    manifest: TransferManifest | None = None,
+    throttle: BandwidthLimiter | None = None,
+    slots: threading.Semaphore | None = None,
+) -> dict[str, str]:
+    """
+    Copy a folder recursively, several files at a time.
+
+    Parameters
+    ----------
+    local_folder : Path
+        The path to the local folder to copy from.
+    remote_folder : Path
+        The path to the remote folder to copy to.
+    overwrite : bool, optional
+        If False and the remote folder exists, a FileExistsError is raised. Default is False.
+    ignore : tuple of str
+        Glob patterns of file names that are not copied.
+    verify : str
+        Verification of the copied files, see `_copy_file_checksum`.
+    max_workers : int
+        Maximum number of files copied concurrently.
+    manifest : TransferManifest, optional
+        If provided, the files already copied are skipped and the partial copies are resumed.
+    throttle : BandwidthLimiter, optional
+        Bandwidth limit shared by the copies.
+    slots : threading.Semaphore, optional
+        Bounds the number of files copied at once, shared with the copies of the other sessions.
+
+    Returns
+    -------
+    dict
+        BLAKE2B hash of each copied file, keyed by its path relative to the local folder.
+
+    Raises
+    ------
+    OSError
+        If any of the files could not be copied.
+    """
+    local_folder, remote_folder = Path(local_folder), Path(remote_folder)
+    if remote_folder.exists() and not overwrite and manifest is None:
+        raise FileExistsError(f"{remote_folder} already exists")
+    files = []
+    for root, _, file_names in os.walk(local_folder):
+        relative_root = Path(root).relative_to(local_folder)
+        remote_folder.joinpath(relative_root).mkdir(parents=True, exist_ok=True)
+        for file_name in file_names:
+            if not any(fnmatch.fnmatch(file_name, pattern) for pattern in ignore):
+                files.append(relative_root.joinpath(file_name))
+    # the largest files start first so that they do not end up copied alone at the end
+    files.sort(key=lambda f: local_folder.joinpath(f).stat().st_size, reverse=True)
+    hashes, errors = {}, []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    _copy_file_checksum,
+                    local_folder.joinpath(f),
+                    remote_folder.joinpath(f),
+                    verify=verify,
+                    manifest=manifest,
+                    throttle=throttle,
+                    slots=slots,
+                ): f
+                for f in files
+            }
+            for future in as_completed(futures):
+                try:
+                    hashes[futures[future].as_posix()] = future.result()
+                except OSError as e:
+                    log.error(f"Could not copy {local_folder.joinpath(futures[future])}: {e}")
+                    errors.append(e)
+    finally:
+        if manifest is not None:
+            manifest.save()
+    if errors:
+        raise OSError(f"{len(errors)} file(s) could not be copied from {local_folder} to {remote_folder}") from errors[0]
+    return hashes
 
 
 def copy_folders(
-    local_folder: Path, remote_folder: Path, overwrite: bool = False
+    local_folder: Path,
+    remote_folder: Path,
+    overwrite: bool = False,
+    verify: str = "hash",
+    max_workers: int = COPY_MAX_WORKERS,
+    manifest: TransferManifest | None = None,
+    throttle: BandwidthLimiter | None = None,
+    slots: threading.Semaphore | None = None,
 ) -> bool:
     """
     Copy folders and files from a local location to a remote location.
@@ -139,6 +438,16 @@ def copy_folders(
         The path to the remote folder to copy to.
     overwrite : bool, optional
         If True, overwrite existing files in the remote folder. Default is False.
+    verify : str, optional
+        Verification of the copied files: 'hash' (default), 'size' or 'none'.
+    max_workers : int, optional
+        Maximum number of files copied concurrently.
+    manifest : TransferManifest, optional
+        Transfer manifest used to skip the files already copied and resume the partial copies.
+    throttle : BandwidthLimiter, optional
+        Bandwidth limit shared by the copies.
+    slots : threading.Semaphore, optional
+        Bounds the number of files copied at once, shared with the copies of the other sessions.
 
     Returns
     -------
@@ -148,12 +457,15 @@ def copy_folders(
     status = True
     try:
         remote_folder.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copytree(
+        copy_tree(
             local_folder,
             remote_folder,
-            dirs_exist_ok=overwrite,
-            ignore=shutil.ignore_patterns("transfer_me.flag"),
-            copy_function=_copy2_checksum,
+            overwrite=overwrite,
+            verify=verify,
+            max_workers=max_workers,
+            manifest=manifest,
+            throttle=throttle,
+            slots=slots,
         )
     except OSError:
         log.error(traceback.format_exc())
@@ -165,13 +477,31 @@ def copy_folders(
 class SessionCopier(abc.ABC):
     assert_connect_on_init = False
     _experiment_description = None
+    verify = "hash"
+    max_workers = COPY_MAX_WORKERS
+    resume = False  # if True, interrupted copies are resumed using a transfer manifest
+    throttle = None  # BandwidthLimiter shared with the other copies, set by the TransferScheduler
+    copy_slots = None  # Semaphore bounding the files copied at once by all the sessions, set by the TransferScheduler
 
-    def __init__(self, session_path, remote_subjects_folder=None, tag=None):
+    def __init__(self, session_path, remote_subjects_folder=None, tag=None, verify=None, max_workers=None, resume=None):
+        """
+        :param session_path: local session path
+        :param remote_subjects_folder: remote Subjects folder
+        :param tag: device tag, defaults to the class tag
+        :param verify: verification of the copied files: 'hash', 'size' or 'none', see `copy_folders`
+        :param max_workers: maximum number of files copied concurrently
+        :param resume: if True, the collections are not copied from scratch: a transfer manifest next to the
+         remote stub records the copied files, and an interrupted copy resumes where it stopped
+        """
         self.tag = tag or self.tag
+        self.verify = verify or self.verify
+        self.max_workers = max_workers or self.max_workers
+        self.resume = self.resume if resume is None else resume
         self.session_path = Path(session_path)
         self.remote_subjects_folder = (
             Path(remote_subjects_folder) if remote_subjects_folder else None
         )
+        self._state = None
 
     def __repr__(self):
         return f"{super().__repr__()} \n local: {self.session_path} \n remote: {self.remote_session_path}"
@@ -180,6 +510,10 @@ class SessionCopier(abc.ABC):
     def state(self):
         return self.get_state()[0]
 
+    def invalidate_state(self):
+        """Forgets the cached copy state, to be called after each state transition"""
+        self._state = None
+
     def run(self, number_of_expected_devices=None):
         """
         Runs the copy of this device experiment. It will try to get as far as possible in the copy
@@ -192,6 +526,7 @@ class SessionCopier(abc.ABC):
         ):  # this case is not implemented automatically and corresponds to a hard reset
             log.info(f"{self.state}, {self.session_path}")
             shutil.rmtree(self.remote_session_path)
+            self.invalidate_state()
             self.initialize_experiment()
         if (
             self.state == 0
@@ -207,15 +542,22 @@ class SessionCopier(abc.ABC):
         if self.state == 3:
             log.info(f"{self.state}, {self.session_path}")
 
-    def get_state(self):
+    def get_state(self, refresh=False):
         """
-        Gets the current copier state.
+        Gets the current copier state. The state is probed on the remote server on the first call, then cached
+        until a state transition of this copier, see `invalidate_state`, or until `refresh` is True.
         State 0: this device experiment has not been initialized for this device
         State 1: this device experiment is initialized (the experiment description stub is present on the remote)
         State 2: this device experiment is copied on the remote server, but other devices copies are still pending
         State 3: the whole experiment is finalized and all of the data is on the server
-        :return:
+        :param refresh: if True, probes the remote server even if the state is cached
+        :return: tuple (state, message)
         """
+        if refresh or self._state is None:
+            self._state = self._get_state()
+        return self._state
+
+    def _get_state(self):
         if (
             self.remote_subjects_folder is None
             or not self.remote_subjects_folder.exists()
@@ -236,11 +578,14 @@ class SessionCopier(abc.ABC):
             )
             status_file.touch()
             log.warning(f"{status_file} not found and created")
-        if status_file.name.endswith("pending"):
+        return self._state_from_status(status_file.name)
+
+    def _state_from_status(self, status_file_name):
+        if status_file_name.endswith("pending"):
             return 1, f"Copy pending {self.file_remote_experiment_description}"
-        elif status_file.name.endswith("complete"):
+        elif status_file_name.endswith("complete"):
             return 2, f"Copy complete {self.file_remote_experiment_description}"
-        elif status_file.name.endswith("final"):
+        elif status_file_name.endswith("final"):
             return 3, f"Copy finalized {self.file_remote_experiment_description}"
 
     @property
@@ -276,6 +621,16 @@ class SessionCopier(abc.ABC):
                 self.remote_session_path, device_id=self.tag
             )
 
+    @property
+    def file_remote_manifest(self):
+        if self.remote_subjects_folder:
+            return self.file_remote_experiment_description.with_suffix(".manifest.json")
+
+    def get_manifest(self):
+        """:return: the transfer manifest of the session if the copier resumes transfers, None otherwise"""
+        if self.resume and self.remote_subjects_folder:
+            return TransferManifest(self.file_remote_manifest, root=self.remote_session_path)
+
     @property
     def remote_experiment_description_stub(self):
         return session_params.read_params(self.file_remote_experiment_description)
@@ -288,6 +643,7 @@ class SessionCopier(abc.ABC):
         status = True
         exp_pars = session_params.read_params(self.session_path)
         collections = set(session_params.get_collections(exp_pars).values())
+        manifest = self.get_manifest()
         for collection in collections:
             local_collection = self.session_path.joinpath(collection)
             if not local_collection.exists():
@@ -296,12 +652,20 @@ class SessionCopier(abc.ABC):
                 continue
             log.info(f"transferring {self.session_path} - {collection}")
             remote_collection = self.remote_session_path.joinpath(collection)
-            if remote_collection.exists():
+            if remote_collection.exists() and manifest is None:
                 # this is far from ideal, but here rsync-diff backup is not the right tool for syncing
                 # and will error out if the remote collection already exists
                 log.warning(f"Collection {remote_collection} already exists, removing")
                 shutil.rmtree(remote_collection)
-            status &= copy_folders(local_collection, remote_collection)
+            status &= copy_folders(
+                local_collection,
+                remote_collection,
+                verify=self.verify,
+                max_workers=self.max_workers,
+                manifest=manifest,
+                throttle=self.throttle,
+                slots=self.copy_slots,
+            )
         return status
 
     def copy_collections(self):
@@ -321,6 +685,7 @@ class SessionCopier(abc.ABC):
         if status:
             pending_file = self.glob_file_remote_copy_status("pending")
             pending_file.rename(pending_file.with_suffix(".status_complete"))
+            self.invalidate_state()
             if self.session_path.joinpath("transfer_me.flag").exists():
                 self.session_path.joinpath("transfer_me.flag").unlink()
         return status
@@ -363,6 +728,7 @@ class SessionCopier(abc.ABC):
                 ):
                     f.unlink()
                 remote_stub_file.with_suffix(".status_pending").touch()
+                self.invalidate_state()
                 log.info(f"Written data to remote device at: {remote_stub_file}.")
             except Exception as e:
                 if self.assert_connect_on_init:
@@ -427,11 +793,65 @@ class SessionCopier(abc.ABC):
                     file_stub.with_suffix(".status_final")
                 )
             self.remote_session_path.joinpath("raw_session.flag").touch()
+            self.invalidate_state()
+
+
+def probe_states(copiers: Iterable[SessionCopier]) -> None:
+    """
+    Resolves the copy states of many sessions at once, and caches them in the copiers.
+
+    Rather than checking each file of each session on the server, the remote folders are listed, and each
+    listing is shared by all the sessions below it: the subjects folder, the subject and date folders and
+    the _devices folder of the sessions that exist on the server are each listed once.
+
+    :param copiers: session copiers, the states are then available with `copier.state`
+    """
+    listings = {}
+
+    def listdir(folder: Path) -> set[str] | None:
+        if folder not in listings:
+            try:
+                listings[folder] = set(os.listdir(folder))
+            except OSError:
+                listings[folder] = None
+        return listings[folder]
+
+    for copier in copiers:
+        if copier.remote_subjects_folder is None or listdir(copier.remote_subjects_folder) is None:
+            copier._state = (
+                None,
+                f"Remote subjects folder {copier.remote_subjects_folder} set to Null or unreachable",
+            )
+            continue
+        stub = copier.file_remote_experiment_description
+        folder = copier.remote_subjects_folder
+        # walk down subject / date / number using the shared listings, then list the _devices folder
+        for part in copier.remote_session_path.relative_to(folder).parts:
+            names = listdir(folder)
+            if names is None or part not in names:
+                names = None
+                break
+            folder = folder.joinpath(part)
+        else:
+            names = listdir(stub.parent)
+        if names is None or stub.name not in names:
+            copier._state = (
+                0,
+                f"Copy object not registered on server: {stub} does not exist",
+            )
+            continue
+        status_files = sorted(n for n in names if n.startswith(f"{stub.stem}.status_"))
+        if status_files:
+            copier._state = copier._state_from_status(status_files[0])
+        else:
+            # the missing status file is created by the regular probe
+            copier.get_state(refresh=True)
 
 
 class VideoCopier(SessionCopier):
     tag = "video"
     assert_connect_on_init = True
+    resume = True
 
     def create_video_stub(self, nvideos=None):
         match len(list(self.session_path.joinpath("raw_video_data").glob("*.avi"))):
@@ -472,6 +892,7 @@ class BehaviorCopier(SessionCopier):
 class EphysCopier(SessionCopier):
     tag = "spikeglx"
     assert_connect_on_init = True
+    resume = True
 
     def initialize_experiment(
         self, acquisition_description=None, nprobes=None, **kwargs
@@ -539,4 +960,9 @@ class EphysCopier(SessionCopier):
             local_folder=self.session_path.joinpath("raw_ephys_data"),
             remote_folder=self.remote_session_path.joinpath("raw_ephys_data"),
             overwrite=True,
+            verify=self.verify,
+            max_workers=self.max_workers,
+            manifest=self.get_manifest(),
+            throttle=self.throttle,
+            slots=self.copy_slots,
         )
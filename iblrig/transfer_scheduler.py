@@ -0,0 +1,161 @@
+"""
+Concurrent transfer of several sessions to the server.
+
+The sessions are started smallest first, so that the behaviour sessions are not stuck behind the
+video and ephys sessions, optionally with a maximum number of sessions copied at once to the same server share.
+All the copies share a bandwidth limiter, which also measures the aggregate throughput, and a number of file
+slots that bounds the files, and so the chunks in memory, copied at once across all the sessions.
+
+>>> scheduler = TransferScheduler(max_sessions=4, max_per_destination=2, bandwidth=50e6)
+>>> for copier in copiers:
+>>>     scheduler.add(copier)
+>>> results = scheduler.run()
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path, PureWindowsPath
+
+from iblrig.transfer_experiments import COPY_MAX_WORKERS, BandwidthLimiter, SessionCopier
+from iblutil.util import setup_logger
+
+log = setup_logger("iblrig", level="INFO")
+
+
+def folder_size(folder: Path) -> int:
+    """total size in bytes of the files of a folder, walked with os.scandir"""
+    size = 0
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    size += folder_size(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+    except FileNotFoundError:
+        pass
+    return size
+
+
+def server_share(path: str | Path) -> str:
+    """
+    The server share a path is on: the UNC share or the drive on Windows, the mount point otherwise
+    """
+    if drive := PureWindowsPath(path).drive:
+        return drive.lower()
+    path = Path(path).absolute()
+    while not os.path.ismount(path) and path != path.parent:
+        path = path.parent
+    return str(path)
+
+
+@dataclass
+class TransferJob:
+    copier: SessionCopier
+    run_kwargs: dict = field(default_factory=dict)
+    size: int = 0
+    status: bool | None = None
+    duration: float = 0.0
+    error: str | None = None
+
+    @property
+    def destination(self) -> str:
+        """the server share the session is copied to, see `server_share`"""
+        return server_share(self.copier.remote_subjects_folder)
+
+
+class TransferScheduler:
+    """
+    Runs the copiers of several sessions concurrently
+    :param max_sessions: maximum number of sessions copied at the same time
+    :param max_per_destination: maximum number of sessions copied at the same time to the same server share,
+     None for no limit other than max_sessions
+    :param max_files: maximum number of files copied at the same time by all the sessions
+    :param bandwidth: maximum aggregate rate in bytes per second, None for no limit
+    :param report_interval: interval in seconds between two logs of the throughput
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 4,
+        max_per_destination: int | None = None,
+        max_files: int = COPY_MAX_WORKERS,
+        bandwidth: float | None = None,
+        report_interval: float = 30.0,
+    ):
+        self.max_sessions = max_sessions
+        self.max_per_destination = max_per_destination or max_sessions
+        self.report_interval = report_interval
+        self.limiter = BandwidthLimiter(rate=bandwidth)
+        self.copy_slots = threading.BoundedSemaphore(max_files)
+        self.jobs = []
+
+    def add(self, copier: SessionCopier, **run_kwargs) -> TransferJob:
+        """
+        Queues a session
+        :param copier: the session copier
+        :param run_kwargs: keyword arguments passed to `copier.run`
+        """
+        copier.throttle = self.limiter
+        copier.copy_slots = self.copy_slots
+        job = TransferJob(copier=copier, run_kwargs=run_kwargs, size=folder_size(copier.session_path))
+        self.jobs.append(job)
+        return job
+
+    def _run_job(self, job: TransferJob) -> TransferJob:
+        t0 = time.monotonic()
+        try:
+            job.copier.run(**job.run_kwargs)
+            job.status = job.copier.state in (2, 3)
+        except Exception:
+            job.status = False
+            job.error = traceback.format_exc()
+            log.error(f"Transfer of {job.copier.session_path} failed: {job.error}")
+        job.duration = time.monotonic() - t0
+        return job
+
+    def _report(self, t0: float, n_done: int) -> None:
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        log.info(
+            f"{n_done}/{len(self.jobs)} sessions transferred, "
+            f"{self.limiter.bytes / 1024 ** 3:.2f} GB in {elapsed:.0f} s, {self.limiter.bytes / elapsed / 1024 ** 2:.1f} MB/s"
+        )
+
+    def run(self) -> list[TransferJob]:
+        """
+        Transfers all the queued sessions
+        :return: the list of jobs, with their status, duration and error if any
+        """
+        pending = sorted(self.jobs, key=lambda j: j.size)
+        running = {}  # future: job
+        per_destination = {}
+        t0 = t_report = time.monotonic()
+        n_done = 0
+        with ThreadPoolExecutor(max_workers=self.max_sessions) as executor:
+            while pending or running:
+                # starts the smallest sessions whose server share has a free slot
+                for job in list(pending):
+                    if len(running) >= self.max_sessions:
+                        break
+                    if per_destination.get(job.destination, 0) >= self.max_per_destination:
+                        continue
+                    pending.remove(job)
+                    per_destination[job.destination] = per_destination.get(job.destination, 0) + 1
+                    log.info(f"Starting transfer of {job.copier.session_path} ({job.size / 1024 ** 2:.1f} MB)")
+                    running[executor.submit(self._run_job, job)] = job
+                done, _ = wait(running, timeout=self.report_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    per_destination[job.destination] -= 1
+                    n_done += 1
+                    outcome = "done" if job.status else "FAILED"
+                    log.info(f"Transfer of {job.copier.session_path} {outcome} in {job.duration:.0f} s")
+                if time.monotonic() - t_report >= self.report_interval:
+                    self._report(t0, n_done)
+                    t_report = time.monotonic()
+        self._report(t0, n_done)
+        return self.jobs
@@ -0,0 +1,163 @@
+"""
+Columnar copy of the trial data.
+
+The trials of a session are converted from the jsonable trials file into a single numpy .npz file, which
+loads as arrays without parsing json: scalar fields are stored as one array with one value per trial,
+list fields are concatenated across trials in a flat array, and a `<field>.offsets` array of size
+n_trials + 1 gives the boundaries of each trial. Lists of dictionaries, such as the states and events of
+`TrialInfo`, are stored as one flat array per key.
+The .npz file is derived from the jsonable file, which remains the record of the session.
+
+>>> store = TrialStore.from_jsonable(session_path.joinpath('_iblrig_trials.raw.jsonable'))
+>>> store.save(session_path.joinpath('_iblrig_trials.raw.npz'))
+>>> data = load_trial_store(session_path.joinpath('_iblrig_trials.raw.npz'))
+>>> data['texture_rewarded']  # one value per trial
+>>> split_trials(data, 'rotary_encoder_position')  # list of one array per trial
+"""
+
+import json
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from iblutil.util import Bunch
+
+OFFSETS = "offsets"
+# schema of a field holding a list of scalars, or only empty lists so far
+_LIST = "list"
+
+
+class TrialStore:
+    """Accumulates trial records and writes them as flat columns to a .npz file"""
+
+    def __init__(self):
+        self.n_trials = 0
+        self._values = defaultdict(list)
+        self._lengths = defaultdict(list)
+        # field: None for a scalar, _LIST for a list of scalars, or the keys of the dictionaries of a list
+        self._schema = None
+
+    def __len__(self) -> int:
+        return self.n_trials
+
+    def append(self, record: dict) -> None:
+        """
+        Adds one trial
+        :param record: dictionary of scalars, lists of scalars and lists of flat dictionaries,
+         for example `dataclasses.asdict(TrialInfo)`
+        :raises ValueError: if the fields of the record don't match the ones of the first trial
+        """
+        self._check(record)
+        for field, value in record.items():
+            if isinstance(value, (list, tuple)):
+                self._lengths[field].append(len(value))
+                for item in value:
+                    if isinstance(item, dict):
+                        for key, v in item.items():
+                            self._values[f"{field}.{key}"].append(v)
+                    else:
+                        self._values[field].append(item)
+            else:
+                self._values[field].append(value)
+        self.n_trials += 1
+
+    @staticmethod
+    def _schema_of(record: dict) -> dict:
+        schema = {}
+        for field, value in record.items():
+            if not isinstance(value, (list, tuple)):
+                schema[field] = None
+                continue
+            is_dict = [isinstance(item, dict) for item in value]
+            if not any(is_dict):
+                schema[field] = _LIST
+            elif all(is_dict) and len(keys := {frozenset(item) for item in value}) == 1:
+                schema[field] = keys.pop()
+            else:
+                raise ValueError(f"{field} must be a list of scalars or of dictionaries with the same keys")
+        return schema
+
+    def _check(self, record: dict) -> None:
+        """Validates the fields of a record against the previous trials, before anything is appended"""
+        schema = self._schema_of(record)
+        if self._schema is None:
+            self._schema = schema
+            return
+        if schema.keys() != self._schema.keys():
+            raise ValueError(
+                f"Trial {self.n_trials} fields differ from the previous trials: "
+                f"missing {sorted(self._schema.keys() - schema.keys())}, extra {sorted(schema.keys() - self._schema.keys())}"
+            )
+        updates = {}
+        for field, kind in schema.items():
+            expected = self._schema[field]
+            # an empty list matches any list field
+            if kind == expected or (expected is not None and kind == _LIST and len(record[field]) == 0):
+                continue
+            # the item type of a list field is only known from its first non-empty list
+            if expected == _LIST and kind is not None and field not in self._values:
+                updates[field] = kind
+                continue
+            raise ValueError(f"Trial {self.n_trials} field {field} doesn't match the previous trials")
+        self._schema.update(updates)
+
+    @classmethod
+    def from_jsonable(cls, jsonable_file: Path) -> "TrialStore":
+        """Builds the store from a file containing one json trial record per line"""
+        store = cls()
+        with open(jsonable_file) as fid:
+            for line in fid:
+                store.append(json.loads(line))
+        return store
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = {}
+        for k, v in self._values.items():
+            arrays[k] = np.asarray(v)
+            if arrays[k].dtype == object:
+                if any(isinstance(x, str) for x in v):
+                    # missing values in a text field become empty strings
+                    arrays[k] = np.asarray(["" if x is None else x for x in v], dtype=str)
+                else:
+                    # missing values, ie. None in a numeric field, become NaN
+                    arrays[k] = np.asarray(v, dtype=float)
+        for field, lengths in self._lengths.items():
+            arrays[f"{field}.{OFFSETS}"] = np.r_[0, np.cumsum(lengths, dtype=np.int64)]
+        return arrays
+
+    def save(self, file_npz: Path, compress: bool = True) -> Path:
+        """
+        :param file_npz: output file path
+        :param compress: if True the arrays are zip compressed, which is efficient on the encoder traces
+        :return: output file path
+        """
+        file_npz = Path(file_npz)
+        file_npz.parent.mkdir(parents=True, exist_ok=True)
+        # write next to the destination and rename, so that readers never see a partial file
+        file_tmp = file_npz.with_name(f"{file_npz.stem}.part.npz")
+        (np.savez_compressed if compress else np.savez)(file_tmp, **self.to_arrays())
+        file_tmp.replace(file_npz)
+        return file_npz
+
+
+def load_trial_store(file_npz: Path) -> Bunch:
+    """
+    Loads a trial store written by `TrialStore.save`
+    :param file_npz: path to the .npz file
+    :return: Bunch of numpy arrays
+    """
+    with np.load(file_npz, allow_pickle=False) as npz:
+        return Bunch({k: npz[k] for k in npz.files})
+
+
+def split_trials(data: dict, field: str) -> list[np.ndarray]:
+    """
+    Splits a flat column into one array per trial
+    :param data: arrays as returned by `load_trial_store`
+    :param field: name of the column, ie. 'rotary_encoder_position' or 'events_info.name'
+    :return: list of arrays, one per trial
+    """
+    offsets = data[f"{field.split('.')[0]}.{OFFSETS}"]
+    values = data.get(field, np.array([]))
+    return [values[i0:i1] for i0, i1 in zip(offsets[:-1], offsets[1:])]
@@ -0,0 +1,272 @@
+"""
+Background persistence of the trial data.
+
+The trial loop hands each trial record to a `TrialWriter`, which appends it as one line of json to a
+single local file from a background thread, and keeps the records it failed to write for the next
+attempt. A `RemoteMirror` thread then copies the new bytes of the local file to the remote session
+folder, retrying with an exponential backoff when the network share is unavailable.
+The local file is the reference: the mirror can always be resumed from it.
+Optionally, a columnar `TrialStore` copy of the trials is derived from the local file when the writer
+closes. The jsonable file remains the record of the session: the store can always be rebuilt from it.
+"""
+
+import json
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from iblrig.trial_store import TrialStore
+from iblutil.util import setup_logger
+
+log = setup_logger("iblrig")
+
+_STOP = object()
+
+
+class RemoteMirror(threading.Thread):
+    """
+    Keeps a remote copy of an append-only local file.
+    The remote file size is used as the resume offset, so an interrupted copy is completed on the next
+    attempt and nothing is written twice.
+
+    :param local_file: path of the append-only local file
+    :param remote_file: path of the remote copy
+    :param min_backoff: first delay in seconds before retrying after a failure
+    :param max_backoff: maximum delay in seconds between retries
+    """
+
+    def __init__(
+        self,
+        local_file: Path,
+        remote_file: Path,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        super().__init__(name="trial_remote_mirror", daemon=True)
+        self.local_file = Path(local_file)
+        self.remote_file = Path(remote_file)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+
+    def notify(self) -> None:
+        """Signals that new data has been appended to the local file"""
+        self._dirty.set()
+
+    def sync(self) -> int:
+        """
+        Appends the bytes of the local file missing from the remote file
+        :return: number of bytes copied
+        """
+        if not self.local_file.exists():
+            return 0
+        self.remote_file.parent.mkdir(parents=True, exist_ok=True)
+        local_size = self.local_file.stat().st_size
+        remote_size = self.remote_file.stat().st_size if self.remote_file.exists() else 0
+        if remote_size > local_size:
+            # the remote file doesn't come from this local file: start over
+            log.warning(f"{self.remote_file} is larger than {self.local_file}, overwriting")
+            shutil.copyfile(self.local_file, self.remote_file)
+            return local_size
+        if remote_size == local_size:
+            return 0
+        with open(self.local_file, "rb") as fl, open(self.remote_file, "ab") as fr:
+            fl.seek(remote_size)
+            nbytes = local_size - remote_size
+            fr.write(fl.read(nbytes))
+        return nbytes
+
+    def run(self) -> None:
+        backoff = self.min_backoff
+        while not self._stopping.is_set():
+            self._dirty.wait()
+            self._dirty.clear()
+            try:
+                self.sync()
+                backoff = self.min_backoff
+            except OSError as e:
+                log.warning(f"Remote copy of trial data failed, retrying in {backoff:.0f} s: {e}")
+                self._dirty.set()
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def stop(self, retries: int = 3) -> bool:
+        """
+        Stops the thread and makes a last attempt at bringing the remote copy up to date
+        :param retries: number of synchronous attempts
+        :return: True if the remote copy is complete
+        """
+        self._stopping.set()
+        self._dirty.set()
+        self.join()
+        for _ in range(retries):
+            try:
+                self.sync()
+                return True
+            except OSError as e:
+                log.warning(f"Remote copy of trial data failed: {e}")
+        log.error(
+            f"Could not copy {self.local_file} to {self.remote_file}, the local file is complete "
+            f"and can be copied later"
+        )
+        return False
+
+
+class TrialWriter:
+    """
+    Appends trial records to a local jsonable file from a background thread.
+    The queue is bounded so that a stalled disk shows up as back-pressure on the trial loop rather than
+    an unbounded memory growth, and it is fully drained on close so no record is lost.
+    When a write fails, the records are kept and written again with an exponential backoff, the trial
+    loop is never interrupted.
+
+    >>> writer = TrialWriter(session_path.joinpath('_iblrig_trials.raw.jsonable'), remote_folder)
+    >>> writer.put(asdict(trial_info))
+    >>> writer.close()
+
+    :param local_file: path of the append-only jsonable file
+    :param remote_folder: if provided, folder where the file is mirrored
+    :param maxsize: maximum number of records waiting to be written
+    :param store_file: if provided, path of the columnar .npz trial store derived from the local file on close
+    :param min_backoff: first delay in seconds before writing again after a failure
+    :param max_backoff: maximum delay in seconds between write attempts
+    :param close_retries: number of write attempts left to the records still pending on close
+    """
+
+    def __init__(
+        self,
+        local_file: Path,
+        remote_folder: Path | None = None,
+        maxsize: int = 64,
+        store_file: Path | None = None,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        close_retries: int = 3,
+    ):
+        self.local_file = Path(local_file)
+        self.local_file.parent.mkdir(parents=True, exist_ok=True)
+        self.remote_folder = None if remote_folder is None else Path(remote_folder)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.close_retries = close_retries
+        # records that could not be written, set when the writer thread exits
+        self.unwritten = []
+        self._queue = queue.Queue(maxsize=maxsize)
+        # size of the file up to the last complete record
+        self._size = self.local_file.stat().st_size if self.local_file.exists() else 0
+        self.store_file = None if store_file is None else Path(store_file)
+        self.mirror = None
+        if remote_folder is not None:
+            self.mirror = RemoteMirror(self.local_file, Path(remote_folder).joinpath(self.local_file.name))
+            self.mirror.start()
+        self._thread = threading.Thread(target=self._write_loop, name="trial_writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record: dict) -> None:
+        """
+        Queues a trial record for writing, blocks only if `maxsize` records are already waiting
+        :param record: json serializable dictionary
+        """
+        self._queue.put(record)
+
+    def _get_batch(self, timeout: float | None = None) -> tuple[list[dict], bool]:
+        """
+        :param timeout: maximum time in seconds to wait for a record, None waits indefinitely
+        :return: the records waiting in the queue, and whether the writer is asked to stop
+        """
+        try:
+            records = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return [], False
+        # batch whatever else is already waiting into the same write
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [r for r in records if r is not _STOP], any(r is _STOP for r in records)
+
+    def _serialize(self, record: dict) -> str | None:
+        try:
+            return json.dumps(record) + "\n"
+        except (TypeError, ValueError) as e:
+            log.error(f"Trial record is not json serializable, writing the offending values as strings: {e}")
+        try:
+            return json.dumps(record, default=str) + "\n"
+        except (TypeError, ValueError) as e:
+            log.error(f"Trial record could not be written to {self.local_file}: {e}")
+        return None
+
+    def _append(self, lines: list[str]) -> None:
+        with open(self.local_file, "a") as fid:
+            # a failed attempt may have left a partial record at the end of the file
+            fid.truncate(self._size)
+            fid.writelines(lines)
+            fid.flush()
+            self._size = fid.tell()
+
+    def _write_loop(self) -> None:
+        pending = []  # (record, line) taken from the queue and not written yet
+        stop, backoff, retries = False, self.min_backoff, self.close_retries
+        while pending or not stop:
+            if not stop:
+                # with records pending, the next attempt doesn't wait for another record longer than the backoff
+                records, stop = self._get_batch(timeout=backoff if pending else None)
+                pending.extend((r, line) for r in records if (line := self._serialize(r)) is not None)
+                if not pending:
+                    continue
+            try:
+                self._append([line for _, line in pending])
+            except OSError as e:
+                if stop:
+                    retries -= 1
+                    if retries < 0:
+                        break
+                    time.sleep(self.min_backoff)
+                log.warning(f"Failed to write {len(pending)} trial records to {self.local_file}, retrying: {e}")
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.min_backoff
+            if self.mirror is not None:
+                self.mirror.notify()
+            pending = []
+        self.unwritten = [r for r, _ in pending]
+
+    def close(self) -> bool:
+        """
+        Writes all pending records, then brings the remote copy up to date and saves the trial store.
+        The errors are logged, closing the writer never raises.
+        :return: True if all the records are written to the local file, the others are kept in `unwritten`
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+        self._thread.join()
+        if self.mirror is not None:
+            self.mirror.stop()
+        if self.unwritten:
+            log.error(f"{len(self.unwritten)} trial records could not be written to {self.local_file}")
+        if self.store_file is not None and self.local_file.exists():
+            try:
+                self._save_store()
+            except Exception as e:
+                log.error(f"Failed to write the trial store {self.store_file}, it can be rebuilt from {self.local_file}: {e}")
+        return not self.unwritten
+
+    def _save_store(self) -> None:
+        # the store is read back from the file rather than kept in memory during the session
+        TrialStore.from_jsonable(self.local_file).save(self.store_file)
+        if self.remote_folder is None:
+            return
+        try:
+            shutil.copy(self.store_file, self.remote_folder.joinpath(self.store_file.name))
+        except OSError as e:
+            log.warning(f"Remote copy of {self.store_file} failed, it can be copied later: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -56,6 +56,11 @@ class Session(IblBase):
     def start_bpod(self):
         self.run()
 
+    @property
+    def state_machine_key(self):
+        # the state machine is identical for every trial
+        return ()
+
     def get_state_machine_trial(self, i):
         sma = StateMachine(self.bpod)
 
@@ -1,10 +1,10 @@
 import abc
 from dataclasses import dataclass
-import json
+from functools import partial
 import sys
 import time
 from pathlib import Path
-from typing import List
+from typing import Hashable, List
 from dataclasses import asdict
 
 
@@ -17,9 +17,9 @@ import pandas as pd
 
 import iblrig.base_tasks
 import iblrig.graphic
-from iblrig import misc
+from iblrig import misc, trial_writer
 from iblutil.util import setup_logger
-from iblrig.hardware import SOFTCODE
+from iblrig.hardware import StateMachineCache
 
 
 @dataclass
@@ -55,11 +55,14 @@ class IblBase(
     iblrig.base_tasks.BpodMixin,
     iblrig.base_tasks.Frame2TTLMixin,
     iblrig.base_tasks.RotaryEncoderMixin,
+    iblrig.base_tasks.SoundMixin,
     # iblrig.base_tasks.ValveMixin,
 ):
     base_parameters_file = Path(__file__).parent.parent.joinpath(
         "tasks/task_parameters.yaml"
     )
+    trials_file_name = "_iblrig_trials.raw.jsonable"
+    trials_store_name = "_iblrig_trials.raw.npz"
 
     def __init__(self, subject: str, delay_secs: int = 0):
         super().__init__(subject=subject, task_parameter_file=self.base_parameters_file)
@@ -91,6 +94,7 @@ class IblBase(
         self.texture = ""
         self.texture_rewarded = False
         self.all_licks = []
+        self.state_machine_cache = StateMachineCache()
 
     def start_hardware(self):
         """
@@ -100,6 +104,8 @@ class IblBase(
         if not self.is_mock:
             self.start_mixin_frame2ttl()
             self.start_mixin_bpod()
+            # the sound actions are defined on the started Bpod
+            self.start_mixin_sound()
             # self.start_mixin_valve()
             self.start_mixin_rotary_encoder()
 
@@ -111,37 +117,55 @@ class IblBase(
         # make the bpod send spacer signals to the main sync clock for protocol discovery
 
         self.send_spacers()
-        time_last_trial_end = time.time()
-        for i in range(self.task_params.NTRIALS):  # Main loop
-            # t_overhead = time.time()
-            self.next_trial()
-            log.info(f"Starting trial: {i}")
-            # =============================================================================
-            #     Start state machine definition
-            # =============================================================================
-            sma = self.get_state_machine_trial(i)
-            log.info("Sending state machine to bpod")
-            # Send state machine description to Bpod device
-            self.bpod.send_state_machine(sma)
-            # Run state machine
-
-            # Used to be an ITI delay here which can be readded if needed
-            log.info("running state machine")
-            self.bpod.run_state_machine(
-                sma
-            )  # Locks until state machine 'exit' is reached
-            time_last_trial_end = time.time()
-            self.trial_completed(self.bpod.session.current_trial.export())
-
-            trial_info = self.format_data()
-            self.save_trial_data(trial_info, i)
-            self.plot_session(trial_info, i)
-
-            while self.paths.SESSION_FOLDER.joinpath(".pause").exists():
-                time.sleep(1)
-            if self.paths.SESSION_FOLDER.joinpath(".stop").exists():
-                self.paths.SESSION_FOLDER.joinpath(".stop").unlink()
-                break
+        self.trial_writer = trial_writer.TrialWriter(
+            self.paths.SESSION_FOLDER.joinpath(self.trials_file_name),
+            remote_folder=self.paths.get("REMOTE_SESSION_PATH"),
+            store_file=self.paths.SESSION_FOLDER.joinpath(self.trials_store_name),
+        )
+        try:
+            for i in range(self.task_params.NTRIALS):  # Main loop
+                # t_overhead = time.time()
+                self.next_trial()
+                log.info(f"Starting trial: {i}")
+                # =============================================================================
+                #     Start state machine definition
+                # =============================================================================
+                sma, message = self.state_machine_cache.get(
+                    self.state_machine_key, partial(self.get_state_machine_trial, i)
+                )
+                log.info("Sending state machine to bpod")
+                # Send state machine description to Bpod device
+                self.bpod.send_compiled_state_machine(message)
+                # Run state machine
+
+                # Used to be an ITI delay here which can be readded if needed
+                log.info("running state machine")
+                self.bpod.run_state_machine(
+                    sma
+                )  # Locks until state machine 'exit' is reached
+                self.trial_completed(self.bpod.session.current_trial.export())
+
+                trial_info = self.format_data()
+                self.save_trial_data(trial_info, i)
+                self.plot_session(trial_info, i)
+
+                while self.paths.SESSION_FOLDER.joinpath(".pause").exists():
+                    time.sleep(1)
+                if self.paths.SESSION_FOLDER.joinpath(".stop").exists():
+                    self.paths.SESSION_FOLDER.joinpath(".stop").unlink()
+                    break
+        finally:
+            self.trial_writer.close()
+            self.stop_corridor()
+
+    def stop_corridor(self) -> None:
+        """
+        Stops the corridor render thread, see `iblrig.panda3d.corridor.render_thread`. The thread is a daemon,
+        if it is still running at exit the interpreter kills it in the middle of a frame
+        """
+        stop = getattr(getattr(self, "corridor", None), "stop", None)
+        if stop is not None:
+            stop()
 
     def plot_session(self, trial_info: TrialInfo, i: int):
         licks = [
@@ -172,19 +196,29 @@ class IblBase(
         )
 
     def save_trial_data(self, trial_info: TrialInfo, i: int) -> None:
-        with open(self.paths.SESSION_FOLDER / f"trial{i}.json", "w") as f:
-            json.dump(asdict(trial_info), f)
-
-        try:
-            with open(self.paths.REMOTE_SESSION_PATH / f"trial{i}.json", "w") as f:
-                json.dump(asdict(trial_info), f)
-        except FileNotFoundError:
-            pass
+        """
+        Queues the trial for writing to the session trials file, the disk and network I/O happen in
+        the background (see iblrig.trial_writer)
+        """
+        self.trial_writer.put(asdict(trial_info))
 
     @abc.abstractmethod
     def next_trial(self):
         pass
 
+    @abc.abstractmethod
+    def get_state_machine_trial(self, i: int):
+        """Returns the state machine of trial i, only called when its `state_machine_key` is not cached"""
+        pass
+
+    @property
+    def state_machine_key(self) -> Hashable | None:
+        """
+        The trial parameters the state machine depends on. Trials with the same key share a single
+        compiled state machine, None rebuilds the state machine for every trial.
+        """
+        return None
+
     @property
     def reward_amount(self):
         return self.task_params.REWARD_AMOUNT_UL
@@ -19,7 +19,7 @@ from iblrig.hardware import SOFTCODE
 
 import yaml
 
-from iblrig.panda3d.corridor.corridor import Corridor
+from iblrig.panda3d.corridor.render_thread import corridor_factory
 
 
 log = setup_logger("iblrig")
@@ -41,7 +41,9 @@ class Session(IblBase):
         super().__init__(subject=subject)
 
         self.corridor_idx = -1
-        self.corridor = Corridor()
+        self.corridor = corridor_factory(
+            self.CORRIDOR_TEXTURES, position_source=self.device_rotary_encoder.latest_angle
+        )
         # TODO:  pre-allocate this?
         self.rotary_encoder_position: List[float] = []
 
@@ -83,9 +85,9 @@ class Session(IblBase):
         self.texture = self.CORRIDOR_TEXTURES[self.texture_idx]
 
         self.texture_rewarded = self.texture_idx == rewarded_idx
-        self.device_rotary_encoder.reset_position()
-        self.device_rotary_encoder.set_thresholds()
+        self.device_rotary_encoder.reset_trial()
         self.trial_num += 1
+        self.spacer_pulses = random.choice([1, 2, 3, 4, 5])
         self.corridor_idx += 1
         print(f"Starting trial with texture: {self.texture}")
         self.corridor.start_trial(self.texture)
@@ -93,13 +95,19 @@ class Session(IblBase):
 
     def start_bpod(self):
         self.corridor.start()
+        self.corridor.preload(self.CORRIDOR_TEXTURES)
         self.corridor.step()
         self.run()
 
+    @property
+    def state_machine_key(self):
+        # the valve output and the number of spacer pulses are the only per-trial parameters
+        return self.texture_rewarded, self.spacer_pulses
+
     def get_state_machine_trial(self, i):
         solenoid_pin = 255 if self.texture_rewarded else 0
         sma = StateMachine(self.bpod)
-        Spacer(n_pulses=random.choice([1, 2, 3, 4, 5]), tup=0.01).add_spacer_states(
+        Spacer(n_pulses=self.spacer_pulses, tup=0.01).add_spacer_states(
             sma, "trial_start"
         )
         sma.set_global_timer(1, self.task_params.MAX_TRIAL_TIME)
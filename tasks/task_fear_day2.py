@@ -19,7 +19,7 @@ from iblrig.hardware import SOFTCODE, Bpod
 
 import yaml
 
-from iblrig.panda3d.corridor.corridor import Corridor
+from iblrig.panda3d.corridor.render_thread import corridor_factory
 
 
 log = setup_logger("iblrig")
@@ -41,7 +41,9 @@ class Session(IblBase):
         super().__init__(subject=subject)
 
         self.corridor_idx = -1
-        self.corridor = Corridor()
+        self.corridor = corridor_factory(
+            self.CORRIDOR_TEXTURES, position_source=self.device_rotary_encoder.latest_angle
+        )
         # TODO:  pre-allocate this?
         self.rotary_encoder_position: List[float] = []
 
@@ -79,8 +81,7 @@ class Session(IblBase):
         self.texture = self.CORRIDOR_TEXTURES[self.texture_idx]
 
         self.texture_fear = self.texture_idx == fear_idx
-        self.device_rotary_encoder.reset_position()
-        self.device_rotary_encoder.set_thresholds()
+        self.device_rotary_encoder.reset_trial()
         self.trial_num += 1
         self.corridor_idx += 1
         print(f"Starting trial with texture: {self.texture}")
@@ -89,9 +90,15 @@ class Session(IblBase):
 
     def start_bpod(self):
         self.corridor.start()
+        self.corridor.preload(self.CORRIDOR_TEXTURES)
         self.corridor.step()
         self.run()
 
+    @property
+    def state_machine_key(self):
+        # the air puff output is the only per-trial parameter
+        return self.texture_fear
+
     def get_state_machine_trial(self, i):
         puff_pin = 255 if self.texture_fear else 0
         sma = StateMachine(self.bpod)
@@ -20,7 +20,7 @@ from iblutil.spacer import Spacer
 
 import yaml
 
-from iblrig.panda3d.corridor.corridor import Corridor
+from iblrig.panda3d.corridor.render_thread import corridor_factory
 
 
 log = setup_logger("iblrig")
@@ -42,7 +42,9 @@ class Session(IblBase):
         super().__init__(subject=subject)
 
         self.corridor_idx = -1
-        self.corridor = Corridor()
+        self.corridor = corridor_factory(
+            self.CORRIDOR_TEXTURES, position_source=self.device_rotary_encoder.latest_angle
+        )
         # TODO:  pre-allocate this?
         self.rotary_encoder_position: List[float] = []
 
@@ -84,9 +86,9 @@ class Session(IblBase):
         self.texture = self.CORRIDOR_TEXTURES[self.texture_idx]
 
         self.texture_rewarded = self.texture_idx == rewarded_idx
-        self.device_rotary_encoder.reset_position()
-        self.device_rotary_encoder.set_thresholds()
+        self.device_rotary_encoder.reset_trial()
         self.trial_num += 1
+        self.spacer_pulses = random.choice([1, 2, 3, 4, 5])
         self.corridor_idx += 1
         print(f"Starting trial with texture: {self.texture}")
         self.corridor.start_trial(self.texture)
@@ -94,14 +96,20 @@ class Session(IblBase):
 
     def start_bpod(self):
         self.corridor.start()
+        self.corridor.preload(self.CORRIDOR_TEXTURES)
         self.corridor.step()
         self.run()
 
+    @property
+    def state_machine_key(self):
+        # the number of spacer pulses is the only per-trial parameter
+        return self.spacer_pulses
+
     def get_state_machine_trial(self, i):
         solenoid_pin = 0
         sma = StateMachine(self.bpod)
 
-        Spacer(n_pulses=random.choice([1, 2, 3, 4, 5]), tup=0.01).add_spacer_states(
+        Spacer(n_pulses=self.spacer_pulses, tup=0.01).add_spacer_states(
             sma, "trial_start"
         )
 